@@ -0,0 +1,25 @@
+#!/usr/bin/python
+
+# Convert binary files with alignments (contigs_reports/minimap_output/*.coords.bin and *.coords.filtered.bin)
+# to the text format used by the previous QUAST versions.
+# Alignments to a single reference sequence and/or of a single contig can be selected with --ref and --contig,
+# they are found through the index saved next to the binary file (.idx).
+
+import getopt
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.abspath(sys.path[0]), '../'))
+from quast_libs.ca_utils.coords_file import coords_to_text
+
+# MAIN
+try:
+    options, args = getopt.gnu_getopt(sys.argv[1:], '', ['ref=', 'contig='])
+except getopt.GetoptError:
+    options, args = [], []
+if len(args) != 2:
+    print("Usage: " + sys.argv[0] + " <input .coords.bin file> <output text file> [--ref <name>] [--contig <name>]")
+    sys.exit()
+
+options = dict(options)
+coords_to_text(args[0], args[1], ref=options.get('--ref'), contig=options.get('--contig'))
@@ -21,6 +21,7 @@ addsitedir(os.path.join(qconfig.LIBS_LOCATION, 'site_packages'))
 from quast_libs import qutils, run_barrnap, plotter_data, unique_kmers
 from quast_libs.qutils import cleanup, check_dirpath, check_reads_fpaths
 from quast_libs.options_parser import parse_options
+from quast_libs.stages import Stage, run_stages
 
 from quast_libs.log import get_logger
 logger = get_logger(qconfig.LOGGER_DEFAULT_NAME)
@@ -145,17 +146,14 @@ def main(args):
     ########################################################################
     ### Stats and plots
     ########################################################################
-    from quast_libs import basic_stats
-    icarus_gc_fpath, circos_gc_fpath = basic_stats.do(ref_fpath, contigs_fpaths, os.path.join(output_dirpath, 'basic_stats'), output_dirpath)
+    def run_basic_stats():
+        from quast_libs import basic_stats
+        return basic_stats.do(ref_fpath, contigs_fpaths, os.path.join(output_dirpath, 'basic_stats'), output_dirpath)
 
-    if qconfig.use_kmc and ref_fpath:
+    def run_unique_kmers():
         unique_kmers.do(os.path.join(output_dirpath, 'k_mer_stats'), ref_fpath, contigs_fpaths, logger)
 
-    aligned_contigs_fpaths = []
-    aligned_lengths_lists = []
-    icarus_html_fpath = None
-    circos_png_fpath = None
-    if ref_fpath:
+    def run_contigs_analyzer():
         ########################################################################
         ### former PLANTAKOLYA, PLANTAGORA
         ########################################################################
@@ -164,59 +162,56 @@ def main(args):
         aligner_statuses, aligned_lengths_per_fpath = contigs_analyzer.do(
             ref_fpath, contigs_fpaths, is_cyclic, os.path.join(output_dirpath, 'contigs_reports'),
             old_contigs_fpaths, qconfig.bed)
+        aligned_contigs_fpaths = []
+        aligned_lengths_lists = []
         for contigs_fpath in contigs_fpaths:
             if aligner_statuses[contigs_fpath] == contigs_analyzer.AlignerStatus.OK:
                 aligned_contigs_fpaths.append(contigs_fpath)
                 aligned_lengths_lists.append(aligned_lengths_per_fpath[contigs_fpath])
+        return aligned_contigs_fpaths, aligned_lengths_lists
 
-    if qconfig.is_agb_mode:  # AGB needs only alignments information
-        sys.exit(0)
-
-    # Before continue evaluating, check if aligner didn't skip all of the contigs files.
-    detailed_contigs_reports_dirpath = None
-    features_containers = None
-    if len(aligned_contigs_fpaths) and ref_fpath:
-        detailed_contigs_reports_dirpath = os.path.join(output_dirpath, 'contigs_reports')
-
+    def run_aligned_stats(aligned_contigs_fpaths, aligned_lengths_lists):
         ########################################################################
         ### NAx and NGAx ("aligned Nx and NGx")
         ########################################################################
-        from quast_libs import aligned_stats
-        aligned_stats.do(
-            ref_fpath, aligned_contigs_fpaths, output_dirpath,
-            aligned_lengths_lists, os.path.join(output_dirpath, 'aligned_stats'))
+        if aligned_contigs_fpaths:
+            from quast_libs import aligned_stats
+            aligned_stats.do(
+                ref_fpath, aligned_contigs_fpaths, output_dirpath,
+                aligned_lengths_lists, os.path.join(output_dirpath, 'aligned_stats'))
 
+    def run_genome_analyzer(aligned_contigs_fpaths):
         ########################################################################
         ### GENOME_ANALYZER
         ########################################################################
-        from quast_libs import genome_analyzer
-        features_containers = genome_analyzer.do(
-            ref_fpath, aligned_contigs_fpaths, output_dirpath,
-            qconfig.features, qconfig.operons, detailed_contigs_reports_dirpath,
-            os.path.join(output_dirpath, 'genome_stats'))
-
-    genes_by_labels = None
-    if qconfig.glimmer:
-        ########################################################################
-        ### Glimmer
-        ########################################################################
-        from quast_libs import glimmer
-        genes_by_labels = glimmer.do(contigs_fpaths, qconfig.genes_lengths, os.path.join(output_dirpath, 'predicted_genes'))
-    if qconfig.gene_finding:
-        ########################################################################
-        ### GeneMark
-        ########################################################################
-        from quast_libs import genemark
-        genes_by_labels = genemark.do(contigs_fpaths, qconfig.genes_lengths, os.path.join(output_dirpath, 'predicted_genes'),
-                    qconfig.prokaryote, qconfig.metagenemark)
-    if genes_by_labels is None:
-        logger.main_info("")
-        logger.notice("Genes are not predicted by default. Use --gene-finding or --glimmer option to enable it.")
-
-    if qconfig.rna_gene_finding:
+        if aligned_contigs_fpaths:
+            from quast_libs import genome_analyzer
+            return genome_analyzer.do(
+                ref_fpath, aligned_contigs_fpaths, output_dirpath,
+                qconfig.features, qconfig.operons, os.path.join(output_dirpath, 'contigs_reports'),
+                os.path.join(output_dirpath, 'genome_stats'))
+
+    def run_gene_prediction():
+        genes_by_labels = None
+        if qconfig.glimmer:
+            ########################################################################
+            ### Glimmer
+            ########################################################################
+            from quast_libs import glimmer
+            genes_by_labels = glimmer.do(contigs_fpaths, qconfig.genes_lengths, os.path.join(output_dirpath, 'predicted_genes'))
+        if qconfig.gene_finding:
+            ########################################################################
+            ### GeneMark
+            ########################################################################
+            from quast_libs import genemark
+            genes_by_labels = genemark.do(contigs_fpaths, qconfig.genes_lengths, os.path.join(output_dirpath, 'predicted_genes'),
+                        qconfig.prokaryote, qconfig.metagenemark)
+        return genes_by_labels
+
+    def run_rna_gene_prediction():
         run_barrnap.do(contigs_fpaths, os.path.join(output_dirpath, 'predicted_genes'), logger)
 
-    if qconfig.run_busco and not qconfig.is_combined_ref:
+    def run_conserved_genes_finding():
         if qconfig.platform_name == 'macosx':
             logger.main_info("")
             logger.warning("BUSCO can be run on Linux only")
@@ -226,6 +221,53 @@ def main(args):
         else:
             from quast_libs import run_busco
             run_busco.do(contigs_fpaths, os.path.join(output_dirpath, qconfig.busco_dirname), logger)
+
+    # gene prediction, k-mer-based statistics, etc. need only contigs and can run along with the alignment-based stages
+    quast_stages = [Stage('Basic statistics', run_basic_stats, outputs=['icarus_gc_fpath', 'circos_gc_fpath'])]
+    if qconfig.use_kmc and ref_fpath:
+        quast_stages.append(Stage('K-mer-based statistics', run_unique_kmers, is_independent=True,
+                                  report_fields=[reporting.Fields.KMER_COMPLETENESS, reporting.Fields.KMER_CORR_LENGTH,
+                                                 reporting.Fields.KMER_MIS_LENGTH, reporting.Fields.KMER_UNDEF_LENGTH,
+                                                 reporting.Fields.KMER_TRANSLOCATIONS, reporting.Fields.KMER_RELOCATIONS,
+                                                 reporting.Fields.KMER_MISASSEMBLIES]))
+    if ref_fpath:
+        quast_stages.append(Stage('Contig analyzer', run_contigs_analyzer,
+                                  outputs=['aligned_contigs_fpaths', 'aligned_lengths_lists']))
+    if not qconfig.is_agb_mode:  # AGB needs only alignments information
+        if ref_fpath:
+            quast_stages.append(Stage('NAx and NGAx', run_aligned_stats,
+                                      inputs=['aligned_contigs_fpaths', 'aligned_lengths_lists']))
+            quast_stages.append(Stage('Genome analyzer', run_genome_analyzer,
+                                      inputs=['aligned_contigs_fpaths'], outputs=['features_containers']))
+        if qconfig.glimmer or qconfig.gene_finding:
+            quast_stages.append(Stage('Gene prediction', run_gene_prediction, outputs=['genes_by_labels'], is_independent=True,
+                                      report_fields=[reporting.Fields.PREDICTED_GENES_UNIQUE, reporting.Fields.PREDICTED_GENES]))
+        if qconfig.rna_gene_finding:
+            quast_stages.append(Stage('rRNA gene prediction', run_rna_gene_prediction, is_independent=True,
+                                      report_fields=[reporting.Fields.RNA_GENES]))
+        if qconfig.run_busco and not qconfig.is_combined_ref:
+            quast_stages.append(Stage('Conserved genes finding', run_conserved_genes_finding, is_independent=True,
+                                      report_fields=[reporting.Fields.BUSCO_COMPLETE, reporting.Fields.BUSCO_PART]))
+    stages_data = run_stages(quast_stages)
+    icarus_gc_fpath, circos_gc_fpath = stages_data['icarus_gc_fpath'], stages_data['circos_gc_fpath']
+    aligned_contigs_fpaths = stages_data.get('aligned_contigs_fpaths', [])
+    features_containers = stages_data.get('features_containers')
+    genes_by_labels = stages_data.get('genes_by_labels')
+    icarus_html_fpath = None
+    circos_png_fpath = None
+
+    if qconfig.is_agb_mode:
+        sys.exit(0)
+
+    # Before continue evaluating, check if aligner didn't skip all of the contigs files.
+    detailed_contigs_reports_dirpath = None
+    if len(aligned_contigs_fpaths) and ref_fpath:
+        detailed_contigs_reports_dirpath = os.path.join(output_dirpath, 'contigs_reports')
+
+    if genes_by_labels is None:
+        logger.main_info("")
+        logger.notice("Genes are not predicted by default. Use --gene-finding or --glimmer option to enable it.")
+
     ########################################################################
     reports_fpaths, transposed_reports_fpaths = reporting.save_total(output_dirpath)
 
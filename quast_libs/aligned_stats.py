@@ -29,11 +29,10 @@ def do(ref_fpath, aligned_contigs_fpaths, output_dirpath,
     logger.print_timestamp()
     logger.main_info('Running NA-NGA calculation...')
 
-    ref_chr_lengths = fastaparser.get_chr_lengths_from_fastafile(ref_fpath)
-    reference_length = sum(ref_chr_lengths.values())
+    reference_length = sum(fastaparser.get_fasta_stats(ref_fpath, calculate_GC_windows=False).lengths)
     assembly_lengths = []
     for contigs_fpath in aligned_contigs_fpaths:
-        assembly_lengths.append(sum(fastaparser.get_chr_lengths_from_fastafile(contigs_fpath).values()))
+        assembly_lengths.append(sum(fastaparser.get_fasta_stats(contigs_fpath, calculate_GC_windows=False).lengths))
 
     for i, (contigs_fpath, lens, assembly_len) in enumerate(
             zip(aligned_contigs_fpaths, aligned_lengths_lists, assembly_lengths)):
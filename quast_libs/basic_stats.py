@@ -13,13 +13,13 @@ from os.path import join
 
 from quast_libs import fastaparser, qconfig, qutils, reporting, plotter
 from quast_libs.circos import set_window_size
+from quast_libs.fastaparser import get_GC_seq, get_GC_windows
 from quast_libs.log import get_logger
 logger = get_logger(qconfig.LOGGER_DEFAULT_NAME)
 MIN_HISTOGRAM_POINTS = 5
-MIN_GC_WINDOW_SIZE = qconfig.GC_window_size // 2
 
 
-def GC_content(contigs_fpath, skip=False):
+def GC_content(contigs_fpath, skip=False, fasta_stats=None):
     """
        Returns percent of GC for assembly and GC distribution: (list of GC%, list of # windows)
     """
@@ -36,23 +36,20 @@ def GC_content(contigs_fpath, skip=False):
     if skip:
         return total_GC, (GC_distribution_x, GC_distribution_y), (GC_contigs_distribution_x, GC_contigs_distribution_y)
 
-    for name, seq_full in fastaparser.read_fasta(contigs_fpath): # in tuples: (name, seq)
-        contig_ACGT_len = len(seq_full) - seq_full.count("N")
+    fasta_stats = fasta_stats or fastaparser.get_fasta_stats(contigs_fpath)
+    for contig_len, contig_Ns, contig_GC_len in zip(fasta_stats.lengths, fasta_stats.ns, fasta_stats.gc):
+        contig_ACGT_len = contig_len - contig_Ns
         if not contig_ACGT_len:
             continue
-        contig_GC_len = seq_full.count("G") + seq_full.count("C")
         contig_GC_percent = 100.0 * contig_GC_len / contig_ACGT_len
         GC_contigs_distribution_y[int(contig_GC_percent // qconfig.GC_contig_bin_size)] += 1
-
-        n = qconfig.GC_window_size
-        # non-overlapping windows
-        for seq in (seq_full[i:i+n] for i in range(0, len(seq_full), n)):
-            GC_percent = get_GC_percent(seq)
-            if GC_percent is not None:
-                GC_distribution_y[int(int(GC_percent / qconfig.GC_bin_size) * qconfig.GC_bin_size)] += 1
         total_GC_amount += contig_GC_len
         total_contig_length += contig_ACGT_len
 
+    # non-overlapping windows
+    for GC_percent, windows in enumerate(fasta_stats.windows_GC_distribution):
+        GC_distribution_y[int(int(GC_percent / qconfig.GC_bin_size) * qconfig.GC_bin_size)] += windows
+
     if total_contig_length == 0:
         total_GC = None
     else:
@@ -61,41 +58,31 @@ def GC_content(contigs_fpath, skip=False):
     return total_GC, (GC_distribution_x, GC_distribution_y), (GC_contigs_distribution_x, GC_contigs_distribution_y)
 
 
-def get_GC_percent(seq):
-    if len(seq) < MIN_GC_WINDOW_SIZE:
-        return None
-    ACGT_len = len(seq) - seq.count("N")
-    # skip block if it has less than half of ACGT letters (it also helps with "ends of contigs")
-    if ACGT_len < len(seq) // 2:
-        return None
-
-    GC_len = seq.count("G") + seq.count("C")
-    GC_percent = 100 * GC_len // ACGT_len
-    return GC_percent
-
-
-def save_icarus_GC(ref_fpath, gc_fpath):
+def save_reference_GC(ref_fpath, reference_length, icarus_gc_fpath=None, circos_gc_fpath=None):
+    """
+        Saves GC % of non-overlapping windows of the reference for Icarus and Circos in a single pass over the reference
+    """
+    icarus_window_size = qconfig.GC_window_size_large if qconfig.large_genome else qconfig.GC_window_size
+    circos_window_size = set_window_size(reference_length)
+    icarus_out_f = open(icarus_gc_fpath, 'w') if icarus_gc_fpath else None
+    circos_out_f = open(circos_gc_fpath, 'w') if circos_gc_fpath else None
     chr_index = 0
-    window_size = qconfig.GC_window_size_large if qconfig.large_genome else qconfig.GC_window_size  # non-overlapping windows
-    with open(gc_fpath, 'w') as out_f:
-        for name, seq_full in fastaparser.read_fasta(ref_fpath):
-            out_f.write('#' + name + ' ' + str(chr_index) + '\n')
-            for i in range(0, len(seq_full), window_size):
-                seq = seq_full[i:i + window_size]
-                GC_percent = get_GC_percent(seq)
+    for name, seq in fastaparser.read_fasta(ref_fpath):
+        GC_seq = get_GC_seq(seq)
+        if icarus_out_f:
+            icarus_out_f.write('#' + name + ' ' + str(chr_index) + '\n')
+            for GC_percent in get_GC_windows(GC_seq, icarus_window_size):
                 if GC_percent is not None:
-                    out_f.write(str(chr_index) + ' ' + str(GC_percent) + '\n')
-
-
-def save_circos_GC(ref_fpath, reference_length, gc_fpath):
-    window_size = set_window_size(reference_length)
-    with open(gc_fpath, 'w') as out_f:
-        for name, seq_full in fastaparser.read_fasta(ref_fpath):
-            for i in range(0, len(seq_full), window_size):
-                seq = seq_full[i:i + window_size]
-                GC_percent = get_GC_percent(seq)
+                    icarus_out_f.write(str(chr_index) + ' ' + str(GC_percent) + '\n')
+        if circos_out_f:
+            for i, GC_percent in enumerate(get_GC_windows(GC_seq, circos_window_size)):
                 if GC_percent is not None:
-                    out_f.write('\t'.join([name, str(i), str(i + len(seq)), str(GC_percent) + '\n']))
+                    start = i * circos_window_size
+                    end = min(start + circos_window_size, len(seq))
+                    circos_out_f.write('\t'.join([name, str(start), str(end), str(GC_percent) + '\n']))
+    for out_f in [icarus_out_f, circos_out_f]:
+        if out_f:
+            out_f.close()
 
 
 def binning_coverage(cov_values, nums_contigs):
@@ -188,16 +175,17 @@ def do(ref_fpath, contigs_fpaths, output_dirpath, results_dir):
     icarus_gc_fpath = None
     circos_gc_fpath = None
     if ref_fpath:
-        reference_lengths = sorted(fastaparser.get_chr_lengths_from_fastafile(ref_fpath).values(), reverse=True)
+        reference_stats = fastaparser.get_fasta_stats(ref_fpath)
+        reference_lengths = sorted(reference_stats.lengths, reverse=True)
         reference_fragments = len(reference_lengths)
         reference_length = sum(reference_lengths)
-        reference_GC, reference_GC_distribution, reference_GC_contigs_distribution = GC_content(ref_fpath)
+        reference_GC, reference_GC_distribution, reference_GC_contigs_distribution = GC_content(ref_fpath, fasta_stats=reference_stats)
         if qconfig.create_icarus_html or qconfig.draw_plots:
             icarus_gc_fpath = join(output_dirpath, 'gc.icarus.txt')
-            save_icarus_GC(ref_fpath, icarus_gc_fpath)
         if qconfig.draw_circos:
             circos_gc_fpath = join(output_dirpath, 'gc.circos.txt')
-            save_circos_GC(ref_fpath, reference_length, circos_gc_fpath)
+        if icarus_gc_fpath or circos_gc_fpath:
+            save_reference_GC(ref_fpath, reference_length, icarus_gc_fpath, circos_gc_fpath)
 
         logger.info('  Reference genome:')
         logger.info('    ' + os.path.basename(ref_fpath) + ', length = ' + str(reference_length) +
@@ -214,6 +202,7 @@ def do(ref_fpath, contigs_fpaths, output_dirpath, results_dir):
     logger.info('  Contig files: ')
     lists_of_lengths = []
     numbers_of_Ns = []
+    assemblies_stats = []
     coverage_dict = dict()
     cov_pattern = re.compile(r'_cov_(\d+\.?\d*)')
     for id, contigs_fpath in enumerate(contigs_fpaths):
@@ -222,19 +211,17 @@ def do(ref_fpath, contigs_fpaths, output_dirpath, results_dir):
 
         logger.info('    ' + qutils.index_to_str(id) + assembly_label)
         # lists_of_lengths.append(fastaparser.get_lengths_from_fastafile(contigs_fpath))
-        list_of_length = []
-        number_of_Ns = 0
-        for (name, seq) in fastaparser.read_fasta(contigs_fpath):
-            list_of_length.append(len(seq))
-            number_of_Ns += seq.count('N')
+        fasta_stats = fastaparser.get_fasta_stats(contigs_fpath, calculate_GC_windows=not qconfig.no_gc)
+        for name, contig_len in zip(fasta_stats.names, fasta_stats.lengths):
             if cov_pattern.findall(name):
                 cov = int(float(cov_pattern.findall(name)[0]))
                 if len(coverage_dict[contigs_fpath]) <= cov:
                     coverage_dict[contigs_fpath] += [0] * (cov - len(coverage_dict[contigs_fpath]) + 1)
-                coverage_dict[contigs_fpath][cov] += len(seq)
+                coverage_dict[contigs_fpath][cov] += contig_len
 
-        lists_of_lengths.append(list_of_length)
-        numbers_of_Ns.append(number_of_Ns)
+        assemblies_stats.append(fasta_stats)
+        lists_of_lengths.append(list(fasta_stats.lengths))
+        numbers_of_Ns.append(sum(fasta_stats.ns))
 
     lists_of_lengths = [sorted(list, reverse=True) for list in lists_of_lengths]
     num_contigs = max([len(list_of_length) for list_of_length in lists_of_lengths])
@@ -275,7 +262,7 @@ def do(ref_fpath, contigs_fpaths, output_dirpath, results_dir):
     list_of_GC_contigs_distributions = []
     largest_contig = 0
     from . import N50
-    for id, (contigs_fpath, lengths_list, number_of_Ns) in enumerate(zip(contigs_fpaths, lists_of_lengths, numbers_of_Ns)):
+    for id, (contigs_fpath, lengths_list, number_of_Ns, fasta_stats) in enumerate(zip(contigs_fpaths, lists_of_lengths, numbers_of_Ns, assemblies_stats)):
         report = reporting.get(contigs_fpath)
         n50, l50 = N50.N50_and_L50(lengths_list)
         ng50, lg50 = None, None
@@ -286,7 +273,7 @@ def do(ref_fpath, contigs_fpaths, output_dirpath, results_dir):
         if reference_length:
             ng75, lg75 = N50.NG50_and_LG50(lengths_list, reference_length, 75)
         total_length = sum(lengths_list)
-        total_GC, GC_distribution, GC_contigs_distribution = GC_content(contigs_fpath, skip=qconfig.no_gc)
+        total_GC, GC_distribution, GC_contigs_distribution = GC_content(contigs_fpath, skip=qconfig.no_gc, fasta_stats=fasta_stats)
         list_of_GC_distributions.append(GC_distribution)
         list_of_GC_contigs_distributions.append(GC_contigs_distribution)
         logger.info('    ' + qutils.index_to_str(id) +
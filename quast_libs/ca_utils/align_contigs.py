@@ -7,17 +7,22 @@
 
 from __future__ import with_statement
 
+import hashlib
+import os
 import re
-from os.path import isfile
+from os.path import isdir, isfile, join
 import datetime
 
 from quast_libs import qconfig, qutils
+from quast_libs.ca_utils.alignment_table import AlignmentTable
 from quast_libs.ca_utils.analyze_misassemblies import Mapping
-from quast_libs.ca_utils.misc import minimap_fpath, parse_cs_tag
+from quast_libs.ca_utils.coords_file import CoordsWriter, iter_coords
+from quast_libs.ca_utils.cs_tag import iter_cs_ops, MISMATCH, INSERTION, DELETION
+from quast_libs.ca_utils.misc import minimap_fpath
 
 from quast_libs.log import get_logger
 from quast_libs.qconfig import SPLIT_ALIGN_THRESHOLD
-from quast_libs.qutils import md5, is_non_empty_file
+from quast_libs.qutils import md5, is_non_empty_file, safe_rm
 
 logger = get_logger(qconfig.LOGGER_DEFAULT_NAME)
 
@@ -49,25 +54,31 @@ def check_successful_check(fpath, contigs_fpath, ref_fpath):
     return True
 
 
-def run_minimap_agb(out_fpath, ref_fpath, contigs_fpath, log_err_fpath, index, max_threads):  # run minimap2 for AGB
+def get_minimap_preset():
+    if qconfig.is_agb_mode:
+        return 'asm20'
+    if qconfig.min_IDY < 90:
+        return 'asm20'
+    elif qconfig.min_IDY < 95:
+        return 'asm10'
+    return 'asm5'
+
+
+def get_minimap_agb_cmdline(ref_fpath, contigs_fpath, max_threads):  # run minimap2 for AGB
     mask_level = '1' if qconfig.min_IDY < 95 else '0.9'
-    cmdline = [minimap_fpath(), '-cx', 'asm20', '--mask-level', mask_level, '-N', '100',
+    cmdline = [minimap_fpath(), '-cx', get_minimap_preset(), '--mask-level', mask_level, '-N', '100',
                '--score-N', '0', '-E', '1,0', '-f', '200', '--cs', '-t', str(max_threads), ref_fpath, contigs_fpath]
-    return_code = qutils.call_subprocess(cmdline, stdout=open(out_fpath, 'w'), stderr=open(log_err_fpath, 'a'),
-                                         indent='  ' + qutils.index_to_str(index))
-    return return_code
+    return cmdline
 
 
-def run_minimap(out_fpath, ref_fpath, contigs_fpath, log_err_fpath, index, max_threads):
+def get_minimap_cmdline(ref_fpath, contigs_fpath, max_threads):
+    """
+        ref_fpath can be either a FASTA file or a minimap2 index (see create_reference_index)
+    """
     if qconfig.is_agb_mode:
-        return run_minimap_agb(out_fpath, ref_fpath, contigs_fpath, log_err_fpath, index, max_threads)
+        return get_minimap_agb_cmdline(ref_fpath, contigs_fpath, max_threads)
 
-    if qconfig.min_IDY < 90:
-        preset = 'asm20'
-    elif qconfig.min_IDY < 95:
-        preset = 'asm10'
-    else:
-        preset = 'asm5'
+    preset = get_minimap_preset()
     # -s -- min CIGAR score, -z -- affects how often to stop alignment extension, -B -- mismatch penalty
     # -O -- gap penalty, -r -- max gap size
     mask_level = '1' if qconfig.is_combined_ref else '0.9'
@@ -76,79 +87,156 @@ def run_minimap(out_fpath, ref_fpath, contigs_fpath, log_err_fpath, index, max_t
                           '-N', num_alignments, '-s', str(qconfig.min_alignment), '-z', '200']
     cmdline = [minimap_fpath(), '-c', '-x', preset] + (additional_options if not qconfig.large_genome else []) + \
               ['--mask-level', mask_level, '--min-occ', '200', '-g', '2500', '--score-N', '2', '--cs', '-t', str(max_threads), ref_fpath, contigs_fpath]
-    return_code = qutils.call_subprocess(cmdline, stdout=open(out_fpath, 'w'), stderr=open(log_err_fpath, 'a'),
-                                         indent='  ' + qutils.index_to_str(index))
-
-    return return_code
+    return cmdline
+
+
+def run_minimap(ref_fpath, contigs_fpath, log_err_fpath, index, max_threads):
+    """
+        Starts minimap2 and returns the process, PAF lines are read from its stdout while the alignment is running
+    """
+    cmdline = get_minimap_cmdline(ref_fpath, contigs_fpath, max_threads)
+    return qutils.popen_subprocess(cmdline, stderr=open(log_err_fpath, 'a'), indent='  ' + qutils.index_to_str(index))
+
+
+def get_reference_index_options():
+    return ['-x', get_minimap_preset()]
+
+
+def create_reference_index(ref_fpath, index_fpath, log_err_fpath, max_threads):
+    """
+        Builds the minimap2 index of the reference once, so minimap2 runs for different assemblies
+        do not need to index the reference again. Indexing options are defined by the preset only,
+        thus alignments are the same as with the FASTA file.
+        Returns path to the index or None if indexing failed.
+    """
+    cmdline = [minimap_fpath()] + get_reference_index_options() + ['-t', str(max_threads), '-d', index_fpath, ref_fpath]
+    return_code = qutils.call_subprocess(cmdline, stdout=open(log_err_fpath, 'a'), stderr=open(log_err_fpath, 'a'), indent='  ')
+    if return_code != 0 or not is_non_empty_file(index_fpath):
+        return None
+    return index_fpath
+
+
+def get_cached_reference_index(ref_fpath, cache_dirpath, log_err_fpath, max_threads):
+    """
+        Returns the minimap2 index of the reference from the persistent cache (--ref-index-cache),
+        the index is built only if the cache does not contain it yet.
+        Indexes are identified by the QUAST version (which defines the bundled minimap2 version),
+        the reference checksum and the indexing options.
+    """
+    if not isdir(cache_dirpath):
+        try:
+            os.makedirs(cache_dirpath)
+        except OSError:
+            if not isdir(cache_dirpath):  # may be created by a concurrent QUAST run
+                logger.warning('Failed to create the reference index cache directory ' + cache_dirpath)
+                return None
+    key_values = [qconfig.quast_version(), md5(ref_fpath)] + get_reference_index_options()
+    index_key = hashlib.md5(' '.join(key_values).encode()).hexdigest()
+    index_fpath = join(cache_dirpath, index_key + '.mmi')
+    if is_non_empty_file(index_fpath):
+        logger.info('  Using cached reference index ' + index_fpath)
+        try:
+            os.utime(index_fpath, None)  # mark the index as recently used
+        except OSError:
+            pass
+    else:
+        tmp_index_fpath = index_fpath + '.' + str(os.getpid()) + '.tmp'
+        if not create_reference_index(ref_fpath, tmp_index_fpath, log_err_fpath, max_threads):
+            safe_rm(tmp_index_fpath)
+            return None
+        os.rename(tmp_index_fpath, index_fpath)  # concurrent QUAST runs never see a partially written index
+    clean_reference_index_cache(cache_dirpath, qconfig.ref_index_cache_size * 1024 ** 3, index_fpath)
+    return index_fpath
+
+
+def clean_reference_index_cache(cache_dirpath, max_size, used_index_fpath):
+    """
+        Removes the least recently used indexes until the total size of the cache is at most max_size bytes
+    """
+    indexes = []
+    for fname in os.listdir(cache_dirpath):
+        if fname.endswith('.mmi'):
+            fpath = join(cache_dirpath, fname)
+            try:
+                indexes.append((os.path.getmtime(fpath), os.path.getsize(fpath), fpath))
+            except OSError:  # removed by a concurrent QUAST run
+                continue
+    total_size = sum(size for _, size, _ in indexes)
+    for _, size, fpath in sorted(indexes):
+        if total_size <= max_size:
+            break
+        if fpath == used_index_fpath:
+            continue
+        safe_rm(fpath)
+        total_size -= size
 
 
 def get_aux_out_fpaths(fname):
-    coords_fpath = fname + '.coords'
-    coords_filtered_fpath = fname + '.coords.filtered'
+    coords_fpath = fname + '.coords.bin'
+    coords_filtered_fpath = fname + '.coords.filtered.bin'
     unaligned_fpath = fname + '.unaligned' if not qconfig.space_efficient else '/dev/null'
     used_snps_fpath = fname + '.used_snps' + ('.gz' if not qconfig.no_gzip else '') if not qconfig.space_efficient else '/dev/null'
     return coords_fpath, coords_filtered_fpath, unaligned_fpath, used_snps_fpath
 
 
-def parse_minimap_output(raw_coords_fpath, coords_fpath):
-    cigar_pattern = re.compile(r'(\d+[M=XIDNSH])')
-
-    total_aligned_bases = 0
-    with open(raw_coords_fpath) as f:
-        with open(coords_fpath, 'w') as coords_file:
-            for line in f:
-                fs = line.split('\t')
-                if len(fs) < 10:
-                    continue
-                contig, align_start, align_end, strand, ref_name, ref_start = \
-                    fs[0], fs[2], fs[3], fs[4], fs[5], fs[7]
-                align_start, align_end, ref_start = map(int, (align_start, align_end, ref_start))
-                align_start += 1
-                ref_start += 1
-                if fs[-1].startswith('cs'):
-                    cs = fs[-1].strip()
-                    cigar = fs[-2]
-                else:
-                    cs = ''
-                    cigar = fs[-1]
-                cigar = cigar.split(':')[-1]
-
-                strand_direction = 1
-                if strand == '-':
-                    align_start, align_end = align_end, align_start
-                    strand_direction = -1
-                align_len = 0
-                ref_len = 0
-                matched_bases, bases_in_mapping = map(int, (fs[9], fs[10]))
-                operations = cigar_pattern.findall(cigar)
-
-                for op in operations:
-                    n_bases, operation = int(op[:-1]), op[-1]
-                    if operation == 'S' or operation == 'H':
-                        align_start += n_bases
-                    elif operation == 'M' or operation == '=' or operation == 'X':
-                        align_len += n_bases
-                        ref_len += n_bases
-                    elif operation == 'D':
-                        ref_len += n_bases
-                    elif operation == 'I':
-                        align_len += n_bases
-
-                align_end = align_start + (align_len - 1) * strand_direction
-                ref_end = ref_start + ref_len - 1
-                total_aligned_bases += align_len
-
-                idy = '%.2f' % (matched_bases * 100.0 / bases_in_mapping)
-                if ref_name != "*":
-                    if float(idy) >= qconfig.min_IDY:
-                        align = Mapping(s1=ref_start, e1=ref_end, s2=align_start, e2=align_end, len1=ref_len,
-                                        len2=align_len, idy=idy, ref=ref_name, contig=contig, cigar=cs)
-                        coords_file.write(align.coords_str() + '\n')
-                    else:
-                        split_align(coords_file, align_start, strand_direction, ref_start, ref_name, contig, cs)
-
-
-def split_align(coords_file, align_start, strand_direction, ref_start, ref_name, contig, cs):
+cigar_pattern = re.compile(r'(\d+[M=XIDNSH])')
+
+
+def parse_paf_line(line):
+    """
+        Converts a line of minimap2 output (PAF) to the list of alignments
+        (empty if the contig is not aligned, several ones if the alignment is split due to low identity)
+    """
+    fs = line.split('\t')
+    if len(fs) < 10:
+        return []
+    contig, align_start, align_end, strand, ref_name, ref_start = \
+        fs[0], fs[2], fs[3], fs[4], fs[5], fs[7]
+    align_start, align_end, ref_start = map(int, (align_start, align_end, ref_start))
+    align_start += 1
+    ref_start += 1
+    if fs[-1].startswith('cs'):
+        cs = fs[-1].strip()
+        cigar = fs[-2]
+    else:
+        cs = ''
+        cigar = fs[-1]
+    cigar = cigar.split(':')[-1]
+
+    strand_direction = 1
+    if strand == '-':
+        align_start, align_end = align_end, align_start
+        strand_direction = -1
+    align_len = 0
+    ref_len = 0
+    matched_bases, bases_in_mapping = map(int, (fs[9], fs[10]))
+    operations = cigar_pattern.findall(cigar)
+
+    for op in operations:
+        n_bases, operation = int(op[:-1]), op[-1]
+        if operation == 'S' or operation == 'H':
+            align_start += n_bases
+        elif operation == 'M' or operation == '=' or operation == 'X':
+            align_len += n_bases
+            ref_len += n_bases
+        elif operation == 'D':
+            ref_len += n_bases
+        elif operation == 'I':
+            align_len += n_bases
+
+    align_end = align_start + (align_len - 1) * strand_direction
+    ref_end = ref_start + ref_len - 1
+
+    idy = '%.2f' % (matched_bases * 100.0 / bases_in_mapping)
+    if ref_name == "*":
+        return []
+    if float(idy) >= qconfig.min_IDY:
+        return [Mapping(s1=ref_start, e1=ref_end, s2=align_start, e2=align_end, len1=ref_len,
+                        len2=align_len, idy=idy, ref=ref_name, contig=contig, cigar=cs)]
+    return split_align(align_start, strand_direction, ref_start, ref_name, contig, cs)
+
+
+def split_align(align_start, strand_direction, ref_start, ref_name, contig, cs):
     def _write_align():
         if align.len2 < qconfig.min_alignment or not align.len1 or not align.cigar:
             return
@@ -156,7 +244,8 @@ def split_align(coords_file, align_start, strand_direction, ref_start, ref_name,
         align.e2 = align.s2 + (align.len2 - 1) * strand_direction
         align.idy = '%.2f' % (matched_bases * 100.0 / align.len1)
         if float(align.idy) >= qconfig.min_IDY:
-            coords_file.write(align.coords_str() + '\n')
+            split_aligns.append(Mapping(align.s1, align.e1, align.s2, align.e2, align.len1, align.len2, align.idy,
+                                        align.ref, align.contig, align.cigar))
 
     def _try_split(matched_bases, n_refbases, n_alignbases):
         ## split alignment in positions of indels or stretch of mismatches to get smaller alignments with higher identity
@@ -170,33 +259,48 @@ def split_align(coords_file, align_start, strand_direction, ref_start, ref_name,
         else:
             align.len1 += n_refbases
             align.len2 += n_alignbases
-            align.cigar += op
+            align.cigar += op + bases
         return matched_bases
 
+    split_aligns = []
     matched_bases = 0
     align = Mapping(s1=ref_start, e1=ref_start, s2=align_start, e2=align_start, len1=0,
                     len2=0, ref=ref_name, contig=contig, cigar='')
-    for op in parse_cs_tag(cs):
-        if op.startswith(':'):
-            n_bases = int(op[1:])
-        else:
-            n_bases = len(op) - 1
-        if op.startswith('*'):
-            n_bases = op.count('*')
+    for op, n_bases, bases in iter_cs_ops(cs):
+        if op == MISMATCH:
             matched_bases = _try_split(matched_bases, n_bases, n_bases)
-        elif op.startswith('+'):
+        elif op == INSERTION:
             matched_bases = _try_split(matched_bases, 0, n_bases)
-        elif op.startswith('-'):
+        elif op == DELETION:
             matched_bases = _try_split(matched_bases, n_bases, 0)
         else:
-            align.cigar += op
+            align.cigar += op + str(n_bases)
             align.len1 += n_bases
             align.len2 += n_bases
             matched_bases += n_bases
     _write_align()
+    return split_aligns
+
 
+def read_coords(coords_fpath):
+    aligns = AlignmentTable()
+    for s1, e1, s2, e2, len1, len2, idy, ref, contig, cs, _ in iter_coords(coords_fpath, with_cs=True):
+        aligns.add(Mapping(s1, e1, s2, e2, len1, len2, idy, ref, contig, cs))
+    return aligns
 
-def align_contigs(output_fpath, out_basename, ref_fpath, contigs_fpath, old_contigs_fpath, index, threads, log_out_fpath, log_err_fpath):
+
+def has_existing_alignments(coords_fpath, out_basename, ref_fpath, old_contigs_fpath):
+    successful_check_fpath = out_basename + '.sf'
+    return isfile(successful_check_fpath) and isfile(coords_fpath) and \
+           check_successful_check(successful_check_fpath, old_contigs_fpath, ref_fpath)
+
+
+def align_contigs(output_fpath, out_basename, ref_fpath, contigs_fpath, old_contigs_fpath, index, threads, log_out_fpath, log_err_fpath,
+                  ref_index_fpath=None):
+    """
+        Returns the alignment status and alignments grouped by contig names (AlignmentTable).
+        The alignments are also saved to the coords file to reuse them in the next runs (not in --space-efficient mode)
+    """
     log_out_f = open(log_out_fpath, 'w')
 
     successful_check_fpath = out_basename + '.sf'
@@ -204,29 +308,42 @@ def align_contigs(output_fpath, out_basename, ref_fpath, contigs_fpath, old_cont
 
     # Checking if there are existing previous alignments.
     # If they exist, using them to save time.
-    using_existing_alignments = False
-    if isfile(successful_check_fpath) and isfile(output_fpath):
-        if check_successful_check(successful_check_fpath, old_contigs_fpath, ref_fpath):
-            log_out_f.write('\tUsing existing alignments...\n')
-            logger.info('  ' + qutils.index_to_str(index) + 'Using existing alignments... ')
-            using_existing_alignments = True
-
-    if not using_existing_alignments:
-        log_out_f.write('\tAligning contigs to the reference\n')
-        logger.info('  ' + qutils.index_to_str(index) + 'Aligning contigs to the reference')
-
-        tmp_output_fpath = output_fpath + '_tmp'
-        exit_code = run_minimap(tmp_output_fpath, ref_fpath, contigs_fpath, log_err_fpath, index, threads)
-        if exit_code != 0:
-            return AlignerStatus.ERROR
-
-        if not isfile(tmp_output_fpath):
-            return AlignerStatus.FAILED
-        if not is_non_empty_file(tmp_output_fpath):
-            return AlignerStatus.NOT_ALIGNED
-
+    if has_existing_alignments(output_fpath, out_basename, ref_fpath, old_contigs_fpath):
+        log_out_f.write('\tUsing existing alignments...\n')
+        logger.info('  ' + qutils.index_to_str(index) + 'Using existing alignments... ')
+        return AlignerStatus.OK, read_coords(output_fpath)
+
+    log_out_f.write('\tAligning contigs to the reference\n')
+    logger.info('  ' + qutils.index_to_str(index) + 'Aligning contigs to the reference')
+
+    save_coords = not qconfig.space_efficient or qconfig.use_all_alignments
+    threads = qutils.take_threads(threads)
+    proc = run_minimap(ref_index_fpath or ref_fpath, contigs_fpath, log_err_fpath, index, threads)
+    is_empty_output = True
+    aligns = AlignmentTable()
+    coords_writer = CoordsWriter(output_fpath) if save_coords else None
+    try:
+        for line in proc.stdout:
+            is_empty_output = False
+            for align in parse_paf_line(line):
+                if coords_writer:
+                    coords_writer.add(align)
+                aligns.add(align)  # identity is saved with two decimal places, the same value as in the coords file
+    except:
+        proc.kill()  # minimap2 would be blocked on writing the rest of the output otherwise
+        raise
+    finally:
+        proc.stdout.close()
+        return_code = proc.wait()
+        qutils.release_threads()
+        if coords_writer:
+            coords_writer.close()
+    if return_code != 0:
+        return AlignerStatus.ERROR, None
+    if is_empty_output:
+        return AlignerStatus.NOT_ALIGNED, None
+
+    if save_coords:
         create_successful_check(successful_check_fpath, old_contigs_fpath, ref_fpath)
-        log_out_f.write('Filtering alignments...\n')
-        parse_minimap_output(tmp_output_fpath, output_fpath)
-    return AlignerStatus.OK
-
+    log_out_f.write('Filtering alignments...\n')
+    return AlignerStatus.OK, aligns
@@ -0,0 +1,106 @@
+############################################################################
+# Copyright (c) 2015-2019 Saint Petersburg State University
+# Copyright (c) 2011-2015 Saint Petersburg Academic University
+# All Rights Reserved
+# See file LICENSE for details.
+############################################################################
+#
+# Compact storage of all alignments of an assembly. Coordinates are kept in
+# parallel array columns, reference names are interned and cs tags are
+# concatenated into large string blocks, so an alignment takes several machine
+# words instead of a Python object with a dozen attributes. Mapping objects
+# are created only when the alignments of a contig are requested.
+#
+############################################################################
+
+from array import array
+
+from quast_libs.ca_utils.analyze_misassemblies import Mapping
+
+CS_BLOCK_SIZE = 10000  # number of cs tags joined into one string
+
+
+class AlignmentTable(object):
+    """
+        Read-only dict-like container: contig name -> list of Mapping.
+        New Mapping objects are returned on every request, so they can be modified by the caller
+    """
+    def __init__(self):
+        self.s1, self.e1, self.s2, self.e2, self.len1, self.len2 = [array('l') for _ in range(6)]
+        self.idy = array('d')
+        self.ref_ids = array('l')
+        self.ref_names = []
+        self.ref_ids_by_name = {}
+        self.rows_by_contig = {}  # contig name -> array of row indices
+        self.cs_blocks = []
+        self.cs_starts, self.cs_ends = array('l'), array('l')
+        self.cs_parts = []  # cs tags of the last block which is not joined yet
+        self.cs_block_len = 0
+
+    def add(self, mapping):
+        row = len(self.s1)
+        for column, value in ((self.s1, mapping.s1), (self.e1, mapping.e1), (self.s2, mapping.s2),
+                              (self.e2, mapping.e2), (self.len1, mapping.len1), (self.len2, mapping.len2)):
+            column.append(value)
+        self.idy.append(float(mapping.idy))
+        if mapping.ref not in self.ref_ids_by_name:
+            self.ref_ids_by_name[mapping.ref] = len(self.ref_names)
+            self.ref_names.append(mapping.ref)
+        self.ref_ids.append(self.ref_ids_by_name[mapping.ref])
+        self.rows_by_contig.setdefault(mapping.contig, array('l')).append(row)
+
+        cs = mapping.cigar or ''
+        self.cs_starts.append(self.cs_block_len)
+        self.cs_block_len += len(cs)
+        self.cs_ends.append(self.cs_block_len)
+        self.cs_parts.append(cs)
+        if len(self.cs_parts) == CS_BLOCK_SIZE:
+            self.cs_blocks.append(''.join(self.cs_parts))
+            self.cs_parts = []
+            self.cs_block_len = 0
+
+    def get_cs(self, row):
+        block_idx, idx_in_block = divmod(row, CS_BLOCK_SIZE)
+        if block_idx < len(self.cs_blocks):
+            return self.cs_blocks[block_idx][self.cs_starts[row]:self.cs_ends[row]]
+        return self.cs_parts[idx_in_block]
+
+    def get_mapping(self, row, contig):
+        return Mapping(self.s1[row], self.e1[row], self.s2[row], self.e2[row], self.len1[row], self.len2[row],
+                       self.idy[row], self.ref_names[self.ref_ids[row]], contig, self.get_cs(row))
+
+    def select(self, contigs):
+        """
+            Returns a new table with alignments of the given contigs only
+        """
+        table = AlignmentTable()
+        for contig in contigs:
+            for mapping in self.get(contig, []):
+                table.add(mapping)
+        return table
+
+    def __getitem__(self, contig):
+        return [self.get_mapping(row, contig) for row in self.rows_by_contig[contig]]
+
+    def get(self, contig, default=None):
+        if contig not in self.rows_by_contig:
+            return default
+        return self[contig]
+
+    def __contains__(self, contig):
+        return contig in self.rows_by_contig
+
+    def __len__(self):
+        return len(self.rows_by_contig)
+
+    def __iter__(self):
+        return iter(self.rows_by_contig)
+
+    def keys(self):
+        return self.rows_by_contig.keys()
+
+    def count(self, contig):
+        """
+            Number of alignments of the contig
+        """
+        return len(self.rows_by_contig.get(contig, []))
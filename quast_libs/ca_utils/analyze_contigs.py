@@ -4,12 +4,24 @@
 # All Rights Reserved
 # See file LICENSE for details.
 ############################################################################
+from __future__ import division
+import multiprocessing
+import os
+import shutil
+import tempfile
 from collections import defaultdict
 
 from quast_libs import fastaparser, qconfig
-from quast_libs.ca_utils.analyze_misassemblies import process_misassembled_contig, IndelsInfo, find_all_sv, Misassembly
+from quast_libs.ca_utils.analyze_misassemblies import process_misassembled_contig, IndelsInfo, Misassembly
+from quast_libs.ca_utils.coords_file import CoordsWriter
 from quast_libs.ca_utils.best_set_selection import get_best_aligns_sets, get_used_indexes, score_single_align
-from quast_libs.ca_utils.misc import ref_labels_by_chromosomes
+from quast_libs.ca_utils.misc import ref_labels_by_chromosomes, CAOutput, close_handlers
+from quast_libs.qutils import run_parallel
+
+CHUNKS_PER_THREAD = 4  # more chunks than processes to balance the load, since contigs differ in complexity
+MIN_CHUNK_WEIGHT = 100  # contigs + alignments, smaller chunks are not worth a separate process
+ca_output_fields = ['stdout_f', 'misassembly_f', 'coords_filtered_f', 'used_snps_f', 'icarus_out_f']
+chunk_out_fields = ca_output_fields + ['unaligned', 'unaligned_info']
 
 
 def add_potential_misassembly(ref, misassemblies_by_ref, refs_with_translocations):
@@ -91,8 +103,8 @@ def save_unaligned_info(sorted_aligns, contig, ctg_len, unaligned_len, unaligned
     unaligned_info_file.write('\t'.join([contig, str(ctg_len), str(unaligned_len), unaligned_type, unaligned_parts_str]) + '\n')
 
 
-def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fpath, aligns, ref_features, ref_lens,
-                    is_cyclic=None):
+def analyze_contigs_chunk(ca_output, fasta_index, contig_names, unaligned_file, unaligned_info_file, aligns, ref_features,
+                          ref_lens, is_cyclic, region_struct_variations):
     maxun = 10
     epsilon = 0.99
 
@@ -113,8 +125,6 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
     misassembled_contigs = dict()
     misassemblies_in_contigs = []
 
-    region_struct_variations = find_all_sv(qconfig.bed)
-
     istranslocations_by_ref = dict()
     misassemblies_by_ref = defaultdict(list)
     for ref in ref_labels_by_chromosomes.values():
@@ -123,12 +133,9 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
     # for counting SNPs and indels (both original (.all_snps) and corrected from local misassemblies)
     total_indels_info = IndelsInfo()
 
-    unaligned_file = open(unaligned_fpath, 'w')
-    unaligned_info_file = open(unaligned_info_fpath, 'w')
-    unaligned_info_file.write('\t'.join(['Contig', 'Total_length', 'Unaligned_length', 'Unaligned_type', 'Unaligned_parts']) + '\n')
-    for contig, seq in fastaparser.read_fasta(contigs_fpath):
+    for contig in contig_names:
         #Recording contig stats
-        ctg_len = len(seq)
+        ctg_len = fasta_index.length(contig)
         ca_output.stdout_f.write('CONTIG: %s (%dbp)\n' % (contig, ctg_len))
         contig_type = 'unaligned'
         misassemblies_in_contigs.append(0)
@@ -139,6 +146,7 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
 
         #Check if this contig aligned to the reference
         if filtered_aligns:
+            seq = fasta_index.fetch(contig)
             contig_type = 'correct'
             #Sort aligns by aligned_length * identity - unaligned_length (as we do in BSS)
             sorted_aligns = sorted(filtered_aligns, key=lambda x: (score_single_align(x), x.len2), reverse=True)
@@ -172,7 +180,7 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
                     ca_output.stdout_f.write('\t\tOne align captures most of this contig: %s\n' % str(top_aligns[0]))
                     ca_output.icarus_out_f.write(top_aligns[0].icarus_report_str() + '\n')
                     ref_aligns.setdefault(top_aligns[0].ref, []).append(top_aligns[0])
-                    ca_output.coords_filtered_f.write(top_aligns[0].coords_str() + '\n')
+                    ca_output.coords_filtered_f.add(top_aligns[0])
                     aligned_lengths.append(top_aligns[0].len2)
                     contigs_aligned_lengths[-1] = top_aligns[0].len2
                 else:
@@ -200,7 +208,7 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
                         ref_aligns.setdefault(top_aligns[0].ref, []).append(top_aligns[0])
                         aligned_lengths.append(top_aligns[0].len2)
                         contigs_aligned_lengths[-1] = top_aligns[0].len2
-                        ca_output.coords_filtered_f.write(top_aligns[0].coords_str() + '\n')
+                        ca_output.coords_filtered_f.add(top_aligns[0])
                         top_aligns = top_aligns[1:]
                         for align in top_aligns:
                             ca_output.stdout_f.write('\t\t\tSkipping alignment ' + str(align) + '\n')
@@ -219,7 +227,7 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
                                 aligned_lengths.append(top_aligns[0].len2)
                                 contigs_aligned_lengths[-1] = top_aligns[0].len2
                             ambiguous_contigs_extra_bases += top_aligns[0].len2
-                            ca_output.coords_filtered_f.write(top_aligns[0].coords_str() + ' ambiguous\n')
+                            ca_output.coords_filtered_f.add(top_aligns[0], is_ambiguous=True)
                             top_aligns = top_aligns[1:]
             else:
                 # choose appropriate alignments (to maximize total size of contig alignment and reduce # misassemblies)
@@ -268,7 +276,7 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
                                 ca_output.stdout_f.write('\t\tAlignment: %s\n' % str(align))
                                 ref_aligns.setdefault(align.ref, []).append(align)
                                 ambiguous_contigs_extra_bases += align.len2
-                                ca_output.coords_filtered_f.write(align.coords_str() + " ambiguous\n")
+                                ca_output.coords_filtered_f.add(align, is_ambiguous=True)
                                 if idx not in the_best_set.indexes:
                                     ca_output.icarus_out_f.write(align.icarus_report_str(is_best=False) + '\n')
 
@@ -281,7 +289,7 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
                     the_only_align = real_aligns[0]
 
                     #There is only one alignment of this contig to the reference
-                    ca_output.coords_filtered_f.write(the_only_align.coords_str() + '\n')
+                    ca_output.coords_filtered_f.add(the_only_align)
                     aligned_lengths.append(the_only_align.len2)
                     contigs_aligned_lengths[-1] = the_only_align.len2
 
@@ -347,7 +355,7 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
                             ca_output.stdout_f.write('\t\tAlignment: %s\n' % str(align))
                             ca_output.icarus_out_f.write(align.icarus_report_str() + '\n')
                             ca_output.icarus_out_f.write('unknown\n')
-                            ca_output.coords_filtered_f.write(align.coords_str() + '\n')
+                            ca_output.coords_filtered_f.add(align)
                             aligned_lengths.append(align.len2)
                             ref_aligns.setdefault(align.ref, []).append(align)
 
@@ -382,7 +390,7 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
 
             #Increment unaligned contig count and bases
             unaligned += 1
-            number_ns = seq.count('N')
+            number_ns = fasta_index.fetch(contig).count('N')
             fully_unaligned_bases += ctg_len - number_ns
             ca_output.stdout_f.write('\t\tUnaligned bases: %d (number of Ns: %d)\n' % (ctg_len, number_ns))
             save_unaligned_info([], contig, ctg_len, ctg_len, unaligned_info_file)
@@ -390,9 +398,147 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
         ca_output.icarus_out_f.write('\t'.join(['CONTIG', contig, str(ctg_len), contig_type]) + '\n')
         ca_output.stdout_f.write('\n')
 
+    counters = {'unaligned': unaligned, 'partially_unaligned': partially_unaligned,
+                'fully_unaligned_bases': fully_unaligned_bases, 'partially_unaligned_bases': partially_unaligned_bases,
+                'ambiguous_contigs': ambiguous_contigs, 'ambiguous_contigs_extra_bases': ambiguous_contigs_extra_bases,
+                'ambiguous_contigs_len': ambiguous_contigs_len,
+                'half_unaligned_with_misassembly': half_unaligned_with_misassembly,
+                'misassembly_internal_overlap': misassembly_internal_overlap}
+    return counters, ref_aligns, total_indels_info, aligned_lengths, region_misassemblies, misassembled_contigs, \
+           misassemblies_in_contigs, contigs_aligned_lengths, misassemblies_by_ref, istranslocations_by_ref
+
+
+def get_chunk_fpaths(out_fpath_prefix):
+    return [out_fpath_prefix + '.' + field for field in chunk_out_fields]
+
+
+def open_chunk_file(field, fpath):
+    if field == 'coords_filtered_f':
+        return CoordsWriter(fpath, with_index=False)  # the merged file is indexed
+    return open(fpath, 'w')
+
+
+def analyze_contigs_chunk_in_files(out_fpath_prefix, contig_names, aligns, used_fields, fasta_index, ref_features,
+                                   ref_lens, is_cyclic, region_struct_variations):
+    """
+        Analyzes a chunk of contigs in a separate process, writes the output into temporary files,
+        fields of CAOutput which are None in the main process remain None
+    """
+    out_files = [open_chunk_file(field, fpath) if field in used_fields else None
+                 for field, fpath in zip(chunk_out_fields, get_chunk_fpaths(out_fpath_prefix))]
+    ca_output = CAOutput(*out_files[:len(ca_output_fields)])
+    unaligned_file, unaligned_info_file = out_files[len(ca_output_fields):]
+    chunk_result = analyze_contigs_chunk(ca_output, fasta_index, contig_names, unaligned_file, unaligned_info_file,
+                                         aligns, ref_features, ref_lens, is_cyclic, region_struct_variations)
+    close_handlers(ca_output)
+    unaligned_file.close()
+    unaligned_info_file.close()
+    return chunk_result
+
+
+def split_contigs(contig_names, aligns, max_chunks):
+    """
+        Splits contigs into chunks of consecutive contigs with similar numbers of alignments
+    """
+    weights = [1 + aligns.count(contig) for contig in contig_names]
+    chunks_num = max(1, min(max_chunks, sum(weights) // MIN_CHUNK_WEIGHT))
+    chunk_weight = sum(weights) / chunks_num
+    chunks = [[]]
+    cur_weight = 0
+    for contig, weight in zip(contig_names, weights):
+        if cur_weight >= chunk_weight and len(chunks) < chunks_num:
+            chunks.append([])
+            cur_weight = 0
+        chunks[-1].append(contig)
+        cur_weight += weight
+    return chunks
+
+
+def append_file(fpath, out_f):
+    with open(fpath, 'rb' if 'b' in out_f.mode else 'r') as f:
+        shutil.copyfileobj(f, out_f)
+    os.remove(fpath)
+
+
+def merge_chunk_results(chunk_results):
+    """
+        Merges results of analyze_contigs_chunk for consecutive chunks of contigs in the same way as they were
+        computed by a single analyze_contigs_chunk call
+    """
+    counters = defaultdict(int)
+    ref_aligns = dict()
+    total_indels_info = IndelsInfo()
+    aligned_lengths = []
+    region_misassemblies = []
+    misassembled_contigs = dict()
+    misassemblies_in_contigs = []
+    contigs_aligned_lengths = []
+    misassemblies_by_ref = defaultdict(list)
+    istranslocations_by_ref = dict()
+    for chunk_counters, chunk_ref_aligns, chunk_indels_info, chunk_aligned_lengths, chunk_region_misassemblies, \
+            chunk_misassembled_contigs, chunk_misassemblies_in_contigs, chunk_contigs_aligned_lengths, \
+            chunk_misassemblies_by_ref, chunk_istranslocations_by_ref in chunk_results:
+        for name, value in chunk_counters.items():
+            counters[name] += value
+        for ref, aligns in chunk_ref_aligns.items():
+            ref_aligns.setdefault(ref, []).extend(aligns)
+        total_indels_info += chunk_indels_info
+        aligned_lengths += chunk_aligned_lengths
+        region_misassemblies += chunk_region_misassemblies
+        misassembled_contigs.update(chunk_misassembled_contigs)
+        misassemblies_in_contigs += chunk_misassemblies_in_contigs
+        contigs_aligned_lengths += chunk_contigs_aligned_lengths
+        for ref, misassemblies in chunk_misassemblies_by_ref.items():
+            misassemblies_by_ref[ref].extend(misassemblies)
+        for ref, istranslocations in chunk_istranslocations_by_ref.items():
+            istranslocations_by_ref.setdefault(ref, defaultdict(int))
+            for ref2, value in istranslocations.items():
+                istranslocations_by_ref[ref][ref2] += value
+    istranslocations_by_ref = dict((ref, dict(istranslocations)) for ref, istranslocations in istranslocations_by_ref.items())
+    return counters, ref_aligns, total_indels_info, aligned_lengths, region_misassemblies, misassembled_contigs, \
+           misassemblies_in_contigs, contigs_aligned_lengths, misassemblies_by_ref, istranslocations_by_ref
+
+
+def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fpath, aligns, ref_features, ref_lens,
+                    region_struct_variations, is_cyclic=None, threads=1):
+    unaligned_file = open(unaligned_fpath, 'w')
+    unaligned_info_file = open(unaligned_info_fpath, 'w')
+    unaligned_info_file.write('\t'.join(['Contig', 'Total_length', 'Unaligned_length', 'Unaligned_type', 'Unaligned_parts']) + '\n')
+    fasta_index = fastaparser.FastaIndex(contigs_fpath)
+    contig_names = fasta_index.names()
+    chunks = [contig_names]
+    if threads > 1 and not qconfig.memory_efficient and not multiprocessing.current_process().daemon:
+        chunks = split_contigs(contig_names, aligns, threads * CHUNKS_PER_THREAD)
+    if len(chunks) > 1:
+        # chunks are analyzed in separate processes sharing the memory-mapped contigs,
+        # their output files are concatenated in the order of contigs
+        out_files = [getattr(ca_output, field) for field in ca_output_fields] + [unaligned_file, unaligned_info_file]
+        used_fields = [field for field, out_f in zip(chunk_out_fields, out_files) if out_f]
+        chunks_dirpath = tempfile.mkdtemp(dir=qconfig.output_dirpath)
+        out_fpath_prefixes = [os.path.join(chunks_dirpath, 'chunk%d' % i) for i in range(len(chunks))]
+        parallel_args = [(out_fpath_prefix, chunk, aligns.select(chunk))
+                         for out_fpath_prefix, chunk in zip(out_fpath_prefixes, chunks)]
+        common_args = (used_fields, fasta_index, ref_features, ref_lens, is_cyclic, region_struct_variations)
+        chunk_results = run_parallel(analyze_contigs_chunk_in_files, parallel_args, min(threads, len(chunks)),
+                                     common_args=common_args)
+        for out_fpath_prefix in out_fpath_prefixes:
+            for chunk_fpath, out_f in zip(get_chunk_fpaths(out_fpath_prefix), out_files):
+                if out_f:
+                    append_file(chunk_fpath, out_f)
+        shutil.rmtree(chunks_dirpath, ignore_errors=True)
+        counters, ref_aligns, total_indels_info, aligned_lengths, region_misassemblies, misassembled_contigs, \
+            misassemblies_in_contigs, contigs_aligned_lengths, misassemblies_by_ref, istranslocations_by_ref = \
+            merge_chunk_results(list(zip(*chunk_results)))
+    else:
+        counters, ref_aligns, total_indels_info, aligned_lengths, region_misassemblies, misassembled_contigs, \
+            misassemblies_in_contigs, contigs_aligned_lengths, misassemblies_by_ref, istranslocations_by_ref = \
+            analyze_contigs_chunk(ca_output, fasta_index, contig_names, unaligned_file, unaligned_info_file, aligns,
+                                  ref_features, ref_lens, is_cyclic, region_struct_variations)
+    fasta_index.close()
     unaligned_file.close()
     unaligned_info_file.close()
     misassembled_bases = sum(misassembled_contigs.values())
+    half_unaligned_with_misassembly = counters['half_unaligned_with_misassembly']
 
     # special case: --skip-unaligned-mis-contigs is specified
     if qconfig.unaligned_mis_threshold == 0.0:
@@ -401,11 +547,13 @@ def analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fp
     result = {'region_misassemblies': region_misassemblies,
               'region_struct_variations': region_struct_variations.get_count() if region_struct_variations else None,
               'misassembled_contigs': misassembled_contigs, 'misassembled_bases': misassembled_bases,
-              'misassembly_internal_overlap': misassembly_internal_overlap,
-              'unaligned': unaligned, 'partially_unaligned': partially_unaligned,
-              'partially_unaligned_bases': partially_unaligned_bases, 'fully_unaligned_bases': fully_unaligned_bases,
-              'ambiguous_contigs': ambiguous_contigs, 'ambiguous_contigs_extra_bases': ambiguous_contigs_extra_bases,
-              'ambiguous_contigs_len': ambiguous_contigs_len,
+              'misassembly_internal_overlap': counters['misassembly_internal_overlap'],
+              'unaligned': counters['unaligned'], 'partially_unaligned': counters['partially_unaligned'],
+              'partially_unaligned_bases': counters['partially_unaligned_bases'],
+              'fully_unaligned_bases': counters['fully_unaligned_bases'],
+              'ambiguous_contigs': counters['ambiguous_contigs'],
+              'ambiguous_contigs_extra_bases': counters['ambiguous_contigs_extra_bases'],
+              'ambiguous_contigs_len': counters['ambiguous_contigs_len'],
               'half_unaligned_with_misassembly': half_unaligned_with_misassembly,
               'misassemblies_by_ref': misassemblies_by_ref,
               'istranslocations_by_refs': istranslocations_by_ref}
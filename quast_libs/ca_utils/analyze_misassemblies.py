@@ -8,8 +8,12 @@
 from __future__ import with_statement
 from __future__ import division
 
+from collections import defaultdict
+
 from quast_libs import qconfig
-from quast_libs.ca_utils.misc import is_same_reference, get_ref_by_chromosome, parse_cs_tag
+from quast_libs.ca_utils.coverage import IntervalIndex
+from quast_libs.ca_utils.cs_tag import CsTag
+from quast_libs.ca_utils.misc import is_same_reference, get_ref_by_chromosome
 
 from quast_libs.log import get_logger
 logger = get_logger(qconfig.LOGGER_DEFAULT_NAME)
@@ -36,23 +40,75 @@ class Misassembly:
     SCF_INTERSPECTRANSLOCATION = 15
 
 
+MAX_ERROR_SV = 100  # qconfig.smgap / 4  # min(2 * qconfig.smgap, max(qconfig.smgap, inconsistency * 0.05))
+MAX_ERROR_TRIVIAL_DEL = 250
+
+
+def get_sv_ci(sv):  # confidence interval of the breakpoint
+    max_error = MAX_ERROR_TRIVIAL_DEL if sv.sv_type == 'QuastDEL' else MAX_ERROR_SV
+    return sv.s1 - max_error, sv.e1 + max_error
+
+
 class StructuralVariations(object):
     def __init__(self):
         self.inversions = []
         self.relocations = []
         self.translocations = []
+        # chromosome -> IntervalIndex of confidence intervals of the first (or the second) breakpoints,
+        # values are indices in the lists above
+        self.translocations_index = dict()
+        self.inversions_index = dict()
+        self.inversions_end_index = dict()
+        self.relocations_index = dict()
 
     def get_count(self):
         return len(self.inversions) + len(self.relocations) + len(self.translocations)
 
+    def build_indexes(self):
+        def __build_index(variations, breakpoint_idx=0):
+            intervals_by_ref = defaultdict(list)
+            for index, sv in enumerate(variations):
+                intervals_by_ref[sv[breakpoint_idx].ref].append(get_sv_ci(sv[breakpoint_idx]) + (index,))
+            return dict((ref, IntervalIndex(intervals)) for ref, intervals in intervals_by_ref.items())
+
+        self.translocations_index = __build_index(self.translocations)
+        self.inversions_index = __build_index(self.inversions)
+        self.inversions_end_index = __build_index(self.inversions, breakpoint_idx=1)
+        self.relocations_index = __build_index(self.relocations)
+
 
 class Mapping(object):
+    __slots__ = ('s1', 'e1', 's2', 'e2', 'len1', 'len2', 'idy', 'ref', 'contig', '_cigar', '_cs', 'ns_pos', 'sv_type')
+
     def __init__(self, s1, e1, s2=None, e2=None, len1=None, len2=None, idy=None, ref=None, contig=None, cigar=None, ns_pos=None, sv_type=None):
         self.s1, self.e1, self.s2, self.e2, self.len1, self.len2, self.idy, self.ref, self.contig = s1, e1, s2, e2, len1, len2, idy, ref, contig
         self.cigar = cigar
         self.ns_pos = ns_pos
         self.sv_type = sv_type
 
+    @property
+    def cigar(self):
+        if self._cigar is None and self._cs is not None:
+            self._cigar = self._cs.to_str()
+        return self._cigar
+
+    @cigar.setter
+    def cigar(self, cigar):
+        self._cigar = cigar
+        self._cs = None
+
+    @property
+    def cs(self):
+        """cs tag parsed into operations (see CsTag), it is parsed only once and shared with the clones"""
+        if self._cs is None:
+            self._cs = CsTag(self._cigar)
+        return self._cs
+
+    @cs.setter
+    def cs(self, cs):
+        self._cs = cs
+        self._cigar = None
+
     @classmethod
     def from_line(cls, line):
         # line from coords file,e.g.
@@ -81,7 +137,9 @@ class Mapping(object):
         return '\t'.join(str(x) for x in [self.s1, self.e1, self.s2, self.e2, self.ref, self.contig, self.idy, ambiguity, is_best])
 
     def clone(self):
-        return Mapping(self.s1, self.e1, self.s2, self.e2, self.len1, self.len2, self.idy, self.ref, self.contig, self.cigar)
+        mapping = Mapping(self.s1, self.e1, self.s2, self.e2, self.len1, self.len2, self.idy, self.ref, self.contig, self._cigar)
+        mapping._cs = self.cs
+        return mapping
 
     def start(self):
         """Return start on contig (always <= end)"""
@@ -216,20 +274,24 @@ def is_misassembly(align1, align2, contig_seq, ref_lens, is_cyclic=False, region
     return False, aux_data  # regular local misassembly
 
 
-def check_sv(align1, align2, inconsistency, region_struct_variations):
-    max_error_sv = 100 # qconfig.smgap / 4  # min(2 * qconfig.smgap, max(qconfig.smgap, inconsistency * 0.05))
-    max_error_trivial_del = 250
+def find_sv(index_by_ref, ref, pos):
+    if ref not in index_by_ref:
+        return []
+    return index_by_ref[ref].find(pos)
 
+
+def check_sv(align1, align2, inconsistency, region_struct_variations):
     max_gap = qconfig.extensive_misassembly_threshold // 4
 
     def __match_ci(pos, sv):  # check whether pos matches confidence interval of sv
-        max_error = max_error_trivial_del if sv.sv_type == 'QuastDEL' else max_error_sv
-        return sv.s1 - max_error <= pos <= sv.e1 + max_error
+        ci_start, ci_end = get_sv_ci(sv)
+        return ci_start <= pos <= ci_end
 
-    def __check_translocation(align1, align2, sv):
-        if sv[0].ref == align1.ref and sv[1].ref == align2.ref and \
-                __match_ci(align1.e1, sv[0]) and __match_ci(align2.s1, sv[1]):
-            return True
+    def __check_translocation(align1, align2):
+        for index in find_sv(region_struct_variations.translocations_index, align1.ref, align1.e1):
+            sv = region_struct_variations.translocations[index]
+            if sv[1].ref == align2.ref and __match_ci(align2.s1, sv[1]):
+                return True
 
     def __check_inversion(align, sv):
         if __match_ci(align.s1, sv[0]) and sv[0].s1 <= align.e1 <= sv[1].e1:
@@ -238,12 +300,17 @@ def check_sv(align1, align2, inconsistency, region_struct_variations):
             return True
 
     if align1.ref != align2.ref:  # translocation
-        for sv in region_struct_variations.translocations:
-            if __check_translocation(align1, align2, sv) or __check_translocation(align2, align1, sv):
-                return True
+        if __check_translocation(align1, align2) or __check_translocation(align2, align1):
+            return True
     elif (align1.s2 < align1.e2) != (align2.s2 < align2.e2) and abs(inconsistency) < qconfig.extensive_misassembly_threshold:
-        for sv in region_struct_variations.inversions:
-            if align1.ref == sv[0].ref and (__check_inversion(align1, sv) or __check_inversion(align2, sv)):
+        # inversions with one of the breakpoints matching an alignment end
+        indices = set()
+        for align in (align1, align2):
+            indices.update(find_sv(region_struct_variations.inversions_index, align1.ref, align.s1))
+            indices.update(find_sv(region_struct_variations.inversions_end_index, align1.ref, align.e1))
+        for index in indices:
+            sv = region_struct_variations.inversions[index]
+            if __check_inversion(align1, sv) or __check_inversion(align2, sv):
                 return True
     else:
         variations = region_struct_variations.relocations
@@ -251,22 +318,22 @@ def check_sv(align1, align2, inconsistency, region_struct_variations):
             sv_start, sv_end = align2.s1, align1.e1
         else:
             sv_start, sv_end = align1.e1, align2.s1
-        for index, sv in enumerate(variations):
-            if sv[0].ref == align1.ref and __match_ci(sv_start, sv[0]):
-                if __match_ci(sv_end, sv[1]):
-                    return True
-                # unite large deletion (relocations only)
-                if sv[0].sv_type == 'QuastDEL':
+        for index in find_sv(region_struct_variations.relocations_index, align1.ref, sv_start):
+            sv = variations[index]
+            if __match_ci(sv_end, sv[1]):
+                return True
+            # unite large deletion (relocations only)
+            if sv[0].sv_type == 'QuastDEL':
+                prev_end = sv[1].e1
+                index_variation = index + 1
+                while index_variation < len(variations) and \
+                                        variations[index_variation][0].s1 - prev_end <= max_gap and \
+                                        variations[index_variation][0].ref == align1.ref:
+                    sv = variations[index_variation]
+                    if __match_ci(sv_end, sv[1]):
+                        return True
                     prev_end = sv[1].e1
-                    index_variation = index + 1
-                    while index_variation < len(variations) and \
-                                            variations[index_variation][0].s1 - prev_end <= max_gap and \
-                                            variations[index_variation][0].ref == align1.ref:
-                        sv = variations[index_variation]
-                        if __match_ci(sv_end, sv[1]):
-                            return True
-                        prev_end = sv[1].e1
-                        index_variation += 1
+                    index_variation += 1
     return False
 
 
@@ -292,6 +359,7 @@ def find_all_sv(bed_fpath):
                         pass # not supported yet
                 except ValueError:
                     pass  # incorrect line format
+    region_struct_variations.build_indexes()
     return region_struct_variations
 
 
@@ -330,55 +398,10 @@ def check_is_scaffold_gap(inconsistency, contig_seq, align1, align2):
 def exclude_internal_overlaps(align1, align2, i=None):
     # returns size of align1.len2 decrease (or 0 if not changed). It is important for cur_aligned_len calculation
     def __shift_cigar(align, new_start=None, new_end=None):
-        new_cigar = 'cs:Z:'
-        ctg_pos = align.s2
+        if align.cs.is_empty():
+            return 0
         strand_direction = 1 if align.s2 < align.e2 else -1
-        diff_len = 0
-        if not align.cigar:
-            return diff_len
-
-        for op in parse_cs_tag(align.cigar):
-            if op.startswith('*'):
-                if (new_start and ctg_pos >= new_start) or \
-                        (new_end and ctg_pos <= new_end):
-                    new_cigar += op
-                ctg_pos += 1 * strand_direction
-            else:
-                if op.startswith(':'):
-                    n_bases = int(op[1:])
-                else:
-                    n_bases = len(op) - 1
-                corr_n_bases = n_bases
-                if new_end and (ctg_pos + n_bases * strand_direction > new_end or ctg_pos > new_end):
-                    corr_n_bases = new_end - ctg_pos + (n_bases if strand_direction == -1 else 1)
-                elif new_start and (ctg_pos < new_start or ctg_pos + n_bases * strand_direction < new_start):
-                    corr_n_bases = ctg_pos + (n_bases if strand_direction == 1 else 1) - new_start
-
-                if corr_n_bases < 1:
-                    if not op.startswith('-'):
-                        ctg_pos += n_bases * strand_direction
-                    if op.startswith('-'):
-                        diff_len -= n_bases
-                    if op.startswith('+'):
-                        diff_len += n_bases
-                    continue
-                if op.startswith('+'):
-                    ctg_pos += n_bases * strand_direction
-                    diff_len += (n_bases - corr_n_bases)
-                    if new_start:
-                        new_cigar += '+' + op[1 + (corr_n_bases - n_bases):]
-                    elif new_end:
-                        new_cigar += op[:corr_n_bases + 1]
-                elif op.startswith('-'):
-                    diff_len -= (n_bases - corr_n_bases)
-                    if new_start:
-                        new_cigar += '-' + op[1 + (corr_n_bases - n_bases):]
-                    elif new_end:
-                        new_cigar += op[:corr_n_bases + 1]
-                elif op.startswith(':'):
-                    ctg_pos += n_bases * strand_direction
-                    new_cigar += ':' + str(corr_n_bases)
-        align.cigar = new_cigar
+        align.cs, diff_len = align.cs.trim(align.s2, strand_direction, new_start=new_start, new_end=new_end)
         return diff_len
 
     def __shift_start(align, new_start, diff_len):
@@ -499,7 +522,7 @@ def process_misassembled_contig(sorted_aligns, is_cyclic, aligned_lengths, regio
         ca_output.stdout_f.write('\t\t\tReal Alignment %d: %s\n' % (i+1, str(prev_align)))
 
         ref_aligns.setdefault(prev_align.ref, []).append(prev_align)
-        ca_output.coords_filtered_f.write(prev_align.coords_str() + '\n')
+        ca_output.coords_filtered_f.add(prev_align)
         prev_ref, next_ref = get_ref_by_chromosome(prev_align.ref), get_ref_by_chromosome(next_align.ref)
         if aux_data["is_sv"]:
             ca_output.stdout_f.write('\t\t\t  Not a misassembly (structural variation of the genome) between these two alignments\n')
@@ -623,7 +646,7 @@ def process_misassembled_contig(sorted_aligns, is_cyclic, aligned_lengths, regio
     ca_output.stdout_f.write('\t\t\tReal Alignment %d: %s' % (i + 1, str(next_align)) + '\n')
     ca_output.icarus_out_f.write(next_align.icarus_report_str() + '\n')
     ref_aligns.setdefault(next_align.ref, []).append(next_align)
-    ca_output.coords_filtered_f.write(next_align.coords_str() + '\n')
+    ca_output.coords_filtered_f.add(next_align)
 
     contig_aligned_lengths.append(cur_aligned_length)
     contig_aligned_length = sum(contig_aligned_lengths)
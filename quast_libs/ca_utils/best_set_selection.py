@@ -5,11 +5,9 @@
 # See file LICENSE for details.
 ############################################################################
 
+from bisect import bisect_left
 from heapq import heappush, heappop
-try:
-   from collections import OrderedDict
-except ImportError:
-   from quast_libs.site_packages.ordered_dict import OrderedDict
+from itertools import chain
 from quast_libs import qconfig
 from quast_libs.ca_utils.analyze_misassemblies import is_misassembly, exclude_internal_overlaps, Misassembly, \
     is_fragmented_ref_fake_translocation
@@ -23,6 +21,61 @@ class ScoredSet(object):
         self.uncovered = uncovered
 
 
+class LinkedScoredSet(object):  # the set is stored as its last alignment index and a link to the set it was extended from
+    __slots__ = ('score', 'last_index', 'prev', 'uncovered')
+
+    def __init__(self, score, last_index, prev, uncovered):
+        self.score = score
+        self.last_index = last_index  # -1 for the empty set
+        self.prev = prev
+        self.uncovered = uncovered
+
+    def iter_indexes(self):
+        """Indexes of the set alignments from the last one to the first one"""
+        scored_set = self
+        while scored_set.last_index != -1:
+            yield scored_set.last_index
+            scored_set = scored_set.prev
+
+    def to_scored_set(self):
+        return ScoredSet(self.score, list(reversed(list(self.iter_indexes()))), self.uncovered)
+
+
+class ScoresTree(object):
+    """
+        Segment tree over the scores of the sets (in the order of their creation).
+        It allows to skip quickly the sets which could not become the best predecessor
+    """
+    def __init__(self, size):
+        self.size = 1
+        while self.size < size:
+            self.size *= 2
+        self.tree = [float('-inf')] * (2 * self.size)
+
+    def set(self, pos, score):
+        pos += self.size
+        self.tree[pos] = score
+        pos //= 2
+        while pos:
+            self.tree[pos] = max(self.tree[2 * pos], self.tree[2 * pos + 1])
+            pos //= 2
+
+    def find_last_greater(self, start, end, threshold):
+        """Returns the largest position in [start, end] with score > threshold or -1 if there is no such position"""
+        return self.__find_last_greater(1, 0, self.size - 1, start, end, threshold)
+
+    def __find_last_greater(self, node, node_start, node_end, start, end, threshold):
+        if node_end < start or node_start > end or self.tree[node] <= threshold:
+            return -1
+        if node_start == node_end:
+            return node_start
+        middle = (node_start + node_end) // 2
+        pos = self.__find_last_greater(2 * node + 1, middle + 1, node_end, start, end, threshold)
+        if pos == -1:
+            pos = self.__find_last_greater(2 * node, node_start, middle, start, end, threshold)
+        return pos
+
+
 class PutativeBestSet(object):
     def __init__(self, indexes, score_drop, uncovered):
         self.indexes = indexes
@@ -174,11 +227,15 @@ def get_best_aligns_sets(sorted_aligns, ctg_len, stdout_f, seq, ref_lens, is_cyc
 
     # Stage 1: Dynamic programming for finding the best score
     stdout_f.write('\t\t\tLooking for the best set of alignments (out of %d total alignments)\n' % len(sorted_aligns))
-    all_scored_sets = [ScoredSet(0, [], ctg_len)]
+    all_scored_sets = [LinkedScoredSet(0, -1, None, ctg_len)]
+    sets_last_indexes = [-1]
+    scores_tree = ScoresTree(len(sorted_aligns) + 1)
+    scores_tree.set(0, 0)
     max_score = 0
 
     cur_solid_idx = -1
     next_solid_idx = -1
+    first_allowed_set_pos = 0  # sets ending before the current solid alignment could not be extended
     solids = sorted(solids, key=lambda x: (x.end(), x.len2), reverse=True)
     for idx, align in enumerate(sorted_aligns):
         local_max_score = 0
@@ -186,23 +243,37 @@ def get_best_aligns_sets(sorted_aligns, ctg_len, stdout_f, seq, ref_lens, is_cyc
         if solids and align == solids[-1]:
             next_solid_idx = idx
             del solids[-1]
-        for scored_set in reversed(all_scored_sets):
-            if scored_set.indexes and scored_set.indexes[-1] < cur_solid_idx:
+        # score of the extended set could not be greater than the set score plus the score of the new alignment,
+        # thus we check only sets with large enough score (in the order from the latest to the earliest one)
+        align_score = score_single_align(align)
+        pos = len(all_scored_sets) - 1
+        while pos >= first_allowed_set_pos:
+            # the small margin guarantees that no set is skipped due to rounding errors
+            pos = scores_tree.find_last_greater(first_allowed_set_pos, pos, local_max_score - align_score - 1e-6)
+            if pos == -1:
                 break
-            cur_set_aligns = [sorted_aligns[i].clone() for i in scored_set.indexes] + [align.clone()]
-            score, uncovered = get_score(scored_set.score, cur_set_aligns, ref_lens, is_cyclic, scored_set.uncovered,
-                                         seq, region_struct_variations, penalties)
+            scored_set = all_scored_sets[pos]
+            pos -= 1
+            score, uncovered = get_score(scored_set, align, sorted_aligns, ref_lens, is_cyclic, seq,
+                                         region_struct_variations, penalties)
             if score is None:  # incorrect set, i.e. internal overlap excluding resulted in incorrectly short alignment
                 continue
             if score > local_max_score:
                 local_max_score = score
-                new_scored_set = ScoredSet(score, scored_set.indexes + [idx], uncovered)
+                new_scored_set = LinkedScoredSet(score, idx, scored_set, uncovered)
         if new_scored_set:
             all_scored_sets.append(new_scored_set)
+            sets_last_indexes.append(idx)
+            scores_tree.set(len(all_scored_sets) - 1, new_scored_set.score)
             if local_max_score > max_score:
                 max_score = local_max_score
         if next_solid_idx != cur_solid_idx:
             cur_solid_idx = next_solid_idx
+            first_allowed_set_pos = len(all_scored_sets)
+            while first_allowed_set_pos > 1 and all_scored_sets[first_allowed_set_pos - 1].last_index >= cur_solid_idx:
+                first_allowed_set_pos -= 1
+            if first_allowed_set_pos == 1:  # there are no sets ending before the solid alignment
+                first_allowed_set_pos = 0
 
     # Stage 2: DFS for finding multiple best sets with almost equally good score
 
@@ -213,7 +284,7 @@ def get_best_aligns_sets(sorted_aligns, ctg_len, stdout_f, seq, ref_lens, is_cyc
         best_set = all_scored_sets.pop()
         while best_set.score != max_score:
             best_set = all_scored_sets.pop()
-        return False, False, sorted_aligns, [best_set]
+        return False, False, sorted_aligns, [best_set.to_scored_set()]
 
     max_allowed_score_drop = max_score - max_score * qconfig.ambiguity_score
 
@@ -222,7 +293,7 @@ def get_best_aligns_sets(sorted_aligns, ctg_len, stdout_f, seq, ref_lens, is_cyc
     for scored_set in all_scored_sets:
         score_drop = max_score - scored_set.score
         if score_drop <= max_allowed_score_drop:
-            heappush(putative_sets, PutativeBestSet([scored_set.indexes[-1]], score_drop, scored_set.uncovered))
+            heappush(putative_sets, PutativeBestSet([scored_set.last_index], score_drop, scored_set.uncovered))
 
     ambiguity_check_is_needed = True
     too_much_best_sets = False
@@ -245,28 +316,47 @@ def get_best_aligns_sets(sorted_aligns, ctg_len, stdout_f, seq, ref_lens, is_cyc
             continue
         # the main part: trying to enlarge the set to the left (use "earlier" alignments)
         align = sorted_aligns[putative_set.indexes[0]]
+        align_score = score_single_align(align)
+        last_pos = bisect_left(sets_last_indexes, putative_set.indexes[0]) - 1
+        # first, finding the best score of the enlarged set (the same way as in Stage 1)
         local_max_score = 0
         local_uncovered = putative_set.uncovered
-        putative_predecessors = OrderedDict()
-        for scored_set in all_scored_sets:
-            # we can enlarge the set with "earlier" alignments only
-            if scored_set.indexes and scored_set.indexes[-1] >= putative_set.indexes[0]:
+        computed_scores = dict()
+        pos = last_pos
+        while pos >= 0:
+            pos = scores_tree.find_last_greater(0, pos, local_max_score - align_score - 1e-6)
+            if pos == -1:
                 break
-            cur_set_aligns = [sorted_aligns[i].clone() for i in scored_set.indexes] + [align.clone()]
-            score, uncovered = get_score(scored_set.score, cur_set_aligns, ref_lens, is_cyclic, scored_set.uncovered,
-                                         seq, region_struct_variations, penalties)
+            score, uncovered = computed_scores[pos] = get_score(all_scored_sets[pos], align, sorted_aligns, ref_lens,
+                                                                is_cyclic, seq, region_struct_variations, penalties)
+            pos -= 1
             if score is not None:
-                putative_predecessors[scored_set] = (score, uncovered)
                 if score > local_max_score:
                     local_max_score = score
                     local_uncovered = uncovered
                 elif score == local_max_score and uncovered < local_uncovered:
                     local_uncovered = uncovered
-        for preceding_set, (score, uncovered) in putative_predecessors.items():
+        # second, taking all predecessors with the allowed score drop
+        min_allowed_score = local_max_score + putative_set.score_drop - max_allowed_score_drop
+        putative_predecessors = []
+        pos = last_pos
+        while pos >= 0:
+            pos = scores_tree.find_last_greater(0, pos, min_allowed_score - align_score - 1e-6)
+            if pos == -1:
+                break
+            putative_predecessors.append(pos)
+            pos -= 1
+        for pos in reversed(putative_predecessors):
+            if pos not in computed_scores:
+                computed_scores[pos] = get_score(all_scored_sets[pos], align, sorted_aligns, ref_lens, is_cyclic, seq,
+                                                 region_struct_variations, penalties)
+            score, uncovered = computed_scores[pos]
+            if score is None:
+                continue
             score_drop = local_max_score - score + putative_set.score_drop
             if score_drop > max_allowed_score_drop:
                 continue
-            new_index = preceding_set.indexes[-1] if preceding_set.indexes else -1
+            new_index = all_scored_sets[pos].last_index
             new_uncovered = uncovered + (putative_set.uncovered - local_uncovered)
             heappush(putative_sets, PutativeBestSet([new_index] + putative_set.indexes,
                                                     score_drop, new_uncovered))
@@ -278,36 +368,45 @@ def get_used_indexes(best_sets):
     return set([index for best_set in best_sets for index in best_set.indexes])
 
 
-def get_added_len(set_aligns, cur_align):
-    last_align_idx = -2
-    last_align = set_aligns[last_align_idx]
+def get_added_len(prev_aligns, cur_align):
+    """
+        prev_aligns are the set alignments preceding cur_align in the reverse order
+    """
+    prev_aligns = iter(prev_aligns)
+    last_align = next(prev_aligns)
     added_right = cur_align.end() - max(cur_align.start() - 1, last_align.end())
     added_left = 0
     while cur_align.start() < last_align.start():
         added_left += last_align.start() - cur_align.start()
-        last_align_idx -= 1
-        if -last_align_idx <= len(set_aligns):
-            prev_start = last_align.start()  # in case of overlapping of old and new last_align
-            last_align = set_aligns[last_align_idx]
-            added_left -= max(0, min(prev_start, last_align.end()) - cur_align.start() + 1)
-        else:
+        prev_start = last_align.start()  # in case of overlapping of old and new last_align
+        last_align = next(prev_aligns, None)
+        if last_align is None:
             break
+        added_left -= max(0, min(prev_start, last_align.end()) - cur_align.start() + 1)
     return added_right + added_left
 
 
-def get_score(score, aligns, ref_lens, is_cyclic, uncovered_len, seq, region_struct_variations, penalties):
-    if len(aligns) > 1:
-        align1, align2 = aligns[-2], aligns[-1]
+def get_score(scored_set, align, sorted_aligns, ref_lens, is_cyclic, seq, region_struct_variations, penalties):
+    """
+        Returns score and uncovered length of scored_set extended with align.
+        Only the last alignments of the set are copied since only they are modified by excluding overlaps
+    """
+    score, uncovered_len = scored_set.score, scored_set.uncovered
+    if scored_set.last_index != -1:
+        align1, align2 = sorted_aligns[scored_set.last_index].clone(), align.clone()
         is_fake_translocation = is_fragmented_ref_fake_translocation(align1, align2, ref_lens)
         overlaped_len = max(0, align1.end() - align2.start() + 1)
-        if len(aligns) > 2:  # does not affect score and uncovered but it is important for further checking on set correctness
-            exclude_internal_overlaps(aligns[-3], align1)
+        prev_aligns = [align1]
+        if scored_set.prev.last_index != -1:  # does not affect score and uncovered but it is important for further checking on set correctness
+            align0 = sorted_aligns[scored_set.prev.last_index].clone()
+            exclude_internal_overlaps(align0, align1)
+            prev_aligns = chain([align1, align0], (sorted_aligns[i] for i in scored_set.prev.prev.iter_indexes()))
         reduced_len, _ = exclude_internal_overlaps(align1, align2)  # reduced_len is for align1 only
         # check whether the set is still correct, i.e both alignments are rather large
         if min(align1.len2, align2.len2) < qconfig.min_alignment:
             return None, None
 
-        added_len = get_added_len(aligns, aligns[-1])
+        added_len = get_added_len(prev_aligns, align2)
         uncovered_len -= (added_len - reduced_len)
         score += score_single_align(align2, ctg_len=added_len) - score_single_align(align1, ctg_len=reduced_len)
         is_extensive_misassembly, aux_data = is_misassembly(align1, align2, seq, ref_lens, is_cyclic, region_struct_variations,
@@ -336,8 +435,8 @@ def get_score(score, aligns, ref_lens, is_cyclic, uncovered_len, seq, region_str
         overlap_penalty = min(overlaped_len * penalties['overlap_multiplier'], misassembly_penalty)
         score -= (misassembly_penalty + overlap_penalty)
     else:
-        score += score_single_align(aligns[-1])
-        uncovered_len -= aligns[-1].len2
+        score += score_single_align(align)
+        uncovered_len -= align.len2
     return score, uncovered_len
 
 
@@ -0,0 +1,204 @@
+############################################################################
+# Copyright (c) 2015-2019 Saint Petersburg State University
+# Copyright (c) 2011-2015 Saint Petersburg Academic University
+# All Rights Reserved
+# See file LICENSE for details.
+############################################################################
+#
+# Binary file with alignments (.coords.bin, .coords.filtered.bin).
+# Each record is a fixed-size header (coordinates, lengths, identity,
+# ambiguity flag and lengths of the names) followed by the reference name,
+# the contig name and the cs tag. Records do not depend on each other, so
+# files written by separate processes can be simply concatenated.
+# Files are memory-mapped for reading, only names are decoded.
+# Offsets of records grouped by reference and by contig names are saved
+# next to the file (.idx) when it is closed, so alignments of a single
+# sequence can be read without scanning the whole file.
+#
+############################################################################
+
+from __future__ import with_statement
+import mmap
+import os
+import struct
+from array import array
+
+from quast_libs.ca_utils.analyze_misassemblies import Mapping
+
+record_header = struct.Struct('<qqqqqqdBIII')  # s1, e1, s2, e2, len1, len2, idy, is_ambiguous, lengths of ref, contig, cs
+index_header = struct.Struct('<4sqII')  # magic, size of the indexed file, number of references, number of contigs
+group_header = struct.Struct('<II')  # length of the name, number of records
+INDEX_MAGIC = b'QCI1'
+
+
+def _encode(s):
+    return (s or '').encode('utf-8')
+
+
+def get_index_fpath(coords_fpath):
+    return coords_fpath + '.idx'
+
+
+class CoordsWriter(object):
+    """
+        Writes the index (see save_coords_index) on close unless with_index is False,
+        e.g. for temporary files concatenated later
+    """
+    mode = 'wb'
+
+    def __init__(self, fpath, with_index=True):
+        self.name = fpath
+        self.with_index = with_index
+        self._f = open(fpath, self.mode)
+        self._offset = 0
+        self._offsets_by_ref, self._offsets_by_contig = dict(), dict()
+        self._is_indexed = True  # records written by write() are not indexed
+
+    def add(self, align, is_ambiguous=False):
+        ref, contig, cs = _encode(align.ref), _encode(align.contig), _encode(align.cigar)
+        if self.with_index:
+            self._offsets_by_ref.setdefault(align.ref or '', array('l')).append(self._offset)
+            self._offsets_by_contig.setdefault(align.contig or '', array('l')).append(self._offset)
+        self._f.write(record_header.pack(align.s1, align.e1, align.s2, align.e2, align.len1, align.len2,
+                                         float(align.idy), is_ambiguous, len(ref), len(contig), len(cs)))
+        self._f.write(ref + contig + cs)
+        self._offset += record_header.size + len(ref) + len(contig) + len(cs)
+
+    def write(self, data):  # raw records, e.g. a file written by another process
+        self._f.write(data)
+        self._offset += len(data)
+        self._is_indexed = False
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+        if self.with_index and os.path.isfile(self.name):
+            if self._is_indexed:
+                save_coords_index(self.name, self._offsets_by_ref, self._offsets_by_contig)
+            else:
+                save_coords_index(self.name, *index_coords(self.name))
+
+
+def _mmap_file(fpath):
+    with open(fpath, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _read_record(data, offset, names, with_cs):
+    s1, e1, s2, e2, len1, len2, idy, is_ambiguous, ref_len, contig_len, cs_len = record_header.unpack_from(data, offset)
+    ref_start = offset + record_header.size
+    contig_start = ref_start + ref_len
+    cs_start = contig_start + contig_len
+    next_offset = cs_start + cs_len
+    ref_bytes, contig_bytes = data[ref_start:contig_start], data[contig_start:cs_start]
+    for name_bytes in (ref_bytes, contig_bytes):
+        if name_bytes not in names:  # names are decoded only once
+            names[name_bytes] = name_bytes.decode('utf-8')
+    cs = data[cs_start:next_offset].decode('utf-8') if with_cs else None
+    return (s1, e1, s2, e2, len1, len2, idy, names[ref_bytes], names[contig_bytes], cs, bool(is_ambiguous)), next_offset
+
+
+def iter_coords(fpath, with_cs=False, offsets=None):
+    """
+        Generator that returns alignments as tuples (s1, e1, s2, e2, len1, len2, idy, ref, contig, cs, is_ambiguous),
+        cs is None unless with_cs is set. If offsets are given, only records starting at them are returned (see find_coords)
+    """
+    data = _mmap_file(fpath)
+    names = dict()
+    try:
+        if offsets is None:
+            offset = 0
+            while offset < len(data):
+                record, offset = _read_record(data, offset, names, with_cs)
+                yield record
+        else:
+            for offset in offsets:
+                yield _read_record(data, offset, names, with_cs)[0]
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def index_coords(fpath):
+    """
+        Returns offsets of records grouped by reference names and by contig names
+    """
+    data = _mmap_file(fpath)
+    names = dict()
+    offsets_by_ref, offsets_by_contig = dict(), dict()
+    try:
+        offset = 0
+        while offset < len(data):
+            record, next_offset = _read_record(data, offset, names, with_cs=False)
+            offsets_by_ref.setdefault(record[7], array('l')).append(offset)
+            offsets_by_contig.setdefault(record[8], array('l')).append(offset)
+            offset = next_offset
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+    return offsets_by_ref, offsets_by_contig
+
+
+def save_coords_index(fpath, offsets_by_ref, offsets_by_contig):
+    with open(get_index_fpath(fpath), 'wb') as f:
+        f.write(index_header.pack(INDEX_MAGIC, os.path.getsize(fpath), len(offsets_by_ref), len(offsets_by_contig)))
+        for offsets_by_name in (offsets_by_ref, offsets_by_contig):
+            for name, offsets in offsets_by_name.items():
+                encoded_name = _encode(name)
+                f.write(group_header.pack(len(encoded_name), len(offsets)))
+                f.write(encoded_name)
+                f.write(struct.pack('<%dq' % len(offsets), *offsets))
+
+
+def load_coords_index(fpath):
+    """
+        Returns offsets saved by save_coords_index or None if the index is missing or does not match the file
+    """
+    index_fpath = get_index_fpath(fpath)
+    if not os.path.isfile(index_fpath) or os.path.getmtime(index_fpath) < os.path.getmtime(fpath):
+        return None
+    with open(index_fpath, 'rb') as f:
+        magic, coords_size, num_refs, num_contigs = index_header.unpack(f.read(index_header.size))
+        if magic != INDEX_MAGIC or coords_size != os.path.getsize(fpath):
+            return None
+        groups = []
+        for num_names in (num_refs, num_contigs):
+            offsets_by_name = dict()
+            for _ in range(num_names):
+                name_len, num_offsets = group_header.unpack(f.read(group_header.size))
+                name = f.read(name_len).decode('utf-8')
+                offsets_by_name[name] = array('l', struct.unpack('<%dq' % num_offsets, f.read(8 * num_offsets)))
+            groups.append(offsets_by_name)
+    return tuple(groups)
+
+
+def find_coords(fpath, ref=None, contig=None, with_cs=False):
+    """
+        Generator that returns alignments (as iter_coords) to the reference sequence and/or of the contig,
+        records are found through the index, which is built in memory if it is not saved next to the file
+    """
+    if ref is None and contig is None:
+        return iter_coords(fpath, with_cs)
+    offsets_by_ref, offsets_by_contig = load_coords_index(fpath) or index_coords(fpath)
+    offsets = None
+    if ref is not None:
+        offsets = offsets_by_ref.get(ref, [])
+    if contig is not None:
+        contig_offsets = offsets_by_contig.get(contig, [])
+        offsets = contig_offsets if offsets is None else sorted(set(offsets) & set(contig_offsets))
+    return iter_coords(fpath, with_cs, offsets)
+
+
+def coords_to_text(fpath, out_fpath, ref=None, contig=None):
+    """
+        Converts the binary file to the text format of the previous QUAST versions,
+        only alignments to the reference sequence and/or of the contig are converted if they are specified
+    """
+    with open(out_fpath, 'w') as out_f:
+        for record in find_coords(fpath, ref, contig, with_cs=True):
+            align = Mapping(*record[:10])
+            out_f.write(align.coords_str() + (' ambiguous' if record[10] else '') + '\n')
@@ -0,0 +1,133 @@
+############################################################################
+# Copyright (c) 2015-2019 Saint Petersburg State University
+# Copyright (c) 2011-2015 Saint Petersburg Academic University
+# All Rights Reserved
+# See file LICENSE for details.
+############################################################################
+#
+# Genome coverage computed on intervals instead of per-base arrays:
+# memory scales with the number of alignments, not with the genome length.
+# IntervalIndex finds intervals overlapping a position or a region.
+# All intervals are 1-based and closed: [start, end].
+#
+############################################################################
+
+from collections import defaultdict
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def subtract_intervals(intervals, mask):
+    """
+        Both lists should be sorted and merged (see merge_intervals)
+    """
+    result = []
+    mask_idx = 0
+    for start, end in intervals:
+        while mask_idx < len(mask) and mask[mask_idx][1] < start:
+            mask_idx += 1
+        cur_start = start
+        idx = mask_idx
+        while idx < len(mask) and mask[idx][0] <= end:
+            if mask[idx][0] > cur_start:
+                result.append([cur_start, mask[idx][0] - 1])
+            cur_start = max(cur_start, mask[idx][1] + 1)
+            idx += 1
+        if cur_start <= end:
+            result.append([cur_start, end])
+    return result
+
+
+def complement_intervals(intervals, chr_len):
+    result = []
+    prev_end = 0
+    for start, end in intervals:
+        if start > prev_end + 1:
+            result.append([prev_end + 1, start - 1])
+        prev_end = max(prev_end, end)
+    if prev_end < chr_len:
+        result.append([prev_end + 1, chr_len])
+    return result
+
+
+def intervals_len(intervals):
+    return sum(end - start + 1 for start, end in intervals)
+
+
+class IntervalIndex(object):
+    """
+        Intervals with values sorted by start, with an implicit interval tree on top of them:
+        the middle interval of a range is the root of the subtree of this range and keeps the maximal end in the subtree
+    """
+    def __init__(self, intervals):  # list of (start, end, value)
+        intervals = sorted(intervals, key=lambda interval: interval[0])
+        self.starts = [start for start, _, _ in intervals]
+        self.ends = [end for _, end, _ in intervals]
+        self.values = [value for _, _, value in intervals]
+        self.max_ends = list(self.ends)
+        self.__set_max_ends(0, len(intervals))
+
+    def __set_max_ends(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        for max_end in (self.__set_max_ends(lo, mid), self.__set_max_ends(mid + 1, hi)):
+            if max_end is not None and max_end > self.max_ends[mid]:
+                self.max_ends[mid] = max_end
+        return self.max_ends[mid]
+
+    def find(self, start, end=None):
+        """
+            Returns values of the intervals overlapping [start, end] (or containing start) in the order of their starts
+        """
+        found = []
+        self.__find(0, len(self.values), start, start if end is None else end, found)
+        return found
+
+    def __find(self, lo, hi, start, end, found):
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.max_ends[mid] < start:
+                return
+            self.__find(lo, mid, start, end, found)
+            if self.starts[mid] > end:
+                return
+            if self.ends[mid] >= start:
+                found.append(self.values[mid])
+            lo = mid + 1
+
+
+class GenomeCoverage(object):
+    def __init__(self, reference_chromosomes, ns_by_chromosomes):
+        self.chr_lengths = reference_chromosomes
+        self.ns_by_chromosomes = ns_by_chromosomes
+        self.intervals = defaultdict(list)
+
+    def add(self, chr_name, start, end, is_cyclic=False):
+        chr_len = self.chr_lengths[chr_name]
+        if start <= end:
+            self.intervals[chr_name].append((start, min(end, chr_len)))
+        elif is_cyclic:  # alignment goes through the end of a circular chromosome
+            self.intervals[chr_name].append((start, chr_len))
+            self.intervals[chr_name].append((1, end))
+
+    def covered_intervals(self, chr_name):
+        return subtract_intervals(merge_intervals(self.intervals[chr_name]), self.ns_by_chromosomes[chr_name])
+
+    def covered_bases(self, chr_name=None):
+        chr_names = [chr_name] if chr_name else self.chr_lengths.keys()
+        return sum(intervals_len(self.covered_intervals(name)) for name in chr_names)
+
+    def gaps(self, chr_name, min_gap_size=1):
+        covered_or_ns = merge_intervals(self.intervals[chr_name] + self.ns_by_chromosomes[chr_name])
+        return [[start, end] for start, end in complement_intervals(covered_or_ns, self.chr_lengths[chr_name])
+                if end - start + 1 >= min_gap_size]
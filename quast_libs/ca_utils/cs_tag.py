@@ -0,0 +1,308 @@
+############################################################################
+# Copyright (c) 2015-2019 Saint Petersburg State University
+# Copyright (c) 2011-2015 Saint Petersburg Academic University
+# All Rights Reserved
+# See file LICENSE for details.
+############################################################################
+#
+# Pre-parsed minimap2 cs tag. The tag is parsed only once per alignment:
+# offsets of operations on the contig and lengths of indels are kept in
+# prefix sum arrays, so excluding an overlap finds the trimmed region by
+# binary search and keeps the rest of the tag as a view of the same
+# operations instead of parsing and concatenating the whole string again.
+#
+############################################################################
+
+import re
+from array import array
+
+CS_PREFIX = 'cs:Z:'
+MATCH, MISMATCH, INSERTION, DELETION = ':', '*', '+', '-'
+# consecutive mismatches (e.g. *ag*ct) form a single operation
+cs_pattern = re.compile(r':(\d+)|([\*acgtn]{2,})|\-([acgtn]+)|\+([acgtn]+)')
+
+
+def parse_cs_tag(cs):
+    return [match.group() for match in cs_pattern.finditer(cs)]
+
+
+def decode_op(op):
+    """
+        Returns the operation as a tuple (type, number of bases, bases),
+        number of bases of consecutive mismatches is the number of mismatches
+    """
+    if op.startswith(MATCH):
+        return MATCH, int(op[1:]), ''
+    if op.startswith(MISMATCH):
+        return MISMATCH, op.count(MISMATCH), op[1:]
+    return op[0], len(op) - 1, op[1:]
+
+
+def iter_cs_ops(cs):
+    """
+        Generator that returns operations of the cs tag in the format of decode_op without splitting the tag
+    """
+    for match in cs_pattern.finditer(cs):
+        n_match_bases, mismatches, deleted_bases, inserted_bases = match.groups()
+        if n_match_bases is not None:
+            yield MATCH, int(n_match_bases), ''
+        elif mismatches is not None:
+            yield MISMATCH, mismatches.count(MISMATCH), mismatches[1:]
+        elif deleted_bases is not None:
+            yield DELETION, len(deleted_bases), deleted_bases
+        else:
+            yield INSERTION, len(inserted_bases), inserted_bases
+
+
+def get_op_len(op):
+    if op.startswith(':'):
+        return int(op[1:])
+    return len(op) - 1
+
+
+def get_ctg_shift(op):  # shift of the contig position after the operation
+    if op.startswith('*'):
+        return 1
+    if op.startswith('-'):
+        return 0
+    return get_op_len(op)
+
+
+def get_indel_len(op):  # inserted bases are counted with plus, deleted ones with minus
+    if op.startswith('+'):
+        return len(op) - 1
+    if op.startswith('-'):
+        return 1 - len(op)
+    return 0
+
+
+def get_prefix_sums(ops, get_value):
+    prefix_sums = [0]
+    for op in ops:
+        prefix_sums.append(prefix_sums[-1] + get_value(op))
+    return prefix_sums
+
+
+class CsTag(object):
+    """
+        The tag is a view of operations: head + ops[start:end] + tail,
+        head and tail are short lists of operations modified by trimming.
+        The other operations are not stored as separate strings, they are kept as positions in the original tag
+    """
+    __slots__ = ('source', 'is_trimmed', 'text', 'op_starts', 'op_ends', 'is_contiguous', 'ctg_offsets', 'indel_sums',
+                 'max_del_len', 'start', 'end', 'head', 'tail', 'head_str', 'tail_str', 'head_offsets', 'head_indel_sums',
+                 'tail_offsets', 'tail_indel_sums')
+
+    def __init__(self, cs=None):
+        self.source = cs
+        self.is_trimmed = False
+        self.text = cs or ''
+        self.op_starts, self.op_ends = array('l'), array('l')
+        self.ctg_offsets, self.indel_sums = array('l', [0]), array('l', [0])
+        self.is_contiguous = True  # operations follow each other without any other symbols between them
+        ctg_offset, indel_sum, max_del_len = 0, 0, 0
+        for match in cs_pattern.finditer(self.text):
+            n_match_bases, mismatches, deleted_bases, inserted_bases = match.groups()
+            if n_match_bases is not None:
+                ctg_offset += int(n_match_bases)
+            elif mismatches is not None:
+                ctg_offset += 1 if mismatches.startswith(MISMATCH) else len(mismatches) - 1
+            elif deleted_bases is not None:
+                indel_sum -= len(deleted_bases)
+                max_del_len = max(max_del_len, len(deleted_bases))
+            else:
+                ctg_offset += len(inserted_bases)
+                indel_sum += len(inserted_bases)
+            op_start, op_end = match.span()
+            if self.op_ends and self.op_ends[-1] != op_start:
+                self.is_contiguous = False
+            self.op_starts.append(op_start)
+            self.op_ends.append(op_end)
+            self.ctg_offsets.append(ctg_offset)
+            self.indel_sums.append(indel_sum)
+        self.max_del_len = max_del_len
+        self.__set_view(0, len(self.op_starts), [], [])
+
+    def __set_view(self, start, end, head, tail, head_str=None, tail_str=None):
+        head_str = ''.join(head) if head_str is None else head_str
+        tail_str = ''.join(tail) if tail_str is None else tail_str
+        if start >= end:  # all operations are modified ones
+            start, end, head, tail, head_str, tail_str = 0, 0, head + tail, [], head_str + tail_str, ''
+        self.start, self.end, self.head, self.tail = start, end, head, tail
+        self.head_str, self.tail_str = head_str, tail_str
+        self.head_offsets = get_prefix_sums(head, get_ctg_shift)
+        self.head_indel_sums = get_prefix_sums(head, get_indel_len)
+        self.tail_offsets = get_prefix_sums(tail, get_ctg_shift)
+        self.tail_indel_sums = get_prefix_sums(tail, get_indel_len)
+
+    def __view(self, start, end, head, tail, head_str=None, tail_str=None):
+        cs_tag = CsTag.__new__(CsTag)
+        cs_tag.source = None
+        cs_tag.is_trimmed = True
+        cs_tag.text, cs_tag.op_starts, cs_tag.op_ends, cs_tag.is_contiguous = \
+            self.text, self.op_starts, self.op_ends, self.is_contiguous
+        cs_tag.ctg_offsets, cs_tag.indel_sums = self.ctg_offsets, self.indel_sums
+        cs_tag.max_del_len = max([self.max_del_len] + [len(op) - 1 for op in head + tail if op.startswith('-')])
+        cs_tag.__set_view(start, end, head, tail, head_str, tail_str)
+        return cs_tag
+
+    def __base_op(self, i):
+        return self.text[self.op_starts[i]:self.op_ends[i]]
+
+    def is_empty(self):
+        return not self.is_trimmed and not self.source
+
+    def __len__(self):
+        return len(self.head) + (self.end - self.start) + len(self.tail)
+
+    def __iter__(self):
+        for op in self.head:
+            yield op
+        for i in range(self.start, self.end):
+            yield self.__base_op(i)
+        for op in self.tail:
+            yield op
+
+    def iter_ops(self):
+        """
+            Generator that returns operations in the format of decode_op
+        """
+        for op in self.head:
+            yield decode_op(op)
+        text, op_starts, op_ends, ctg_offsets = self.text, self.op_starts, self.op_ends, self.ctg_offsets
+        for i in range(self.start, self.end):
+            op_start, op_end = op_starts[i], op_ends[i]
+            op = text[op_start]
+            if op == MATCH:
+                yield MATCH, ctg_offsets[i + 1] - ctg_offsets[i], ''
+            elif op == MISMATCH:
+                yield MISMATCH, text.count(MISMATCH, op_start, op_end), text[op_start + 1:op_end]
+            else:
+                yield op, op_end - op_start - 1, text[op_start + 1:op_end]
+        for op in self.tail:
+            yield decode_op(op)
+
+    def __getitem__(self, i):
+        if i < len(self.head):
+            return self.head[i]
+        i -= len(self.head)
+        if i < self.end - self.start:
+            return self.__base_op(self.start + i)
+        return self.tail[i - (self.end - self.start)]
+
+    def __prefix_sum(self, i, base_sums, head_sums, tail_sums):
+        if i <= len(self.head):
+            return head_sums[i]
+        i -= len(self.head)
+        base_len = self.end - self.start
+        if i <= base_len:
+            return head_sums[-1] + base_sums[self.start + i] - base_sums[self.start]
+        return head_sums[-1] + base_sums[self.end] - base_sums[self.start] + tail_sums[i - base_len]
+
+    def ctg_offset(self, i):
+        """Shift of the contig position before the i-th operation"""
+        return self.__prefix_sum(i, self.ctg_offsets, self.head_offsets, self.tail_offsets)
+
+    def indels_len(self, i, j):
+        return self.__prefix_sum(j, self.indel_sums, self.head_indel_sums, self.tail_indel_sums) - \
+               self.__prefix_sum(i, self.indel_sums, self.head_indel_sums, self.tail_indel_sums)
+
+    def __bisect(self, offset, strictly_greater=False):
+        """Returns the first operation with the contig offset >= offset (or > offset)"""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            middle = (lo + hi) // 2
+            middle_offset = self.ctg_offset(middle)
+            if middle_offset > offset or (middle_offset == offset and not strictly_greater):
+                hi = middle
+            else:
+                lo = middle + 1
+        return lo
+
+    def to_str(self):
+        if not self.is_trimmed:
+            return self.source
+        if self.start < self.end and self.is_contiguous:
+            base_str = self.text[self.op_starts[self.start]:self.op_ends[self.end - 1]]
+        else:
+            base_str = ''.join(self.__base_op(i) for i in range(self.start, self.end))
+        return CS_PREFIX + self.head_str + base_str + self.tail_str
+
+    def trim(self, ctg_start, strand_direction, new_start=None, new_end=None):
+        """
+            Removes operations before new_start (or after new_end) on the contig.
+            Returns the trimmed tag and the difference between the removed contig and reference lengths
+        """
+        num_ops = len(self)
+        boundary = new_end or new_start
+        if boundary:
+            # operations located far enough from the boundary are either kept or removed entirely
+            margin = self.max_del_len + 1
+            boundary_offset = (boundary - ctg_start) * strand_direction
+            window_start = max(0, self.__bisect(boundary_offset - margin) - 1)
+            window_end = min(num_ops, self.__bisect(boundary_offset + margin, strictly_greater=True) + 1)
+        else:
+            window_start, window_end = 0, num_ops
+
+        new_ops = []
+        ctg_pos = ctg_start + self.ctg_offset(window_start) * strand_direction
+        diff_len = 0
+        for i in range(window_start, window_end):
+            op = self[i]
+            if op.startswith('*'):
+                if (new_start and ctg_pos >= new_start) or \
+                        (new_end and ctg_pos <= new_end):
+                    new_ops.append(op)
+                ctg_pos += 1 * strand_direction
+            else:
+                n_bases = get_op_len(op)
+                corr_n_bases = n_bases
+                if new_end and (ctg_pos + n_bases * strand_direction > new_end or ctg_pos > new_end):
+                    corr_n_bases = new_end - ctg_pos + (n_bases if strand_direction == -1 else 1)
+                elif new_start and (ctg_pos < new_start or ctg_pos + n_bases * strand_direction < new_start):
+                    corr_n_bases = ctg_pos + (n_bases if strand_direction == 1 else 1) - new_start
+
+                if corr_n_bases < 1:
+                    if not op.startswith('-'):
+                        ctg_pos += n_bases * strand_direction
+                    if op.startswith('-'):
+                        diff_len -= n_bases
+                    if op.startswith('+'):
+                        diff_len += n_bases
+                    continue
+                if op.startswith('+'):
+                    ctg_pos += n_bases * strand_direction
+                    diff_len += (n_bases - corr_n_bases)
+                    if new_start:
+                        new_ops.append('+' + op[1 + (corr_n_bases - n_bases):])
+                    elif new_end:
+                        new_ops.append(op[:corr_n_bases + 1])
+                elif op.startswith('-'):
+                    diff_len -= (n_bases - corr_n_bases)
+                    if new_start:
+                        new_ops.append('-' + op[1 + (corr_n_bases - n_bases):])
+                    elif new_end:
+                        new_ops.append(op[:corr_n_bases + 1])
+                elif op.startswith(':'):
+                    ctg_pos += n_bases * strand_direction
+                    new_ops.append(':' + str(corr_n_bases))
+        # the trimmed operations are written as is but kept in the same form as after parsing the trimmed tag
+        new_ops_str = ''.join(new_ops)
+        new_ops = parse_cs_tag(new_ops_str)
+
+        if (new_end and strand_direction == 1) or (not new_end and new_start and strand_direction == -1):
+            # operations before the window are kept, after the window are removed
+            diff_len += self.indels_len(window_end, num_ops)
+            head, start, end, tail = self.__sub_view(0, window_start)
+            return self.__view(start, end, head, tail + new_ops, tail_str=''.join(tail) + new_ops_str), diff_len
+        diff_len += self.indels_len(0, window_start)
+        head, start, end, tail = self.__sub_view(window_end, num_ops)
+        return self.__view(start, end, new_ops + head, tail, head_str=new_ops_str + ''.join(head)), diff_len
+
+    def __sub_view(self, i, j):
+        head_len, base_len = len(self.head), self.end - self.start
+        head = self.head[min(i, head_len):min(j, head_len)]
+        start = self.start + min(max(i - head_len, 0), base_len)
+        end = self.start + min(max(j - head_len, 0), base_len)
+        tail = self.tail[max(i - head_len - base_len, 0):max(j - head_len - base_len, 0)]
+        return head, start, end, tail
@@ -12,7 +12,6 @@
 from __future__ import with_statement
 import gzip
 import os
-import re
 from itertools import repeat
 from os.path import isdir, join, basename
 
@@ -60,11 +59,6 @@ def get_ref_by_chromosome(chrom):
     return ref_labels_by_chromosomes[chrom] if chrom in ref_labels_by_chromosomes else ''
 
 
-def parse_cs_tag(cigar):
-    cs_pattern = re.compile(r':\d+|[\*acgtn]{2,}|\-[acgtn]+|\+[acgtn]+')
-    return cs_pattern.findall(cigar)
-
-
 def print_file(all_rows, fpath, append_to_existing_file=False):
     colwidths = repeat(0)
     for row in all_rows:
@@ -88,6 +82,15 @@ def create_minimap_output_dir(output_dir):
     return minimap_output_dir
 
 
+class CAOutput():
+    def __init__(self, stdout_f, misassembly_f=None, coords_filtered_f=None, used_snps_f=None, icarus_out_f=None):
+        self.stdout_f = stdout_f
+        self.misassembly_f = misassembly_f
+        self.coords_filtered_f = coords_filtered_f
+        self.used_snps_f = used_snps_f
+        self.icarus_out_f = icarus_out_f
+
+
 def close_handlers(ca_output):
     for handler in vars(ca_output).values():  # assume that ca_output does not have methods (fields only)
         if handler:
@@ -0,0 +1,94 @@
+############################################################################
+# Copyright (c) 2015-2019 Saint Petersburg State University
+# Copyright (c) 2011-2015 Saint Petersburg Academic University
+# All Rights Reserved
+# See file LICENSE for details.
+############################################################################
+#
+# Cache of Contig analyzer results shared between QUAST runs (--results-cache).
+# Each entry is a directory named by the checksum of everything the analysis
+# of a single assembly depends on: the assembly, the reference, the BED file
+# and the options. It keeps the values returned by align_and_analyze and
+# copies of the files written by it (reports, .coords, SNPs, etc).
+#
+############################################################################
+
+from __future__ import with_statement
+import hashlib
+import os
+import pickle
+import shutil
+from os.path import basename, isdir, isfile, join, relpath, dirname
+
+from quast_libs import qconfig
+from quast_libs.qutils import md5, safe_rm
+
+RESULT_FNAME = 'result.pickle'
+
+# options affecting alignments and their analysis
+key_options = ['min_IDY', 'min_alignment', 'ambiguity_usage', 'ambiguity_score', 'extensive_misassembly_threshold',
+               'MAX_INDEL_LENGTH', 'SHORT_INDEL_THRESHOLD', 'unaligned_part_size', 'unaligned_mis_threshold',
+               'scaffolds_gap_threshold', 'Ns_break_threshold', 'check_for_fragmented_ref', 'fragmented_max_indent',
+               'strict_NA', 'use_all_alignments', 'is_combined_ref', 'large_genome', 'is_agb_mode', 'show_snps',
+               'space_efficient', 'no_gzip', 'BSS_critical_number_of_aligns', 'BSS_MAX_SETS_NUMBER',
+               'BSS_EXTENSIVE_PENALTY', 'BSS_LOCAL_PENALTY']
+
+
+def get_result_key(contigs_fpath, ref_fpath, bed_fpath, label, is_cyclic, is_broken_scaffolds, ref_labels=None):
+    key_values = [qconfig.quast_version(), md5(contigs_fpath), md5(ref_fpath), md5(bed_fpath) if bed_fpath else '',
+                  basename(contigs_fpath), label, str(is_cyclic), str(is_broken_scaffolds)]
+    key_values += [str(getattr(qconfig, option, None)) for option in key_options]
+    if ref_labels:
+        key_values += sorted(chr_name + ':' + ref_name for chr_name, ref_name in ref_labels.items())
+    return hashlib.md5('\n'.join(key_values).encode()).hexdigest()
+
+
+def has_result(cache_dirpath, key):
+    return isfile(join(cache_dirpath, key, RESULT_FNAME))
+
+
+def load_result(cache_dirpath, key, output_dirpath):
+    """
+        Copies the cached files to output_dirpath and returns the cached result or None if there is no such entry
+    """
+    entry_dirpath = join(cache_dirpath, key)
+    result_fpath = join(entry_dirpath, RESULT_FNAME)
+    if not isfile(result_fpath):
+        return None
+    try:
+        with open(result_fpath, 'rb') as f:
+            result, saved_fpaths = pickle.load(f)
+        for fpath in saved_fpaths:
+            out_fpath = join(output_dirpath, fpath)
+            if not isdir(dirname(out_fpath)):
+                os.makedirs(dirname(out_fpath))
+            shutil.copyfile(join(entry_dirpath, fpath), out_fpath)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):  # entry is removed or corrupted
+        return None
+    try:
+        os.utime(result_fpath, None)
+    except OSError:
+        pass
+    return result
+
+
+def save_result(cache_dirpath, key, output_dirpath, output_fpaths, result):
+    entry_dirpath = join(cache_dirpath, key)
+    if isdir(entry_dirpath):
+        return
+    tmp_dirpath = entry_dirpath + '.' + str(os.getpid()) + '.tmp'
+    try:
+        os.makedirs(tmp_dirpath)
+        saved_fpaths = []
+        for fpath in output_fpaths:
+            if isfile(fpath):
+                saved_fpath = relpath(fpath, output_dirpath)
+                if not isdir(dirname(join(tmp_dirpath, saved_fpath))):
+                    os.makedirs(dirname(join(tmp_dirpath, saved_fpath)))
+                shutil.copyfile(fpath, join(tmp_dirpath, saved_fpath))
+                saved_fpaths.append(saved_fpath)
+        with open(join(tmp_dirpath, RESULT_FNAME), 'wb') as f:
+            pickle.dump((result, saved_fpaths), f, protocol=2)
+        os.rename(tmp_dirpath, entry_dirpath)  # concurrent QUAST runs never see a partially written entry
+    except (IOError, OSError):  # e.g. the entry was saved by a concurrent QUAST run
+        safe_rm(tmp_dirpath)
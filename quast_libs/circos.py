@@ -20,11 +20,13 @@ except ImportError:
 
 from quast_libs import qutils, qconfig
 from quast_libs.ca_utils.align_contigs import get_aux_out_fpaths
-from quast_libs.ca_utils.misc import create_minimap_output_dir, parse_cs_tag
+from quast_libs.ca_utils.coords_file import iter_coords
+from quast_libs.ca_utils.cs_tag import iter_cs_ops, MISMATCH, INSERTION
+from quast_libs.ca_utils.misc import create_minimap_output_dir
 from quast_libs.fastaparser import get_chr_lengths_from_fastafile
 from quast_libs.icarus_utils import get_assemblies, check_misassembled_blocks, Alignment
 from quast_libs.qutils import get_path_to_program, is_non_empty_file, relpath
-from quast_libs.reads_analyzer import COVERAGE_FACTOR
+from quast_libs.ra_utils.coverage_pyramid import load_coverage
 
 circos_png_fname = 'circos.png'
 TRACK_WIDTH = 0.04
@@ -239,28 +241,22 @@ def create_coverage_plot(cov_fpath, window_size, chr_lengths, output_dir):
     if not cov_fpath:
         return None, max_points
 
-    cov_by_chrom = dict()
     cov_data_fpath = join(output_dir, 'coverage.txt')
     chr_lengths = list(chr_lengths.values())
-    with open(cov_fpath) as f:
-        pos = 0
-        for index, line in enumerate(f):
-            fs = line.split()
-            if line.startswith('#'):
-                pos = 0
-                chrom = fs[0][1:]
-                chrom_order = int(fs[1]) - 1
-                chrom_len = chr_lengths[chrom_order]
-                cov_by_chrom[chrom] = [[] for i in range(chrom_len // window_size + 2)]
-            else:
-                depth = int(fs[-1])
-                cov_by_chrom[chrom][pos // window_size].append(depth)
-                pos += COVERAGE_FACTOR
-
+    coverage = load_coverage(cov_fpath)
     with open(cov_data_fpath, 'w') as out_f:
-        for chrom, depth_list in cov_by_chrom.items():
-            for i, depths in enumerate(depth_list):
-                avg_depth = sum(depths) / len(depths) if depths else 0
+        for chrom in coverage.chromosomes:
+            chrom_len = chr_lengths[coverage.get_index(chrom) - 1]
+            window_sums = [0] * (chrom_len // window_size + 2)
+            window_counts = [0] * (chrom_len // window_size + 2)
+            level = coverage.get_window_level(chrom, window_size)
+            bin_size = coverage.get_bin_size(level)
+            _, _, sums = coverage.get_level(chrom, level)
+            for i, (depths_sum, count) in enumerate(zip(sums, coverage.get_bin_counts(chrom, level))):
+                window_sums[i * bin_size // window_size] += int(depths_sum)
+                window_counts[i * bin_size // window_size] += count
+            for i, (depths_sum, count) in enumerate(zip(window_sums, window_counts)):
+                avg_depth = depths_sum / count if count else 0
                 out_f.write('\t'.join([chrom, str(i * window_size), str(((i + 1) * window_size)), str(avg_depth)]) + '\n')
                 max_points += 1
     return cov_data_fpath, max_points
@@ -276,19 +272,14 @@ def create_mismatches_plot(assembly, window_size, ref_len, root_dir, output_dir)
 
     mismatches_fpath = join(output_dir, assembly_label + '.mismatches.txt')
     mismatch_density_by_chrom = defaultdict(lambda : [0] * (ref_len // window_size + 1))
-    with open(coords_filtered_fpath) as coords_file:
-        for line in coords_file:
-            s1 = int(line.split('|')[0].split()[0])
-            chrom = line.split()[11].strip()
-            cigar = line.split()[-1].strip()
-            ref_pos = s1
-            for op in parse_cs_tag(cigar):
-                n_bases = len(op) - 1
-                if op.startswith('*'):
-                    mismatch_density_by_chrom[chrom][int(ref_pos) // window_size] += 1
-                    ref_pos += 1
-                elif not op.startswith('+'):
-                    ref_pos += n_bases
+    for s1, _, _, _, _, _, _, chrom, _, cigar, _ in iter_coords(coords_filtered_fpath, with_cs=True):
+        ref_pos = s1
+        for op, n_bases, _ in iter_cs_ops(cigar):
+            if op == MISMATCH:
+                mismatch_density_by_chrom[chrom][int(ref_pos) // window_size] += 1
+                ref_pos += 1
+            elif op != INSERTION:
+                ref_pos += n_bases
     with open(mismatches_fpath, 'w') as out_f:
         for chrom, density_list in mismatch_density_by_chrom.items():
             start, end = 0, 0
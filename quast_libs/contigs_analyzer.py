@@ -26,11 +26,16 @@ from os.path import join, dirname
 from quast_libs import reporting, qconfig, qutils, fastaparser
 from quast_libs.ca_utils import misc
 from quast_libs.ca_utils.analyze_contigs import analyze_contigs
-from quast_libs.ca_utils.analyze_misassemblies import Mapping, IndelsInfo
+from quast_libs.ca_utils.analyze_misassemblies import IndelsInfo, find_all_sv
+from quast_libs.ca_utils.coords_file import CoordsWriter, get_index_fpath
+from quast_libs.ca_utils.coverage import GenomeCoverage
+from quast_libs.ca_utils.cs_tag import MISMATCH, INSERTION, DELETION
+from quast_libs.ca_utils import results_cache
 from quast_libs.ca_utils.misc import ref_labels_by_chromosomes, compile_aligner, \
-    create_minimap_output_dir, close_handlers, parse_cs_tag
+    create_minimap_output_dir, close_handlers, CAOutput
 
-from quast_libs.ca_utils.align_contigs import align_contigs, get_aux_out_fpaths, AlignerStatus
+from quast_libs.ca_utils.align_contigs import align_contigs, get_aux_out_fpaths, create_reference_index, \
+    get_cached_reference_index, has_existing_alignments, AlignerStatus
 from quast_libs.ca_utils.save_results import print_results, save_result, save_result_for_unaligned, \
     save_combined_ref_stats
 from quast_libs.fastaparser import get_genome_stats
@@ -41,73 +46,50 @@ from quast_libs.qutils import is_python2, run_parallel
 logger = get_logger(qconfig.LOGGER_DEFAULT_NAME)
 
 
-class CAOutput():
-    def __init__(self, stdout_f, misassembly_f=None, coords_filtered_f=None, used_snps_f=None, icarus_out_f=None):
-        self.stdout_f = stdout_f
-        self.misassembly_f = misassembly_f
-        self.coords_filtered_f = coords_filtered_f
-        self.used_snps_f = used_snps_f
-        self.icarus_out_f = icarus_out_f
-
-
 def analyze_coverage(ref_aligns, reference_chromosomes, ns_by_chromosomes, used_snps_fpath):
     indels_info = IndelsInfo()
-    genome_mapping = {}
-    for chr_name, chr_len in reference_chromosomes.items():
-        genome_mapping[chr_name] = [0] * (chr_len + 1)
+    genome_coverage = GenomeCoverage(reference_chromosomes, ns_by_chromosomes)
     with open(used_snps_fpath, 'w') as used_snps_f:
         for chr_name, aligns in ref_aligns.items():
             for align in aligns:
                 ref_pos, ctg_pos = align.s1, align.s2
                 strand_direction = 1 if align.s2 < align.e2 else -1
-                for op in parse_cs_tag(align.cigar):
-                    if op.startswith(':'):
-                        n_bases = int(op[1:])
-                    else:
-                        n_bases = len(op) - 1
-                    if op.startswith('*'):
-                        ref_nucl, ctg_nucl = op[1].upper(), op[2].upper()
+                for op, n_bases, bases in align.cs.iter_ops():
+                    if op == MISMATCH:
+                        ref_nucl, ctg_nucl = bases[0].upper(), bases[1].upper()
                         if ctg_nucl != 'N' and ref_nucl != 'N':
                             indels_info.mismatches += 1
                             if qconfig.show_snps:
                                 used_snps_f.write('%s\t%s\t%d\t%s\t%s\t%d\n' % (chr_name, align.contig, ref_pos, ref_nucl, ctg_nucl, ctg_pos))
                         ref_pos += 1
                         ctg_pos += 1 * strand_direction
-                    elif op.startswith('+'):
+                    elif op == INSERTION:
                         indels_info.indels_list.append(n_bases)
                         indels_info.insertions += n_bases
                         if qconfig.show_snps and n_bases < qconfig.MAX_INDEL_LENGTH:
-                            ref_nucl, ctg_nucl = '.', op[1:].upper()
+                            ref_nucl, ctg_nucl = '.', bases.upper()
                             used_snps_f.write('%s\t%s\t%d\t%s\t%s\t%d\n' % (chr_name, align.contig, ref_pos, ref_nucl, ctg_nucl, ctg_pos))
                         ctg_pos += n_bases * strand_direction
-                    elif op.startswith('-'):
+                    elif op == DELETION:
                         indels_info.indels_list.append(n_bases)
                         indels_info.deletions += n_bases
                         if qconfig.show_snps and n_bases < qconfig.MAX_INDEL_LENGTH:
-                            ref_nucl, ctg_nucl = op[1:].upper(), '.'
+                            ref_nucl, ctg_nucl = bases.upper(), '.'
                             used_snps_f.write('%s\t%s\t%d\t%s\t%s\t%d\n' % (chr_name, align.contig, ref_pos, ref_nucl, ctg_nucl, ctg_pos))
                         ref_pos += n_bases
                     else:
                         ref_pos += n_bases
                         ctg_pos += n_bases * strand_direction
-                if align.s1 < align.e1:
-                    for pos in range(align.s1, align.e1 + 1):
-                        genome_mapping[align.ref][pos] = 1
-                else:
-                    for pos in range(align.s1, len(genome_mapping[align.ref])):
-                        genome_mapping[align.ref][pos] = 1
-                    for pos in range(1, align.e1 + 1):
-                        genome_mapping[align.ref][pos] = 1
-            for i in ns_by_chromosomes[align.ref]:
-                genome_mapping[align.ref][i] = 0
-
-    covered_bases = sum([sum(genome_mapping[chrom]) for chrom in genome_mapping])
+                genome_coverage.add(align.ref, align.s1, align.e1, is_cyclic=True)
+
+    covered_bases = genome_coverage.covered_bases()
     return covered_bases, indels_info
 
 
 # former plantagora and plantakolya
-def align_and_analyze(is_cyclic, index, contigs_fpath, output_dirpath, ref_fpath,
-                      reference_chromosomes, ns_by_chromosomes, old_contigs_fpath, bed_fpath, threads=1):
+def align_and_analyze(index, contigs_fpath, old_contigs_fpath, result_key, is_cyclic, output_dirpath, ref_fpath,
+                      reference_chromosomes, ns_by_chromosomes, region_struct_variations, bed_fpath, threads=1,
+                      ref_index_fpath=None):
     tmp_output_dirpath = create_minimap_output_dir(output_dirpath)
     assembly_label = qutils.label_from_fpath(contigs_fpath)
     corr_assembly_label = qutils.label_from_fpath_for_fname(contigs_fpath)
@@ -115,6 +97,12 @@ def align_and_analyze(is_cyclic, index, contigs_fpath, output_dirpath, ref_fpath
 
     logger.info('  ' + qutils.index_to_str(index) + assembly_label)
 
+    if result_key:
+        cached_result = results_cache.load_result(qconfig.results_cache_dirpath, result_key, output_dirpath)
+        if cached_result:
+            logger.info('  ' + qutils.index_to_str(index) + 'Using cached results of the analysis.')
+            return cached_result
+
     if not qconfig.space_efficient:
         log_out_fpath = join(output_dirpath, qconfig.contig_report_fname_pattern % corr_assembly_label + '.stdout')
         log_err_fpath = join(output_dirpath, qconfig.contig_report_fname_pattern % corr_assembly_label + '.stderr')
@@ -140,8 +128,8 @@ def align_and_analyze(is_cyclic, index, contigs_fpath, output_dirpath, ref_fpath
         logger.info('  ' + qutils.index_to_str(index) + 'Logging is disabled.')
 
     coords_fpath, coords_filtered_fpath, unaligned_fpath, used_snps_fpath = get_aux_out_fpaths(out_basename)
-    status = align_contigs(coords_fpath, out_basename, ref_fpath, contigs_fpath, old_contigs_fpath, index, threads,
-                           log_out_fpath, log_err_fpath)
+    status, aligns = align_contigs(coords_fpath, out_basename, ref_fpath, contigs_fpath, old_contigs_fpath, index, threads,
+                                   log_out_fpath, log_err_fpath, ref_index_fpath)
     if status != AlignerStatus.OK:
         with open(log_err_fpath, 'a') as log_err_f:
             if status == AlignerStatus.ERROR:
@@ -158,13 +146,6 @@ def align_and_analyze(is_cyclic, index, contigs_fpath, output_dirpath, ref_fpath
         return status, {}, [], [], []
 
     log_out_f = open(log_out_fpath, 'a')
-    # Loading the alignment files
-    log_out_f.write('Parsing coords...\n')
-    aligns = {}
-    with open(coords_fpath) as coords_file:
-        for line in coords_file:
-            mapping = Mapping.from_line(line)
-            aligns.setdefault(mapping.contig, []).append(mapping)
 
     # Loading the reference sequences
     log_out_f.write('Loading reference...\n') # TODO: move up
@@ -185,12 +166,13 @@ def align_and_analyze(is_cyclic, index, contigs_fpath, output_dirpath, ref_fpath
     log_out_f.write('\tTotal Regions: %d\n' % total_regions)
     log_out_f.write('\tTotal Region Length: %d\n' % total_reg_len)
 
-    ca_output = CAOutput(stdout_f=log_out_f, misassembly_f=misassembly_f, coords_filtered_f=open(coords_filtered_fpath, 'w'),
+    ca_output = CAOutput(stdout_f=log_out_f, misassembly_f=misassembly_f, coords_filtered_f=CoordsWriter(coords_filtered_fpath),
                          icarus_out_f=icarus_out_f)
 
     log_out_f.write('Analyzing contigs...\n')
     result, ref_aligns, total_indels_info, aligned_lengths, misassembled_contigs, misassemblies_in_contigs, aligned_lengths_by_contigs =\
-        analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fpath, aligns, ref_features, reference_chromosomes, is_cyclic)
+        analyze_contigs(ca_output, contigs_fpath, unaligned_fpath, unaligned_info_fpath, aligns, ref_features, reference_chromosomes,
+                        region_struct_variations, is_cyclic, threads)
 
     log_out_f.write('Analyzing coverage...\n')
     if qconfig.show_snps:
@@ -201,15 +183,16 @@ def align_and_analyze(is_cyclic, index, contigs_fpath, output_dirpath, ref_fpath
     result.update(cov_stats)
     result = print_results(contigs_fpath, log_out_f, used_snps_fpath, total_indels_info, result)
 
+    mis_contigs_fpath = join(output_dirpath, qutils.name_from_fpath(contigs_fpath) + '.mis_contigs.fa')
     if not qconfig.space_efficient:
         ## outputting misassembled contigs to separate file
-        fasta = [(name, seq) for name, seq in fastaparser.read_fasta(contigs_fpath)
-                 if name in misassembled_contigs.keys()]
-        fastaparser.write_fasta(join(output_dirpath, qutils.name_from_fpath(contigs_fpath) + '.mis_contigs.fa'), fasta)
+        with fastaparser.FastaIndex(contigs_fpath) as fasta_index:
+            fasta = [(name, fasta_index.fetch(name)) for name in fasta_index.names() if name in misassembled_contigs]
+            fastaparser.write_fasta(mis_contigs_fpath, fasta)
 
+    alignment_tsv_fpath = join(output_dirpath, "alignments_" + corr_assembly_label + '.tsv')
+    unique_contigs_fpath = join(output_dirpath, qconfig.unique_contigs_fname_pattern % corr_assembly_label)
     if qconfig.is_combined_ref:
-        alignment_tsv_fpath = join(output_dirpath, "alignments_" + corr_assembly_label + '.tsv')
-        unique_contigs_fpath = join(output_dirpath, qconfig.unique_contigs_fname_pattern % corr_assembly_label)
         logger.debug('  ' + qutils.index_to_str(index) + 'Alignments: ' + qutils.relpath(alignment_tsv_fpath))
         used_contigs = set()
         with open(unique_contigs_fpath, 'w') as unique_contigs_f:
@@ -240,10 +223,18 @@ def align_and_analyze(is_cyclic, index, contigs_fpath, output_dirpath, ref_fpath
     close_handlers(ca_output)
     logger.info('  ' + qutils.index_to_str(index) + 'Analysis is finished.')
     logger.debug('')
-    if not ref_aligns:
-        return AlignerStatus.NOT_ALIGNED, result, aligned_lengths, misassemblies_in_contigs, aligned_lengths_by_contigs
-    else:
-        return AlignerStatus.OK, result, aligned_lengths, misassemblies_in_contigs, aligned_lengths_by_contigs
+    status = AlignerStatus.NOT_ALIGNED if not ref_aligns else AlignerStatus.OK
+    if result_key:
+        output_fpaths = [log_out_fpath, log_err_fpath, icarus_out_fpath, misassembly_fpath, unaligned_info_fpath,
+                         coords_fpath, coords_filtered_fpath, get_index_fpath(coords_fpath),
+                         get_index_fpath(coords_filtered_fpath), unaligned_fpath, used_snps_fpath, out_basename + '.sf']
+        if not qconfig.space_efficient:
+            output_fpaths.append(mis_contigs_fpath)
+        if qconfig.is_combined_ref:
+            output_fpaths += [alignment_tsv_fpath, unique_contigs_fpath]
+        results_cache.save_result(qconfig.results_cache_dirpath, result_key, output_dirpath, output_fpaths,
+                                  (status, result, aligned_lengths, misassemblies_in_contigs, aligned_lengths_by_contigs))
+    return status, result, aligned_lengths, misassemblies_in_contigs, aligned_lengths_by_contigs
 
 
 def do(reference, contigs_fpaths, is_cyclic, output_dir, old_contigs_fpaths, bed_fpath=None):
@@ -258,16 +249,50 @@ def do(reference, contigs_fpaths, is_cyclic, output_dir, old_contigs_fpaths, bed
         return dict(zip(contigs_fpaths, [AlignerStatus.FAILED] * len(contigs_fpaths))), None
 
     num_nf_errors = logger._num_nf_errors
-    create_minimap_output_dir(output_dir)
+    minimap_output_dir = create_minimap_output_dir(output_dir)
     n_jobs = min(len(contigs_fpaths), qconfig.max_threads)
     threads = max(1, qconfig.max_threads // n_jobs)
 
     genome_size, reference_chromosomes, ns_by_chromosomes = get_genome_stats(reference, skip_ns=True)
     threads = qconfig.max_threads if qconfig.memory_efficient else threads
-    args = [(is_cyclic, i, contigs_fpath, output_dir, reference, reference_chromosomes, ns_by_chromosomes,
-            old_contigs_fpath, bed_fpath, threads)
-            for i, (contigs_fpath, old_contigs_fpath) in enumerate(zip(contigs_fpaths, old_contigs_fpaths))]
-    statuses, results, aligned_lengths, misassemblies_in_contigs, aligned_lengths_by_contigs = run_parallel(align_and_analyze, args, n_jobs)
+
+    result_keys = [None] * len(contigs_fpaths)
+    if qconfig.results_cache_dirpath:
+        result_keys = [results_cache.get_result_key(contigs_fpath, reference, bed_fpath,
+                                                    qutils.label_from_fpath_for_fname(contigs_fpath), is_cyclic,
+                                                    contigs_fpath in qconfig.dict_of_broken_scaffolds,
+                                                    ref_labels_by_chromosomes if qconfig.is_combined_ref else None)
+                       for contigs_fpath in contigs_fpaths]
+    # the reference index is needed only for assemblies without cached results and alignments of the previous runs
+    num_minimap_runs = 0
+    for contigs_fpath, old_contigs_fpath, result_key in zip(contigs_fpaths, old_contigs_fpaths, result_keys):
+        if result_key and results_cache.has_result(qconfig.results_cache_dirpath, result_key):
+            continue
+        out_basename = join(minimap_output_dir, qutils.label_from_fpath_for_fname(contigs_fpath))
+        if has_existing_alignments(get_aux_out_fpaths(out_basename)[0], out_basename, reference, old_contigs_fpath):
+            continue
+        num_minimap_runs += 1
+
+    ref_index_fpath = None
+    if qconfig.ref_index_cache_dirpath and num_minimap_runs > 0:
+        ref_index_fpath = get_cached_reference_index(reference, qconfig.ref_index_cache_dirpath,
+                                                     join(minimap_output_dir, qutils.name_from_fpath(reference) + '.mmi.log'),
+                                                     qconfig.max_threads)
+    elif not qconfig.ref_index_cache_dirpath and num_minimap_runs > 1:
+        # the reference is indexed once instead of doing it in each minimap2 run
+        ref_index_fpath = join(minimap_output_dir, qutils.name_from_fpath(reference) + '.mmi')
+        ref_index_fpath = create_reference_index(reference, ref_index_fpath, ref_index_fpath + '.log', qconfig.max_threads)
+    region_struct_variations = find_all_sv(qconfig.bed)
+    args = [(i, contigs_fpath, old_contigs_fpath, result_key)
+            for i, (contigs_fpath, old_contigs_fpath, result_key) in enumerate(zip(contigs_fpaths, old_contigs_fpaths, result_keys))]
+    common_args = (is_cyclic, output_dir, reference, reference_chromosomes, ns_by_chromosomes, region_struct_variations,
+                   bed_fpath, threads, ref_index_fpath)
+    statuses, results, aligned_lengths, misassemblies_in_contigs, aligned_lengths_by_contigs = \
+        run_parallel(align_and_analyze, args, n_jobs, job_sizes=[os.path.getsize(fpath) for fpath in contigs_fpaths],
+                     common_args=common_args)
+    if ref_index_fpath and not qconfig.ref_index_cache_dirpath and not qconfig.debug:
+        os.remove(ref_index_fpath)
+        os.remove(ref_index_fpath + '.log')
     reports = []
 
     aligner_statuses = dict(zip(contigs_fpaths, statuses))
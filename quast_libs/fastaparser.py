@@ -7,8 +7,11 @@
 
 from __future__ import with_statement
 import os
+import re
 import sys
 import gzip
+import mmap
+import tempfile
 import zipfile
 
 try:
@@ -22,13 +25,25 @@ except ImportError:
     from quast_libs.site_packages import bz2
 if sys.version_info[0] == 3:
     import io
+else:
+    from string import maketrans
 from quast_libs import qconfig
+from quast_libs.packed_seq import PackedSeq
 # There is a pyfasta package -- http://pypi.python.org/pypi/pyfasta/
 # Use it!
 
 from quast_libs.log import get_logger
 logger = get_logger(qconfig.LOGGER_DEFAULT_NAME)
 
+ns_pattern = re.compile('N+')
+MIN_GC_WINDOW_SIZE = qconfig.GC_window_size // 2
+GC_TABLE = (maketrans if sys.version_info[0] == 2 else str.maketrans)('C', 'G')  # G's and C's are counted together
+
+
+def is_compressed(fpath):
+    _, ext = os.path.splitext(fpath)
+    return ext in ['.gz', '.gzip', '.bz2', '.bzip2', '.zip']
+
 
 def _get_fasta_file_handler(fpath):
     fasta_file = None
@@ -121,6 +136,13 @@ def get_chr_lengths_from_fastafile(fpath):
     return chr_lengths
 
 
+def get_ns_intervals(seq):
+    """
+        Returns runs of N's in sequence as a list of 1-based closed intervals (start, end)
+    """
+    return [(match.start() + 1, match.end()) for match in ns_pattern.finditer(seq)]
+
+
 def get_genome_stats(fasta_fpath, skip_ns=False):
     genome_size = 0
     reference_chromosomes = {}
@@ -129,13 +151,123 @@ def get_genome_stats(fasta_fpath, skip_ns=False):
         chr_name = name.split()[0]
         chr_len = len(seq)
         genome_size += chr_len
-        ns_by_chromosomes[chr_name] = set(x + 1 for x, s in enumerate(seq) if s == 'N')
+        ns_by_chromosomes[chr_name] = get_ns_intervals(seq)
         if skip_ns:
-            genome_size -= len(ns_by_chromosomes[chr_name])
+            genome_size -= sum(end - start + 1 for start, end in ns_by_chromosomes[chr_name])
         reference_chromosomes[chr_name] = chr_len
     return genome_size, reference_chromosomes, ns_by_chromosomes
 
 
+def get_GC_seq(seq):
+    """
+        Returns the sequence with C's replaced by G's, so G/C and N letters in a window are counted in two scans
+    """
+    return seq.translate(GC_TABLE)
+
+
+def get_GC_windows(GC_seq, window_size):
+    """
+        Returns GC % of each non-overlapping window of the sequence (see get_GC_seq),
+        GC % is None for short windows and windows with too many N's
+    """
+    seq_len = len(GC_seq)
+    count = GC_seq.count
+    has_ns = 'N' in GC_seq  # N's are counted in each window only if there are any
+    GC_percents = []
+    for start in range(0, seq_len, window_size):
+        end = min(start + window_size, seq_len)
+        window_len = end - start
+        if window_len < MIN_GC_WINDOW_SIZE:
+            GC_percents.append(None)
+            continue
+        ACGT_len = window_len - count('N', start, end) if has_ns else window_len
+        # skip block if it has less than half of ACGT letters (it also helps with "ends of contigs")
+        if ACGT_len < window_len // 2:
+            GC_percents.append(None)
+            continue
+        GC_percents.append(100 * count('G', start, end) // ACGT_len)
+    return GC_percents
+
+
+class FastaStats(object):
+    """
+        Statistics of all sequences in a FASTA file collected in a single pass:
+        names, lengths, numbers of N's and G/C letters, and the number of
+        non-overlapping windows (of qconfig.GC_window_size) for each GC % value
+    """
+    def __init__(self, window_size=None):
+        self.window_size = qconfig.GC_window_size if window_size is None else window_size  # 0: no GC windows
+        self.names = []
+        self.lengths = []
+        self.ns = []
+        self.gc = []
+        self.windows_GC_distribution = [0] * 101
+
+    def add(self, name, seq):
+        GC_seq = get_GC_seq(seq)
+        self.names.append(name)
+        self.lengths.append(len(seq))
+        self.ns.append(GC_seq.count('N'))
+        self.gc.append(GC_seq.count('G'))
+        if not self.window_size:
+            return
+        for GC_percent in get_GC_windows(GC_seq, self.window_size):
+            if GC_percent is not None:
+                self.windows_GC_distribution[GC_percent] += 1
+
+    def save(self, stats_fpath):
+        with open(stats_fpath, 'w') as out_f:
+            out_f.write('#' + str(self.window_size) + '\t' + ','.join(str(v) for v in self.windows_GC_distribution) + '\n')
+            for fields in zip(self.names, self.lengths, self.ns, self.gc):
+                out_f.write('\t'.join(str(f) for f in fields) + '\n')
+
+    @classmethod
+    def load(cls, stats_fpath):
+        with open(stats_fpath) as in_f:
+            window_size, windows_GC_distribution = in_f.readline()[1:].split('\t')
+            fasta_stats = FastaStats(int(window_size))
+            fasta_stats.windows_GC_distribution = [int(v) for v in windows_GC_distribution.split(',')]
+            for line in in_f:
+                name, length, ns, gc = line.rstrip('\n').split('\t')
+                fasta_stats.names.append(name)
+                fasta_stats.lengths.append(int(length))
+                fasta_stats.ns.append(int(ns))
+                fasta_stats.gc.append(int(gc))
+        return fasta_stats
+
+
+def get_stats_fpath(fasta_fpath):
+    return fasta_fpath + '.stats'
+
+
+def create_stats_file(fasta_fpath, fasta, calculate_GC_windows=True):
+    """
+        Saves statistics of (name, seq) entries already written to fasta_fpath,
+        so further QUAST stages can use them without parsing the FASTA file again
+    """
+    fasta_stats = FastaStats(None if calculate_GC_windows else 0)
+    for name, seq in fasta:
+        fasta_stats.add(name, seq)
+    fasta_stats.save(get_stats_fpath(fasta_fpath))
+    return fasta_stats
+
+
+def get_fasta_stats(fasta_fpath, calculate_GC_windows=True):
+    """
+        Returns FastaStats from the file saved along with the FASTA file (see create_stats_file)
+        or calculates them from scratch if the saved file is missing or outdated
+    """
+    stats_fpath = get_stats_fpath(fasta_fpath)
+    if os.path.isfile(stats_fpath) and os.path.getmtime(stats_fpath) >= os.path.getmtime(fasta_fpath):
+        fasta_stats = FastaStats.load(stats_fpath)
+        if fasta_stats.window_size == qconfig.GC_window_size or not calculate_GC_windows:
+            return fasta_stats
+    fasta_stats = FastaStats(None if calculate_GC_windows else 0)
+    for name, seq in read_fasta(fasta_fpath):
+        fasta_stats.add(name, seq)
+    return fasta_stats
+
+
 def create_fai_file(fasta_fpath):
     l = 0
     total_offset = 0
@@ -143,22 +275,17 @@ def create_fai_file(fasta_fpath):
     chr_name = None
     fai_fpath = fasta_fpath + '.fai'
     fai_fields = []
-    with open(fasta_fpath) as in_f:
+    # offsets are counted in bytes, so the file is read in the binary mode to keep '\r' of '\r\n' line breaks
+    with open(fasta_fpath, 'rb') as in_f:
         for raw_line in in_f:
-            if raw_line.find('\r') != -1:
-                lines = raw_line.split('\r')
-            else:
-                lines = [raw_line]
-            for line in lines:
-                if not line:
-                    continue
-                if line[0] == '>':
+            for line in raw_line.splitlines(True):  # lines may also be separated by '\r' only
+                if line[:1] == b'>':
                     if l:  # not the first sequence in FASTA
                         fai_fields.append([chr_name, l, total_offset, len(chr_line.strip()), len(chr_line)])
                         total_offset += chr_offset
                         l = 0
                         chr_offset = 0
-                    chr_name = __get_entry_name(line)
+                    chr_name = __get_entry_name(line if sys.version_info[0] == 2 else line.decode())
                     total_offset += len(line)
                 else:
                     if not l:
@@ -171,6 +298,115 @@ def create_fai_file(fasta_fpath):
             out_f.write('\t'.join([str(fs) for fs in fields]) + '\n')
 
 
+def is_fai_file_valid(fasta_fpath):
+    fai_fpath = fasta_fpath + '.fai'
+    if not os.path.isfile(fai_fpath) or os.path.getmtime(fai_fpath) < os.path.getmtime(fasta_fpath):
+        return False
+    with open(fai_fpath) as in_f:
+        line = in_f.readline()
+    return len(line.split('\t')) == 5  # QUAST may save two-column files with chromosome lengths to the same path
+
+
+class FastaIndex(object):
+    """
+        Random access to FASTA entries by name through the samtools-style .fai index (see create_fai_file).
+        Sequences are memory-mapped, so only the requested parts of them are read, and processes using the same file
+        (including forked workers inheriting the index) share a single copy of it in the page cache.
+        Compressed files are unpacked once into a temporary file with the sequences only (one byte per base).
+        Coordinates in fetch() are 0-based and the end is exclusive (as in Python slices).
+    """
+    def __init__(self, fasta_fpath):
+        self.fpath = fasta_fpath
+        self.entries = OrderedDict()  # name -> (length, offset, line_bases, line_bytes)
+        self._unpacked_fpath = None
+        self._owner_pid = os.getpid()  # the temporary file is removed by the process created it only
+        if is_compressed(fasta_fpath):
+            self._unpacked_fpath = unpack_sequences(fasta_fpath, self.entries)
+        elif os.path.getsize(fasta_fpath):
+            if not is_fai_file_valid(fasta_fpath):
+                create_fai_file(fasta_fpath)
+            with open(fasta_fpath + '.fai') as fai_f:
+                for line in fai_f:
+                    name, length, offset, line_bases, line_bytes = line.rstrip('\n').split('\t')
+                    self.entries[name] = (int(length), int(offset), int(line_bases), int(line_bytes))
+        self._map_file()
+
+    def _map_file(self):
+        self._file = None
+        self._mmap = None
+        mapped_fpath = self._unpacked_fpath or self.fpath
+        if os.path.getsize(mapped_fpath):
+            self._file = open(mapped_fpath, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __getstate__(self):  # the index is passed to other processes without sequences, they map the same file
+        return {'fpath': self.fpath, 'entries': self.entries, '_unpacked_fpath': self._unpacked_fpath,
+                '_owner_pid': self._owner_pid}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._map_file()
+
+    def names(self):
+        return list(self.entries.keys())
+
+    def length(self, name):
+        return self.entries[name][0]
+
+    def fetch(self, name, start=0, end=None):
+        length, offset, line_bases, line_bytes = self.entries[name]
+        end = length if end is None else min(end, length)
+        start = max(start, 0)
+        if start >= end:
+            return ''
+        start_offset = offset + (start // line_bases) * line_bytes + start % line_bases
+        end_offset = offset + ((end - 1) // line_bases) * line_bytes + (end - 1) % line_bases + 1
+        seq = self._mmap[start_offset:end_offset]
+        if line_bases != line_bytes:
+            seq = seq.translate(None, b'\r\n')
+        return seq if sys.version_info[0] == 2 else seq.decode()
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        for name in self.entries:
+            yield name, self.fetch(name)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+        if self._unpacked_fpath and self._owner_pid == os.getpid() and os.path.isfile(self._unpacked_fpath):
+            os.remove(self._unpacked_fpath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def unpack_sequences(fasta_fpath, entries):
+    """
+        Writes sequences of the (compressed) FASTA file one after another without names and line breaks,
+        fills entries in the format of FastaIndex and returns the path to the temporary file
+    """
+    tmp_dirpath = qconfig.output_dirpath if qconfig.output_dirpath and os.path.isdir(qconfig.output_dirpath) else None
+    fd, unpacked_fpath = tempfile.mkstemp(prefix=os.path.basename(fasta_fpath) + '.', suffix='.seq', dir=tmp_dirpath)
+    offset = 0
+    with os.fdopen(fd, 'wb') as out_f:
+        for name, seq in read_fasta(fasta_fpath):
+            out_f.write(seq.encode())
+            entries[name] = (len(seq), offset, max(len(seq), 1), max(len(seq), 1))
+            offset += len(seq)
+    return unpacked_fpath
+
+
 def split_fasta(fpath, output_dirpath):
     """
         Takes filename of FASTA-file and directory to output
@@ -192,10 +428,12 @@ def split_fasta(fpath, output_dirpath):
         outFile.close()
 
 
-def read_fasta(fpath):
+def read_fasta(fpath, packed=False):
     """
-        Generator that returns FASTA entries in tuples (name, seq)
+        Generator that returns FASTA entries in tuples (name, seq),
+        sequences are PackedSeq if packed is True (for ACGTN sequences only, e.g. corrected by QUAST)
     """
+    join_seq = (lambda lines: PackedSeq(''.join(lines))) if packed else ''.join
     first = True
     seq = []
     name = ''
@@ -209,7 +447,7 @@ def read_fasta(fpath):
                 continue
             if line[0] == '>':
                 if not first:
-                    yield name, "".join(seq)
+                    yield name, join_seq(seq)
 
                 first = False
                 name = __get_entry_name(line)
@@ -218,17 +456,17 @@ def read_fasta(fpath):
                 seq.append(line.strip())
 
     if name or seq:
-        yield name, "".join(seq)
+        yield name, join_seq(seq)
 
     fasta_file.close()
 
 
-def read_fasta_one_time(fpath):
+def read_fasta_one_time(fpath, packed=False):
     """
         Returns list of FASTA entries (in tuples: name, seq)
     """
     list_seq = []
-    for (name, seq) in read_fasta(fpath):
+    for (name, seq) in read_fasta(fpath, packed):
         list_seq.append((name, seq))
     return list_seq
 
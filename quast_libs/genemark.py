@@ -247,7 +247,9 @@ def predict_genes(index, contigs_fpath, gene_lengths, out_dirpath, tool_dirpath,
 
     err_fpath = os.path.join(out_dirpath, corr_assembly_label + '_genemark.stderr')
 
+    num_threads = qutils.take_threads(num_threads)
     genes = gmhmm_p_function(tool_dirpath, contigs_fpath, err_fpath, index, tmp_dirpath, num_threads)
+    qutils.release_threads()
     contig_lengths = get_chr_lengths_from_fastafile(contigs_fpath)
 
     if not genes:
@@ -316,7 +318,8 @@ def do(fasta_fpaths, gene_lengths, out_dirpath, prokaryote, meta):
         parallel_run_args = [(index, fasta_fpath, gene_lengths, out_dirpath, tool_dirpath, tmp_dirpath,
                               gmhmm_p_function, prokaryote, num_threads)
                              for index, fasta_fpath in enumerate(fasta_fpaths)]
-        genes_list, unique_count, full_genes, partial_genes = run_parallel(predict_genes, parallel_run_args, n_jobs)
+        genes_list, unique_count, full_genes, partial_genes = run_parallel(predict_genes, parallel_run_args, n_jobs,
+                                                                           job_sizes=[os.path.getsize(fpath) for fpath in fasta_fpaths])
         if not is_license_valid(out_dirpath, fasta_fpaths):
             return
 
@@ -11,6 +11,9 @@ import os
 from collections import defaultdict
 
 from quast_libs import fastaparser, genes_parser, reporting, qconfig, qutils
+from quast_libs.ca_utils.align_contigs import get_aux_out_fpaths
+from quast_libs.ca_utils.coords_file import iter_coords
+from quast_libs.ca_utils.coverage import GenomeCoverage, IntervalIndex, intervals_len
 from quast_libs.log import get_logger
 from quast_libs.qutils import run_parallel
 
@@ -71,29 +74,21 @@ def process_single_file(contigs_fpath, index, coords_dirpath, genome_stats_dirpa
     ref_lengths = defaultdict(int)
     logger.info('  ' + qutils.index_to_str(index) + assembly_label)
 
-    coords_base_fpath = os.path.join(coords_dirpath, corr_assembly_label + '.coords')
+    coords_base_fpath, coords_filtered_fpath, _, _ = get_aux_out_fpaths(os.path.join(coords_dirpath, corr_assembly_label))
     if qconfig.use_all_alignments:
         coords_fpath = coords_base_fpath
     else:
-        coords_fpath = coords_base_fpath + '.filtered'
+        coords_fpath = coords_filtered_fpath
 
     if not os.path.isfile(coords_fpath):
         logger.error('File with alignment coords (' + coords_fpath + ') not found! Try to restart QUAST.',
             indent='  ')
         return None, None
 
-    # EXAMPLE:
-    #    [S1]     [E1]  |     [S2]     [E2]  |  [LEN 1]  [LEN 2]  |  [% IDY]  | [TAGS]
-    #=====================================================================================
-    #  338980   339138  |     2298     2134  |      159      165  |    79.76  | gi|48994873|gb|U00096.2|	NODE_0_length_6088
-    #  374145   374355  |     2306     2097  |      211      210  |    85.45  | gi|48994873|gb|U00096.2|	NODE_0_length_6088
+    genome_coverage = GenomeCoverage(reference_chromosomes, ns_by_chromosomes)
 
-    genome_mapping = {}
-    for chr_name, chr_len in reference_chromosomes.items():
-        genome_mapping[chr_name] = [0] * (chr_len + 1)
-
-    contig_tuples = fastaparser.read_fasta(contigs_fpath)  # list of FASTA entries (in tuples: name, seq)
-    sorted_contig_tuples = sorted(enumerate(contig_tuples), key=lambda x: len(x[1][1]), reverse=True)
+    fasta_stats = fastaparser.get_fasta_stats(contigs_fpath, calculate_GC_windows=False)
+    sorted_contig_tuples = sorted(enumerate(zip(fasta_stats.names, fasta_stats.lengths)), key=lambda x: x[1][1], reverse=True)
     sorted_contigs_names = []
     contigs_order = []
     for idx, (name, _) in sorted_contig_tuples:
@@ -110,32 +105,21 @@ def process_single_file(contigs_fpath, index, coords_dirpath, genome_stats_dirpa
     if gene_searching_enabled:
         for name in sorted_contigs_names:
             aligned_blocks_by_contig_name[name] = []
-    with open(coords_fpath) as coordfile:
-        for line in coordfile:
-            s1 = int(line.split('|')[0].split()[0])
-            e1 = int(line.split('|')[0].split()[1])
-            s2 = int(line.split('|')[1].split()[0])
-            e2 = int(line.split('|')[1].split()[1])
-            contig_name = line.split()[12].strip()
-            chr_name = line.split()[11].strip()
-
-            if chr_name not in genome_mapping:
-                logger.error("Something went wrong and chromosome names in your coords file (" + coords_base_fpath + ") " \
-                             "differ from the names in the reference. Try to remove the file and restart QUAST.")
-                return None
-
-            if gene_searching_enabled:
-                aligned_blocks_by_contig_name[contig_name].append(AlignedBlock(seqname=chr_name, start=s1, end=e1,
-                                                                               contig=contig_name, start_in_contig=s2, end_in_contig=e2))
-            for i in range(s1, e1 + 1):
-                genome_mapping[chr_name][i] = 1
-
-    for chr_name in genome_mapping.keys():
-        for i in ns_by_chromosomes[chr_name]:
-            genome_mapping[chr_name][i] = 0
-        ref_lengths[chr_name] = sum(genome_mapping[chr_name])
-
-    if qconfig.space_efficient and coords_fpath.endswith('.filtered'):
+    for s1, e1, s2, e2, _, _, _, chr_name, contig_name, _, _ in iter_coords(coords_fpath):
+        if chr_name not in reference_chromosomes:
+            logger.error("Something went wrong and chromosome names in your coords file (" + coords_base_fpath + ") " \
+                         "differ from the names in the reference. Try to remove the file and restart QUAST.")
+            return None
+
+        if gene_searching_enabled:
+            aligned_blocks_by_contig_name[contig_name].append(AlignedBlock(seqname=chr_name, start=s1, end=e1,
+                                                                           contig=contig_name, start_in_contig=s2, end_in_contig=e2))
+        genome_coverage.add(chr_name, s1, e1)
+
+    for chr_name in reference_chromosomes.keys():
+        ref_lengths[chr_name] = genome_coverage.covered_bases(chr_name)
+
+    if qconfig.space_efficient and coords_fpath == coords_filtered_fpath:
         os.remove(coords_fpath)
 
     # counting genome coverage and gaps number
@@ -143,20 +127,11 @@ def process_single_file(contigs_fpath, index, coords_dirpath, genome_stats_dirpa
     if qconfig.analyze_gaps:
         gaps_fpath = os.path.join(genome_stats_dirpath, corr_assembly_label + '_gaps.txt') if not qconfig.space_efficient else '/dev/null'
         with open(gaps_fpath, 'w') as gaps_file:
-            for chr_name, chr_len in reference_chromosomes.items():
+            for chr_name in reference_chromosomes.keys():
                 gaps_file.write(chr_name + '\n')
-                cur_gap_size = 0
-                for i in range(1, chr_len + 1):
-                    if genome_mapping[chr_name][i] == 1 or i in ns_by_chromosomes[chr_name]:
-                        if cur_gap_size >= qconfig.min_gap_size:
-                            gaps_count += 1
-                            gaps_file.write(str(i - cur_gap_size) + ' ' + str(i - 1) + '\n')
-                        cur_gap_size = 0
-                    else:
-                        cur_gap_size += 1
-                if cur_gap_size >= qconfig.min_gap_size:
+                for gap_start, gap_end in genome_coverage.gaps(chr_name, qconfig.min_gap_size):
                     gaps_count += 1
-                    gaps_file.write(str(chr_len - cur_gap_size + 1) + ' ' + str(chr_len) + '\n')
+                    gaps_file.write(str(gap_start) + ' ' + str(gap_end) + '\n')
 
     results["gaps_count"] = gaps_count
     results[reporting.Fields.GENES + "_full"] = None
@@ -165,6 +140,11 @@ def process_single_file(contigs_fpath, index, coords_dirpath, genome_stats_dirpa
     results[reporting.Fields.OPERONS + "_partial"] = None
 
     # finding genes and operons
+    blocks_by_chr = defaultdict(list)  # chromosome -> list of (start, end, ((contig_id, block index in contig), AlignedBlock))
+    for contig_id, name in enumerate(sorted_contigs_names):
+        for block_idx, block in enumerate(aligned_blocks_by_contig_name.get(name, [])):
+            blocks_by_chr[block.seqname].append((block.start, block.end, ((contig_id, block_idx), block)))
+    blocks_index_by_chr = dict((chr_name, IntervalIndex(blocks)) for chr_name, blocks in blocks_by_chr.items())
     for container in containers:
         if not container.region_list:
             continue
@@ -181,43 +161,33 @@ def process_single_file(contigs_fpath, index, coords_dirpath, genome_stats_dirpa
         # 2 - part of gene is found
         found_list = [0] * len(container.region_list)
         for i, region in enumerate(container.region_list):
-            found_list[i] = 0
-            gene_blocks = []
             if region.id is None:
                 region.id = '# ' + str(region.number + 1)
-            for contig_id, name in enumerate(sorted_contigs_names):
-                cur_feature_is_found = False
-                for cur_block in aligned_blocks_by_contig_name[name]:
-                    if cur_block.seqname != region.seqname:
-                        continue
-                    if region.end <= cur_block.start or cur_block.end <= region.start:
-                        continue
-                    elif cur_block.start <= region.start and region.end <= cur_block.end:
-                        if found_list[i] == 2:  # already found as partial gene
-                            total_partial -= 1
-                        found_list[i] = 1
-                        total_full += 1
-                        contig_info = cur_block.format_gene_info(region)
-                        found_file.write('%s\t\t%d\t%d\tcomplete\t%s\n' % (region.id, region.start, region.end, contig_info))
-                        if container.kind == 'operon':
-                            operons_in_contigs[contig_id] += 1  # inc number of found genes/operons in id-th contig
-                        else:
-                            features_in_contigs[contig_id] += 1
-
-                        cur_feature_is_found = True
-                        break
-                    elif min(region.end, cur_block.end) - max(region.start, cur_block.start) >= qconfig.min_gene_overlap:
-                        if found_list[i] == 0:
-                            found_list[i] = 2
-                            total_partial += 1
-                        gene_blocks.append(cur_block)
-                    if cur_feature_is_found:
-                        break
-                if cur_feature_is_found:
-                    break
+            overlapping_blocks = []
+            if region.seqname in blocks_index_by_chr:  # blocks sharing more than a single boundary position
+                overlapping_blocks = blocks_index_by_chr[region.seqname].find(region.start + 1, region.end - 1)
+            # the first block (in the order of contigs) which contains the whole gene/operon
+            full_blocks = [(order, block) for order, block in overlapping_blocks
+                           if block.start <= region.start and region.end <= block.end]
+            if full_blocks:
+                (contig_id, _), cur_block = min(full_blocks, key=lambda x: x[0])
+                found_list[i] = 1
+                total_full += 1
+                contig_info = cur_block.format_gene_info(region)
+                found_file.write('%s\t\t%d\t%d\tcomplete\t%s\n' % (region.id, region.start, region.end, contig_info))
+                if container.kind == 'operon':
+                    operons_in_contigs[contig_id] += 1  # inc number of found genes/operons in id-th contig
+                else:
+                    features_in_contigs[contig_id] += 1
+                continue
+            gene_blocks = [(order, block) for order, block in overlapping_blocks
+                           if min(region.end, block.end) - max(region.start, block.start) >= qconfig.min_gene_overlap]
             # adding info about partially found genes/operons
-            if found_list[i] == 2:  # partial gene/operon
-                contig_info = ','.join([block.format_gene_info(region) for block in sorted(gene_blocks, key=lambda block: block.start)])
+            if gene_blocks:
+                found_list[i] = 2
+                total_partial += 1
+                gene_blocks.sort(key=lambda x: (x[1].start, x[0]))
+                contig_info = ','.join([block.format_gene_info(region) for _, block in gene_blocks])
                 found_file.write('%s\t\t%d\t%d\tpartial\t%s\n' % (region.id, region.start, region.end, contig_info))
 
         if container.kind == 'operon':
@@ -321,10 +291,10 @@ def do(ref_fpath, aligned_contigs_fpaths, output_dirpath, features_dict, operons
     num_nf_errors = logger._num_nf_errors
     n_jobs = min(len(aligned_contigs_fpaths), qconfig.max_threads)
 
-    parallel_run_args = [(contigs_fpath, index, coords_dirpath, genome_stats_dirpath,
-                          reference_chromosomes, ns_by_chromosomes, containers)
-                        for index, contigs_fpath in enumerate(aligned_contigs_fpaths)]
-    ref_lengths, results_genes_operons_tuples = run_parallel(process_single_file, parallel_run_args, n_jobs, filter_results=True)
+    parallel_run_args = [(contigs_fpath, index) for index, contigs_fpath in enumerate(aligned_contigs_fpaths)]
+    common_args = (coords_dirpath, genome_stats_dirpath, reference_chromosomes, ns_by_chromosomes, containers)
+    ref_lengths, results_genes_operons_tuples = run_parallel(process_single_file, parallel_run_args, n_jobs, filter_results=True,
+                                                             common_args=common_args)
     num_nf_errors += len(aligned_contigs_fpaths) - len(ref_lengths)
     logger._num_nf_errors = num_nf_errors
     if not ref_lengths:
@@ -338,7 +308,7 @@ def do(ref_fpath, aligned_contigs_fpaths, output_dirpath, features_dict, operons
     for chr_name, chr_len in reference_chromosomes.items():
         aligned_len = max(ref_lengths_by_contigs[chr_name])
         res_file.write('\t' + chr_name + ' (total length: ' + str(chr_len) + ' bp, ' +
-                       'total length without N\'s: ' + str(chr_len - len(ns_by_chromosomes[chr_name])) +
+                       'total length without N\'s: ' + str(chr_len - intervals_len(ns_by_chromosomes[chr_name])) +
                        ' bp, maximal covered length: ' + str(aligned_len) + ' bp)\n')
     res_file.write('\n')
     res_file.write('total genome size: ' + str(genome_size) + '\n\n')
@@ -14,7 +14,7 @@ import shutil
 
 from quast_libs import reporting, qconfig, qutils
 from quast_libs.ca_utils.misc import open_gzipsafe
-from quast_libs.fastaparser import read_fasta, write_fasta, rev_comp
+from quast_libs.fastaparser import FastaIndex, write_fasta, rev_comp
 from quast_libs.genemark import add_genes_to_fasta
 from quast_libs.genes_parser import Gene
 
@@ -63,38 +63,39 @@ def glimmerHMM(tool_dir, tool_exec_fpath, fasta_fpath, out_fpath, gene_lengths,
     # Note: why arabidopsis? for no particular reason, really.
     trained_dir = os.path.join(tool_dir, 'trained', 'arabidopsis')
 
-    contigs = {}
+    contigs = {}  # name used by GlimmerHMM -> name in FASTA
     gffs = []
     base_dir = tempfile.mkdtemp(dir=tmp_dir)
-    for seq_num, (ind, seq) in enumerate(read_fasta(fasta_fpath)):
-        seq_num = str(seq_num)
-        ind = ind[:qutils.MAX_CONTIG_NAME_GLIMMER]
-        contig_path = os.path.join(base_dir, seq_num + '.fasta')
-        gff_path = os.path.join(base_dir, seq_num + '.gff')
-
-        write_fasta(contig_path, [(ind, seq)])
-        if run(contig_path, gff_path) == 0:
-            gffs.append(gff_path)
-            contigs[ind] = seq
-
-    if not gffs:
-        return None, None, None, None, None, None
-
-    out_gff_fpath = out_fpath + '_genes.gff' + ('.gz' if not qconfig.no_gzip else '')
-    out_gff_path = merge_gffs(gffs, out_gff_fpath)
-    unique, total = set(), 0
-    genes = []
-    for contig, gene_id, start, end, strand in parse_gff(out_gff_path):
-        total += 1
-        if strand == '+':
-            gene_seq = contigs[contig][start - 1:end]
-        else:
-            gene_seq = rev_comp(contigs[contig][start - 1:end])
-        if gene_seq not in unique:
-            unique.add(gene_seq)
-        gene = Gene(contig=contig, start=start, end=end, strand=strand, seq=gene_seq)
-        gene.is_full = gene.start > 1 and gene.end < len(contigs[contig])
-        genes.append(gene)
+    with FastaIndex(fasta_fpath) as fasta_index:
+        for seq_num, name in enumerate(fasta_index.names()):
+            seq_num = str(seq_num)
+            ind = name[:qutils.MAX_CONTIG_NAME_GLIMMER]
+            contig_path = os.path.join(base_dir, seq_num + '.fasta')
+            gff_path = os.path.join(base_dir, seq_num + '.gff')
+
+            write_fasta(contig_path, [(ind, fasta_index.fetch(name))])
+            if run(contig_path, gff_path) == 0:
+                gffs.append(gff_path)
+                contigs[ind] = name
+
+        if not gffs:
+            return None, None, None, None, None, None
+
+        out_gff_fpath = out_fpath + '_genes.gff' + ('.gz' if not qconfig.no_gzip else '')
+        out_gff_path = merge_gffs(gffs, out_gff_fpath)
+        unique, total = set(), 0
+        genes = []
+        for contig, gene_id, start, end, strand in parse_gff(out_gff_path):
+            total += 1
+            if strand == '+':
+                gene_seq = fasta_index.fetch(contigs[contig], start - 1, end)
+            else:
+                gene_seq = rev_comp(fasta_index.fetch(contigs[contig], start - 1, end))
+            if gene_seq not in unique:
+                unique.add(gene_seq)
+            gene = Gene(contig=contig, start=start, end=end, strand=strand, seq=gene_seq)
+            gene.is_full = gene.start > 1 and gene.end < fasta_index.length(contigs[contig])
+            genes.append(gene)
 
     full_cnt = [sum([gene.end - gene.start >= threshold for gene in genes if gene.is_full]) for threshold in gene_lengths]
     partial_cnt = [sum([gene.end - gene.start >= threshold for gene in genes if not gene.is_full]) for threshold in gene_lengths]
@@ -132,50 +132,53 @@ def init(html_fpath, is_meta=False):
             f_html.write(html)
 
 
-def save_icarus_html(template_fpath, html_fpath, data_dict):
+def save_icarus_html(template_fpath, html_fpath, data_dict, icarus_dirpath):
     with open(template_fpath) as f: html = f.read()
     html = jsontemplate.expand(html, data_dict, more_formatters={
         'join': lambda v: ', '.join(v),
     })
 
-    html = _embed_css_and_scripts(html)
+    html = _link_css_and_scripts(html, html_fpath, icarus_dirpath)
     with open(html_fpath, 'w') as f_html:
         f_html.write(html)
 
 
-def _embed_css_and_scripts(html):
-    js_line_tmpl = '<script type="text/javascript" src="%s"></script>'
-    js_l_tag = '<script type="text/javascript" name="%s">'
-    js_r_tag = '    </script>'
+def _get_icarus_static_files():
+    for rel_fpath in icarus_js_files + icarus_css_files:
+        if exists(rel_fpath):
+            fpath = abspath(rel_fpath)
+            rel_fpath = basename(fpath)
+        else:
+            fpath = join(static_dirpath, join(*rel_fpath.split('/')))
+            if not exists(fpath):
+                continue
+        yield rel_fpath, fpath
+
 
+def copy_icarus_static_files(icarus_dirpath):
+    """
+        Copies CSS and JS files shared by all Icarus viewers into icarus_dirpath (only for portable HTML)
+    """
+    if not qconfig.portable_html:
+        return
+    for rel_fpath, fpath in _get_icarus_static_files():
+        out_fpath = join(icarus_dirpath, qconfig.icarus_static_dirname, join(*rel_fpath.split('/')))
+        if not os.path.isdir(os.path.dirname(out_fpath)):
+            os.makedirs(os.path.dirname(out_fpath))
+        shutil.copy(fpath, out_fpath)
+
+
+def _link_css_and_scripts(html, html_fpath, icarus_dirpath):
+    js_line_tmpl = '<script type="text/javascript" src="%s"></script>'
     css_line_tmpl = '<link rel="stylesheet" type="text/css" href="%s" />'
-    css_l_tag = '<style type="text/css" rel="stylesheet" name="%s">'
-    css_r_tag = '    </style>'
-
-    for line_tmpl, files, l_tag, r_tag in [
-            (js_line_tmpl, icarus_js_files, js_l_tag, js_r_tag),
-            (css_line_tmpl, icarus_css_files, css_l_tag, css_r_tag),
-        ]:
-        for rel_fpath in files:
-            if exists(rel_fpath):
-                fpath = abspath(rel_fpath)
-                rel_fpath = basename(fpath)
-            else:
-                fpath = join(static_dirpath, join(*rel_fpath.split('/')))
-                if not exists(fpath):
-                    continue
-
-            line = line_tmpl % rel_fpath
-            l_tag_formatted = l_tag % rel_fpath
-
-            if qconfig.portable_html:
-                with open(fpath) as f:
-                    contents = f.read()
-                    contents = '\n'.join(' ' * 8 + l for l in contents.split('\n'))
-                    html = html.replace(line, l_tag_formatted + '\n' + contents + '\n' + r_tag)
-            else:
-                line_formatted = line.replace(rel_fpath, fpath)
-                html = html.replace(line, line_formatted)
+
+    for rel_fpath, fpath in _get_icarus_static_files():
+        line_tmpl = js_line_tmpl if rel_fpath.endswith('.js') else css_line_tmpl
+        line = line_tmpl % rel_fpath
+        if qconfig.portable_html:  # the copy made by copy_icarus_static_files, so the results directory can be moved
+            fpath = join(icarus_dirpath, qconfig.icarus_static_dirname, join(*rel_fpath.split('/')))
+            fpath = qutils.relpath(fpath, os.path.dirname(html_fpath)).replace(os.sep, '/')
+        html = html.replace(line, line_tmpl % fpath)
 
     return html
 
@@ -274,13 +277,30 @@ def save_total_report(results_dirpath, min_contig, ref_fpath):
         log.info('  HTML version (interactive tables and plots) is saved to ' + os.path.join(results_dirpath, report_fname))
 
 
-def copy_meta_alignment_viewers(html_fpath, html_top_fpath):
-    with open(html_fpath, 'r') as template:
-        with open(html_top_fpath, 'w') as result:
-            for line in template:
-                if line.find('assemblies_links') != -1:  # change stdout links
-                    line = re.sub(r'../contigs_reports/', '../' + qconfig.combined_output_name + '/contigs_reports/', line)
-                result.write(line)
+def get_icarus_data_dirpath(html_fpath):
+    viewer_name = os.path.splitext(basename(html_fpath))[0]
+    return join(os.path.dirname(html_fpath), qconfig.icarus_data_dirname, viewer_name)
+
+
+def copy_icarus_viewer(html_fpath, html_top_fpath, fix_links=False):
+    data_dirpath = get_icarus_data_dirpath(html_fpath)
+    data_top_dirpath = get_icarus_data_dirpath(html_top_fpath)
+    if os.path.isdir(data_top_dirpath):
+        shutil.rmtree(data_top_dirpath)
+    os.makedirs(data_top_dirpath)
+    fpaths = [(html_fpath, html_top_fpath)]
+    if os.path.isdir(data_dirpath):
+        fpaths += [(join(data_dirpath, fname), join(data_top_dirpath, fname)) for fname in os.listdir(data_dirpath)]
+    for fpath, top_fpath in fpaths:
+        if not fix_links:
+            shutil.copy(fpath, top_fpath)
+            continue
+        with open(fpath, 'r') as template:
+            with open(top_fpath, 'w') as result:
+                for line in template:
+                    if line.find('assemblies_links') != -1:  # change stdout links
+                        line = re.sub(r'../contigs_reports/', '../' + qconfig.combined_output_name + '/contigs_reports/', line)
+                    result.write(line)
 
 
 def create_meta_icarus(results_dirpath, ref_names):
@@ -293,7 +313,8 @@ def create_meta_icarus(results_dirpath, ref_names):
     icarus_links["links_names"].append(qconfig.icarus_link)
     contig_size_fpath = os.path.join(combined_ref_icarus_dirpath, qconfig.contig_size_viewer_fname)
     contig_size_top_fpath = os.path.join(icarus_dirpath, qconfig.contig_size_viewer_fname)
-    shutil.copy(contig_size_fpath, contig_size_top_fpath)
+    copy_icarus_viewer(contig_size_fpath, contig_size_top_fpath)
+    copy_icarus_static_files(icarus_dirpath)
     for index, ref in enumerate(ref_names):
         html_name = trim_ref_name(ref)
         if len(ref_names) == 1:
@@ -302,7 +323,7 @@ def create_meta_icarus(results_dirpath, ref_names):
                 html_name = qconfig.one_alignment_viewer_name
         icarus_ref_fpath = os.path.join(combined_ref_icarus_dirpath, html_name + '.html')
         icarus_top_ref_fpath = os.path.join(icarus_dirpath, html_name + '.html')
-        copy_meta_alignment_viewers(icarus_ref_fpath, icarus_top_ref_fpath)
+        copy_icarus_viewer(icarus_ref_fpath, icarus_top_ref_fpath, fix_links=True)
     icarus_menu_fpath = os.path.join(results_dirpath, qconfig.combined_output_name, qconfig.icarus_html_fname)
     icarus_menu_top_fpath = os.path.join(results_dirpath, qconfig.icarus_html_fname)
     with open(icarus_menu_fpath, 'r') as template:
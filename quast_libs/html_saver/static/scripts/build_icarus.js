@@ -30,6 +30,10 @@ THE SOFTWARE.
      * Allow library to be used within both the browser and node.js
      */
     var genePrediction = false;
+    if (typeof icarus_tiles !== 'undefined') {  // the overview tiles are loaded by the script tags
+        for (var tileName in icarus_tiles)
+            addTileData(tileName);
+    }
     var ContigData = function(chromosome) {
         return parseData(contig_data[chromosome]);
     };
@@ -489,7 +493,7 @@ THE SOFTWARE.
     getCoordsFromURL();
 
     function parseData (data) {
-        chart = { assemblies: {} };
+        var chart = { assemblies: {} };
 
         for (var assembly in data) {
             var alignments = data[assembly];
@@ -502,6 +506,19 @@ THE SOFTWARE.
         return collapseLanes(chart);
     }
 
+    function addItems(alignments) {
+        // alignments of the tiles loaded after start
+        var data = {};
+        for (var assembly in contig_data[chromosome])  // all assemblies are kept to have the same lane ids
+            data[assembly] = alignments[assembly] || [];
+        var newItems = parseData(data).items;
+        getMiniItems(newItems);  // sets classes of the items
+        for (var i = 0; i < newItems.length; i++)
+            items.push(newItems[i]);
+        if ($('input[name=misassemblies_select]:not(:checked)').length > 0)
+            showMisassemblies();
+    }
+
     function getBreakpointLines() {
         var lines = [];
         var prevPos = 0;
@@ -574,8 +591,8 @@ THE SOFTWARE.
         function parseItem(block, fullInfo, misassembly) {
             block.misassembledEnds = '';
             block.lane = laneId;
-            block.id = itemId;
-            block.groupId = groupId;
+            block.id = block.uid !== undefined ? block.uid * 3 : itemId;  // uid is unique among all tiles
+            block.groupId = block.uid !== undefined ? block.uid : groupId;
             block.assembly = assemblyName;
             if (isContigSizePlot) {
                 if (!fullInfo) {
@@ -596,29 +613,8 @@ THE SOFTWARE.
                     block.mstype = misassembly ? misassembly.mstype : null;
                 }
             }
-            var nonOverlappingLaneId = 0;
-            var blockSize = block.corr_end - block.corr_start;
-            var minOverlap = Math.min(500, blockSize * 0.1);
-            if (!isContigSizePlot) {
-                for (var nonOverlappingLaneId = 0; nonOverlappingLaneId < lastPosInLanes.length; nonOverlappingLaneId++){
-                    if (lastPosInLanes[nonOverlappingLaneId] - block.corr_start < Math.min(minOverlap, lastBlockSizesInLanes[nonOverlappingLaneId] * 0.1))
-                        break;
-                }
-                block.nonOverlappingLane = nonOverlappingLaneId;
-                if (nonOverlappingLaneId >= lastPosInLanes.length) {
-                    lastPosInLanes.push(block.corr_end);
-                    lastBlockSizesInLanes.push(blockSize);
-                }
-                else {
-                    if (block.corr_end > lastPosInLanes[nonOverlappingLaneId]) {
-                        lastPosInLanes[nonOverlappingLaneId] = block.corr_end;
-                        lastBlockSizesInLanes[nonOverlappingLaneId] = blockSize;
-                    }
-                    else {
-                        lastPosInLanes[nonOverlappingLaneId] = lastPosInLanes[nonOverlappingLaneId];
-                    }
-                }
-            }
+            if (!isContigSizePlot)  // lines are computed for all alignments in advance, only a part of them is loaded
+                block.nonOverlappingLane = assemblies_lines[assemblyName] - block.line - 1;
             block.triangles = Array();
             itemId++;
             numItems++;
@@ -648,10 +644,10 @@ THE SOFTWARE.
                     triangleItem.corr_start = block.corr_start;
                     triangleItem.corr_end = block.corr_end;
                     triangleItem.assembly = block.assembly;
-                    triangleItem.id = itemId;
+                    triangleItem.id = block.uid !== undefined ? block.uid * 3 + 1 + num : itemId;
                     triangleItem.lane = laneId;
                     triangleItem.nonOverlappingLane = block.nonOverlappingLane;
-                    triangleItem.groupId = groupId;
+                    triangleItem.groupId = block.groupId;
                     triangleItem.misassembledEnds = misassembled_ends[num];
                     triangleItem.misassemblies = block.misassemblies.split(';')[num];
                     block.triangles.push(triangleItem);
@@ -666,8 +662,6 @@ THE SOFTWARE.
             var lane = chart.assemblies[assemblyName];
             var currentLen = 0;
             var numItems = 0;
-            var lastPosInLanes = [];
-            var lastBlockSizesInLanes = [];
             var laneItems = [];
             for (var i = 0; i < lane.length; i++) {
                 var block = lane[i];
@@ -694,28 +688,13 @@ THE SOFTWARE.
                 laneItems.push(newItem);
                 groupId++;
             }
-            for (var i = 0; i < laneItems.length; i++) {
-                item = laneItems[i];
-                if (!isContigSizePlot) {
-                    item.nonOverlappingLane = lastPosInLanes.length - item.nonOverlappingLane - 1;
-                    if (item.triangles) {
-                        for (var j = 0; j < item.triangles.length; j++) {
-                            item.triangles[j].nonOverlappingLane = lastPosInLanes.length - item.triangles[j].nonOverlappingLane - 1;
-                        }
-                    }
-                    if (item.genes) {
-                        for (var j = 0; j < item.genes.length; j++) {
-                            item.genes[j].nonOverlappingLane = lastPosInLanes.length - item.genes[j].nonOverlappingLane - 1;
-                        }
-                    }
-                }
-                items.push(item);
-            }
+            for (var i = 0; i < laneItems.length; i++)
+                items.push(laneItems[i]);
 
             lanes.push({
                 id: laneId,
                 label: assemblyName,
-                maxLines: lastPosInLanes.length,
+                maxLines: isContigSizePlot ? 0 : assemblies_lines[assemblyName],
                 isExpanded: false,
             });
             laneId++;
@@ -128,6 +128,7 @@ function display() {
     // upd coverage
     if (drawCoverage && (!coverageMainHidden || !physicalCoverageHidden))
         updateMainCoverage(minExtent, maxExtent);
+    loadVisibleTiles();
 }
 
 function createItems(visData, itemFigure, minExtent, maxExtent, class_) {
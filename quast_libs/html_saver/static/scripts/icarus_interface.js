@@ -269,6 +269,15 @@ function setupAutocompleteSearch(){
             maxHeight: 200,
             deferRequestBy: 50,
             source: function(request, response) {
+                if (typeof tiles_levels !== 'undefined' && !icarus_tiles.search) {
+                    // alignments for search are loaded only when it is used
+                    var autocomplete = this;
+                    loadDataScript('search', function() {
+                        autocompleteItems = createAutocompleteListItems();
+                        autocomplete.options.source(request, response);
+                    });
+                    return;
+                }
                 var results = $.ui.autocomplete.filter(autocompleteItems, request.term);
                 var additionalLabel = '';
                 if (results.length == 0) additionalLabel = 'No result';
@@ -300,6 +309,13 @@ function setupAutocompleteSearch(){
                     showArrows(selectedItem);
                     changeInfo(selectedItem);
                 }
+                else if (itemType == 'alignment') {
+                    var alignment = icarus_tiles.search[itemValue];
+                    var selectedItem = {corr_start: alignment[4], corr_end: alignment[5]};
+                    selectLoadedItem(function (item) {
+                        return item.uid == alignment[6];
+                    }, alignment[4]);
+                }
                 else if (itemType == 'gene') {
                     var selectedItem = featuresData.features[itemValue];
                 }
@@ -324,25 +340,39 @@ function setupAutocompleteSearch(){
 
 function createAutocompleteListItems() {
     var autocompleteItems = [];
-    for (var i = 0; i < items.length; i++) {
-        if (isContigSizePlot && !items[i].fullContig)
-            continue;
-        var position = [formatValue(items[i].start, mainTickValue), ndash, formatValue(items[i].end, mainTickValue), mainTickValue, ' '].join(' ');
-        var description = '<span style="color:gray"> ' + items[i].assembly + ': </span>' + items[i].name;
-        if (isContigSizePlot){
-            var size = items[i].size;
-            var tickValue = getTickValue(size);
-            size = formatValue(size, tickValue);
-            description +=  ' ' + size + ' ' + tickValue;
+    if (typeof tiles_levels !== 'undefined') {
+        // [name, assembly index, start, end, corr_start, corr_end, uid] of all alignments, not only loaded ones
+        var alignments = icarus_tiles.search || [];
+        for (var i = 0; i < alignments.length; i++) {
+            var position = [formatValue(alignments[i][2], mainTickValue), ndash, formatValue(alignments[i][3], mainTickValue), mainTickValue, ' '].join(' ');
+            autocompleteItems.push({
+                label: alignments[i][0],
+                value: 'alignment,' + i,
+                desc: '<span style="color:gray"> ' + lanes[alignments[i][1]].label + ': </span>' + alignments[i][0] + ' ' + position
+            })
         }
-        else {
-            description +=  ' ' + position;
+    }
+    else {
+        for (var i = 0; i < items.length; i++) {
+            if (isContigSizePlot && !items[i].fullContig)
+                continue;
+            var position = [formatValue(items[i].start, mainTickValue), ndash, formatValue(items[i].end, mainTickValue), mainTickValue, ' '].join(' ');
+            var description = '<span style="color:gray"> ' + items[i].assembly + ': </span>' + items[i].name;
+            if (isContigSizePlot){
+                var size = items[i].size;
+                var tickValue = getTickValue(size);
+                size = formatValue(size, tickValue);
+                description +=  ' ' + size + ' ' + tickValue;
+            }
+            else {
+                description +=  ' ' + position;
+            }
+            autocompleteItems.push({
+                label: items[i].name,
+                value: 'contig,' + i,
+                desc: description
+            })
         }
-        autocompleteItems.push({
-            label: items[i].name,
-            value: 'contig,' + i,
-            desc: description
-        })
     }
     if (featuresData) {
         for (var i = 0; i < featuresData.features.length; i++) {
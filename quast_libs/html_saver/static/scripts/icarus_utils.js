@@ -2,6 +2,8 @@ var totalMaxYMain;
 var totalMaxYMini;
 var minCoverage = 10;
 var expandedLanes = [];
+var loadedTiles = {}, loadingTiles = {}, loadedAlignments = {};
+var tilesTimer, itemToSelect;
 
 function getBlockStructure(block) {
     if (typeof(contig_structures) !== 'undefined') {
@@ -25,6 +27,108 @@ function getBlockChrom(block) {
     else return block.chr;
 }
 
+function addTileData(tileName) {
+    // adds alignments and contig structures of a loaded tile, returns the alignments which were not loaded before
+    var tile = icarus_tiles[tileName];
+    var newAlignments = {};
+    for (var assembly in tile.alignments) {
+        newAlignments[assembly] = [];
+        for (var i = 0; i < tile.alignments[assembly].length; i++) {
+            var alignment = tile.alignments[assembly][i];
+            if (loadedAlignments[alignment.uid]) continue;  // long alignments are saved in tiles of several levels
+            loadedAlignments[alignment.uid] = true;
+            contig_data[chromosome][assembly].push(alignment);
+            newAlignments[assembly].push(alignment);
+        }
+    }
+    for (var assembly in tile.structures) {
+        for (var contig in tile.structures[assembly])
+            if (!contig_structures[assembly][contig])
+                contig_structures[assembly][contig] = tile.structures[assembly][contig];
+    }
+    loadedTiles[tileName] = true;
+    delete icarus_tiles[tileName];
+    return newAlignments;
+}
+
+function loadDataScript(fname, onLoad) {
+    // data files are loaded by script tags, so it works also for viewers opened from file://
+    if (loadingTiles[fname]) return;
+    loadingTiles[fname] = true;
+    var script = document.createElement('script');
+    script.type = 'text/javascript';
+    script.src = tiles_dirpath + '/' + fname + '.js';
+    script.onload = function () {
+        delete loadingTiles[fname];
+        document.body.removeChild(script);
+        onLoad();
+    };
+    script.onerror = function () {
+        delete loadingTiles[fname];
+        document.body.removeChild(script);
+    };
+    document.body.appendChild(script);
+}
+
+function loadTiles(tileNames) {
+    for (var i = 0; i < tileNames.length; i++) {
+        if (loadedTiles[tileNames[i]]) continue;
+        (function (tileName) {
+            loadDataScript(tileName, function () {
+                addItems(addTileData(tileName));
+                if (itemToSelect) selectLoadedItem(itemToSelect);
+                display();
+            });
+        })(tileNames[i]);
+    }
+}
+
+function getVisibleTiles(minExtent, maxExtent) {
+    // the least detailed level which has all alignments at least a pixel wide
+    var bpPerPixel = (maxExtent - minExtent) / chartWidth;
+    var level = 0;
+    for (var i = 0; i < tiles_levels.length; i++) {
+        if (tiles_levels[i].min_len <= bpPerPixel) level = i;
+    }
+    var tileNames = [];
+    var levelTiles = tiles_levels[level].tiles;
+    for (var tileIdx in levelTiles) {
+        if (tileIdx * tiles_levels[level].window < maxExtent && levelTiles[tileIdx] > minExtent)
+            tileNames.push('tile_' + level + '_' + tileIdx);
+    }
+    return tileNames;
+}
+
+function loadVisibleTiles() {
+    // tiles are loaded when the visible window stops changing, not on each step of dragging or animation
+    if (typeof tiles_levels === 'undefined') return;
+    clearTimeout(tilesTimer);
+    tilesTimer = setTimeout(function () {
+        var minExtent = Math.max(brush.extent()[0], x_mini.domain()[0]),
+            maxExtent = Math.min(brush.extent()[1], x_mini.domain()[1]);
+        loadTiles(getVisibleTiles(minExtent, maxExtent));
+    }, 200);
+}
+
+function selectLoadedItem(isItemToSelect, pos) {
+    // selects the item at once if it is loaded, or when a tile with it is loaded
+    for (var i = 0; i < items.length; i++) {
+        if (isItemToSelect(items[i])) {
+            itemToSelect = null;
+            selected_id = items[i].groupId;
+            showArrows(items[i]);
+            changeInfo(items[i]);
+            display();
+            return;
+        }
+    }
+    itemToSelect = isItemToSelect;
+    if (typeof tiles_levels !== 'undefined' && pos !== undefined) {
+        var tileIdx = Math.floor(pos / tiles_levels[0].window);
+        if (tiles_levels[0].tiles[tileIdx]) loadTiles(['tile_0_' + tileIdx]);
+    }
+}
+
 function getItemStart(block, minExtent) {
     return x_main(Math.max(minExtent, block.corr_start));
 }
@@ -371,16 +475,10 @@ function appendBlock(whereAppendBlock, numBlock, curBlock, selectedBlock, prevBl
                 if (prevBlock && prevBlock.start > curBlock.corr_start) point = curBlock.corr_end;
                 else if (prevBlock) point = curBlock.corr_start;
                 setCoords([point - brushSize / 2, point + brushSize / 2], true);
-                for (var i = 0; i < items.length; i++) {
-                    if (items[i].assembly == assembly && items[i].name == selectedBlock.contig &&
-                        items[i].corr_start == curBlock.corr_start && items[i].corr_end == curBlock.corr_end) {
-                        selected_id = items[i].groupId;
-                        showArrows(items[i]);
-                        changeInfo(items[i]);
-                        display();
-                        break;
-                    }
-                }
+                selectLoadedItem(function (item) {
+                    return item.assembly == assembly && item.name == selectedBlock.contig &&
+                        item.corr_start == curBlock.corr_start && item.corr_end == curBlock.corr_end;
+                }, curBlock.corr_start);
                 d3.event.stopPropagation();
             });
     if (!isContigSizePlot && prevBlock) {
@@ -738,16 +836,10 @@ function getCoordsFromURL() {
     if (params && params.assembly && params.contig && params.start && params.end) {
         var delta = 1000;
         setCoords([parseInt(params.start) - delta, parseInt(params.end) + delta]);
-        for (var i = 0; i < items.length; i++) {
-            if (items[i].assembly == params.assembly && items[i].name == params.contig &&
-                items[i].corr_start == params.start && items[i].corr_end == params.end) {
-                selected_id = items[i].groupId;
-                showArrows(items[i]);
-                changeInfo(items[i]);
-                display();
-                break;
-            }
-        }
+        selectLoadedItem(function (item) {
+            return item.assembly == params.assembly && item.name == params.contig &&
+                item.corr_start == params.start && item.corr_end == params.end;
+        }, parseInt(params.start));
     }
     return params;
 }
@@ -158,6 +158,7 @@ def js_data_gen(assemblies, contigs_fpaths, chromosomes_length, output_dirpath,
     output_all_files_dir_path = os.path.join(output_dirpath, qconfig.icarus_dirname)
     if not os.path.exists(output_all_files_dir_path):
         os.mkdir(output_all_files_dir_path)
+    html_saver.copy_icarus_static_files(output_all_files_dir_path)
 
     chr_full_names, contig_names_by_refs = group_references(chr_names, contig_names_by_refs, chromosomes_length, ref_fpath)
 
@@ -210,15 +211,17 @@ def js_data_gen(assemblies, contigs_fpaths, chromosomes_length, output_dirpath,
             if physical_cov_data else None
         gc_data_str = format_cov_data(chr, gc_data, 'gc_data', 100, 'max_gc') if gc_data else None
 
-        alignment_viewer_fpath, ref_data_str, contigs_structure_str, additional_assemblies_data, ms_selectors, num_misassemblies[chr], aligned_assemblies[chr] = \
+        alignment_viewer_fpath, ref_data_str, data_fnames, tiles_fnames, additional_assemblies_data, ms_selectors, \
+            num_misassemblies[chr], aligned_assemblies[chr] = \
             prepare_alignment_data_for_one_ref(chr, chr_full_names, chr_names_by_id, ref_contigs, data_str, chr_to_aligned_blocks, structures_by_labels,
                                                contigs_by_assemblies, ambiguity_alignments_by_labels=ambiguity_alignments_by_labels,
                                                cov_data_str=cov_data_str, physical_cov_data_str=physical_cov_data_str, gc_data_str=gc_data_str,
-                                               contig_names_by_refs=contig_names_by_refs, output_dir_path=output_all_files_dir_path)
+                                               contig_names_by_refs=contig_names_by_refs, output_dir_path=output_all_files_dir_path,
+                                               chr_size=chr_size)
         ref_name = qutils.name_from_fpath(ref_fpath)
-        save_alignment_data_for_one_ref(chr, ref_contigs, ref_name, json_output_dir, alignment_viewer_fpath, ref_data_str, ms_selectors,
-                                        ref_data=ref_data, features_data=features_data, assemblies_data=assemblies_data,
-                                        contigs_structure_str=contigs_structure_str, additional_assemblies_data=additional_assemblies_data)
+        save_alignment_data_for_one_ref(chr, ref_contigs, ref_name, json_output_dir, alignment_viewer_fpath, ref_data_str, data_fnames, tiles_fnames,
+                                        ms_selectors, ref_data=ref_data, features_data=features_data, assemblies_data=assemblies_data,
+                                        additional_assemblies_data=additional_assemblies_data)
 
     contigs_sizes_str, too_many_contigs = get_contigs_data(contigs_by_assemblies, nx_marks, assemblies_n50, structures_by_labels,
                                                            contig_names_by_refs, chr_names, chr_full_names)
@@ -281,7 +284,7 @@ def js_data_gen(assemblies, contigs_fpaths, chromosomes_length, output_dirpath,
             icarus_links["links"].append(chr_link)
             icarus_links["links_names"].append(qconfig.icarus_link)
             html_saver.save_icarus_data(json_output_dir, main_data_dict['one_reference'], 'menu_reference', as_text=False)
-    html_saver.save_icarus_html(main_menu_template_fpath, main_menu_fpath, main_data_dict)
+    html_saver.save_icarus_html(main_menu_template_fpath, main_menu_fpath, main_data_dict, output_all_files_dir_path)
     html_saver.save_icarus_links(output_dirpath, icarus_links)
 
     return main_menu_fpath
\ No newline at end of file
@@ -6,7 +6,9 @@
 # All Rights Reserved
 # See file LICENSE for details.
 ############################################################################
-from os.path import join
+import os
+import shutil
+from os.path import join, dirname
 from collections import defaultdict
 try:
    from collections import OrderedDict
@@ -18,6 +20,110 @@ from quast_libs.html_saver import html_saver
 from quast_libs.icarus_utils import Alignment, get_html_name, format_long_numbers, get_misassembly_for_alignment, parse_misassembly_info
 
 
+def init_data_dir(viewer_fpath):
+    """
+        Data of a viewer is saved into JS files in a separate directory instead of the HTML itself.
+        The viewer loads the main files by script tags in the given order (see get_data_scripts),
+        alignment viewers load the other files (tiles) by the same way only when they are needed
+    """
+    data_dirpath = html_saver.get_icarus_data_dirpath(viewer_fpath)
+    if os.path.isdir(data_dirpath):
+        shutil.rmtree(data_dirpath)
+    os.makedirs(data_dirpath)
+    return data_dirpath
+
+
+def save_data_file(data_dirpath, fname, text):
+    with open(join(data_dirpath, fname), 'w') as f:
+        f.write(text)
+    return fname
+
+
+def read_data_files(data_dirpath, data_fnames):
+    data = []
+    for fname in data_fnames:
+        with open(join(data_dirpath, fname)) as f:
+            data.append(f.read())
+    return '\n'.join(data)
+
+
+def get_data_link(viewer_fpath):
+    return qutils.relpath(html_saver.get_icarus_data_dirpath(viewer_fpath), dirname(viewer_fpath)).replace(os.sep, '/')
+
+
+def get_data_scripts(viewer_fpath, data_fnames):
+    data_dirpath = get_data_link(viewer_fpath)
+    return '\n'.join('<script type="text/javascript" src="' + data_dirpath + '/' + fname + '"></script>' for fname in data_fnames)
+
+
+def get_tiles_levels(chr_size):
+    """
+        Returns (min alignment length, window size) for each level of alignment tiles, from the most detailed one
+        (all alignments) to the overview one (a single tile loaded at start).
+        A level is used when a pixel of the chart covers at least its min alignment length, so no alignment
+        visible at this zoom is missed, and shorter alignments are not loaded.
+    """
+    if chr_size <= qconfig.icarus_tile_window:
+        return [(0, chr_size + 1)]
+    overview_min_len = chr_size // qconfig.icarus_max_chart_width
+    levels = []
+    window = qconfig.icarus_tile_window
+    min_len = 0
+    while min_len < overview_min_len:
+        levels.append((min_len, window))
+        window *= qconfig.icarus_zoom_factor
+        min_len = window // qconfig.icarus_max_chart_width
+    levels.append((overview_min_len, chr_size + 1))
+    return levels
+
+
+def get_tile_name(level, tile_idx):
+    return 'tile_%d_%d' % (level, tile_idx)
+
+
+def save_tiles(data_dirpath, tiles, contigs_structures):
+    """
+        Saves tiles as JS files adding their alignments and contig structures to icarus_tiles
+        (JSONP-style, so the viewer can load them by script tags also from file://)
+    """
+    tiles_index = []
+    tiles_fnames = []
+    for level, level_tiles in enumerate(tiles):
+        tiles_index.append(dict())
+        for tile_idx, tile in sorted(level_tiles.items()):
+            tile_name = get_tile_name(level, tile_idx)
+            tile_str = ['icarus_tiles["' + tile_name + '"] = {alignments: {']
+            tile_str.append(',\n'.join('"' + assembly + '": [\n' + ',\n'.join(alignments_str) + ']'
+                                       for assembly, alignments_str in tile['alignments'].items()))
+            tile_str.append('},\nstructures: {')
+            tile_str.append(',\n'.join('"' + assembly + '": {' + ',\n'.join('"' + contig + '": ' + contigs_structures[assembly][contig]
+                                                                          for contig in contigs) + '}'
+                                       for assembly, contigs in tile['contigs'].items()))
+            tile_str.append('}};')
+            tiles_fnames.append(save_data_file(data_dirpath, tile_name + '.js', '\n'.join(tile_str)))
+            tiles_index[-1][tile_idx] = tile['max_end']
+    return tiles_index, tiles_fnames
+
+
+def get_alignment_line(alignment, lines_ends, lines_sizes):
+    """
+        Lines of an expanded lane, the alignment is placed to the first line in which it does not overlap the previous
+        alignments (too much). The line numbers are computed here, because the viewer loads only a part of alignments.
+    """
+    size = alignment.end - alignment.start
+    min_overlap = min(500, size * 0.1)
+    line = 0
+    while line < len(lines_ends) and lines_ends[line] - alignment.start >= min(min_overlap, lines_sizes[line] * 0.1):
+        line += 1
+    if line == len(lines_ends):
+        lines_ends.append(alignment.end)
+        lines_sizes.append(size)
+    elif alignment.end > lines_ends[line]:
+        lines_ends[line] = alignment.end
+        lines_sizes[line] = size
+    return line
+
+
 def get_assemblies_data(contigs_fpaths, icarus_dirpath, stdout_pattern, nx_marks):
     assemblies_n50 = defaultdict(dict)
     assemblies_data = ''
@@ -26,6 +132,7 @@ def get_assemblies_data(contigs_fpaths, icarus_dirpath, stdout_pattern, nx_marks
     assemblies_data += 'var assemblies_contigs = {};\n'
     assemblies_data += 'var assemblies_misassemblies = {};\n'
     assemblies_data += 'var assemblies_n50 = {};\n'
+    assemblies_data += 'var assemblies_lines = {};\n'
     assemblies_contig_size_data = ''
     for contigs_fpath in contigs_fpaths:
         assembly_label = qutils.label_from_fpath(contigs_fpath)
@@ -74,30 +181,25 @@ def add_contig_structure_data(data_str, structure, ref_contigs, chr_full_names,
 
 def get_contigs_structure(assemblies_contigs, chr_to_aligned_blocks, contigs_by_assemblies, ref_contigs, chr_full_names,
                           contig_names_by_refs, structures_by_labels, used_chromosomes, links_to_chromosomes, chr_names_by_id):
-    contigs_data_str = []
-    contigs_data_str.append('var contig_lengths = {};')
-    contigs_data_str.append('var contig_structures = {};')
+    contigs_structures = dict()
     for assembly in chr_to_aligned_blocks.keys():
-        contigs_data_str.append('contig_lengths["' + assembly + '"] = {};')
-        contigs_data_str.append('contig_structures["' + assembly + '"] = {};')
+        contigs_structures[assembly] = dict()
         used_contigs = assemblies_contigs[assembly]
         for contig in contigs_by_assemblies[assembly]:
             if contig.name not in used_contigs:
                 continue
-            contigs_data_str.append('contig_lengths["' + assembly + '"]["' + contig.name + '"] = ' + str(contig.size) + ';')
-            data_str = ['contig_structures["' + assembly + '"]["' + contig.name + '"] = [ ']
+            data_str = ['[ ']
             contig_structure = structures_by_labels[assembly][contig.name]
             data_str = add_contig_structure_data(data_str, contig_structure, ref_contigs, chr_full_names,
                                                  contig_names_by_refs, used_chromosomes, links_to_chromosomes, chr_names_by_id)
-            data_str.append('];')
-            contigs_data_str.extend(data_str)
-    contigs_data_str = '\n'.join(contigs_data_str)
-    return contigs_data_str
+            data_str.append(']')
+            contigs_structures[assembly][contig.name] = '\n'.join(data_str)
+    return contigs_structures
 
 
 def prepare_alignment_data_for_one_ref(chr, chr_full_names, chr_names_by_id, ref_contigs, data_str, chr_to_aligned_blocks,
                                        structures_by_labels, contigs_by_assemblies, ambiguity_alignments_by_labels=None,
-                                       contig_names_by_refs=None, output_dir_path=None,
+                                       contig_names_by_refs=None, output_dir_path=None, chr_size=0,
                                        cov_data_str=None, physical_cov_data_str=None, gc_data_str=None):
     html_name = get_html_name(chr, chr_full_names)
     alignment_viewer_fpath = join(output_dir_path, html_name + '.html')
@@ -116,11 +218,21 @@ def prepare_alignment_data_for_one_ref(chr, chr_full_names, chr_names_by_id, ref
     # adding assembly data
     data_str.append('var contig_data = {};')
     data_str.append('contig_data["' + chr + '"] = {};')
+    data_str.append('var contig_structures = {};')
+    data_str.append('var icarus_tiles = {};')
     assemblies_len = defaultdict(int)
     assemblies_contigs = defaultdict(set)
     ms_types = dict()
-    for assembly in chr_to_aligned_blocks.keys():
-        data_str.append('contig_data["' + chr + '"]["' + assembly + '"] = [ ')
+    data_dirpath = init_data_dir(alignment_viewer_fpath)
+    # alignments are split into tiles by windows of the reference, each level keeps alignments longer than its min length
+    tiles_levels = get_tiles_levels(chr_size)
+    tiles = [defaultdict(lambda: {'alignments': OrderedDict(), 'contigs': OrderedDict(), 'max_end': 0}) for _ in tiles_levels]
+    search_str = []
+    uid = 0
+    for assembly_idx, assembly in enumerate(chr_to_aligned_blocks.keys()):
+        data_str.append('contig_data["' + chr + '"]["' + assembly + '"] = [];')
+        data_str.append('contig_structures["' + assembly + '"] = {};')
+        lines_ends, lines_sizes = [], []
         ms_types[assembly] = defaultdict(int)
         contigs = dict((contig.name, contig) for contig in contigs_by_assemblies[assembly])
         for num_contig, ref_contig in enumerate(ref_contigs):
@@ -179,34 +291,46 @@ def prepare_alignment_data_for_one_ref(chr, chr_full_names, chr_names_by_id, ref
                             gene_info = '{start:' + str(gene.start) + ',end:' + str(gene.end) + ',corr_start:' + \
                                         str(corr_start) + ',corr_end:' + str(corr_end) + '}'
                             genes.append(gene_info)
-                    data_str.append('{name:"' + alignment.name + '",corr_start:' + str(alignment.start) + ',corr_end:' +
-                                    str(alignment.end) + ',start:' + str(alignment.unshifted_start) + ',end:' +
-                                    str(alignment.unshifted_end) + ',misassemblies:"' + alignment.misassemblies + '",mis_ends:"' + misassembled_ends + '"')
+                    line = get_alignment_line(alignment, lines_ends, lines_sizes)
+                    alignment_str = ['{name:"' + alignment.name + '",uid:' + str(uid) + ',line:' + str(line) +
+                                     ',corr_start:' + str(alignment.start) + ',corr_end:' +
+                                     str(alignment.end) + ',start:' + str(alignment.unshifted_start) + ',end:' +
+                                     str(alignment.unshifted_end) + ',misassemblies:"' + alignment.misassemblies + '",mis_ends:"' + misassembled_ends + '"']
                     if alignment.similar:
-                        data_str[-1] += ',similar:"True"'
+                        alignment_str[-1] += ',similar:"True"'
                     if alignment.ambiguous:
-                        data_str[-1] += ',ambiguous:"True"'
+                        alignment_str[-1] += ',ambiguous:"True"'
                     if alignment.is_best_set:
-                        data_str[-1] += ',is_best:"True"'
+                        alignment_str[-1] += ',is_best:"True"'
                     if contig_more_unaligned:
-                        data_str[-1] += ',more_unaligned:"True"'
+                        alignment_str[-1] += ',more_unaligned:"True"'
 
                     aligned_assemblies.add(alignment.label)
                     if overlapped_contigs[alignment]:
-                        data_str.append(',overlaps:[ ')
-                        data_str.append(','.join(overlapped_contigs[alignment]))
-                        data_str.append(']')
+                        alignment_str.append(',overlaps:[ ')
+                        alignment_str.append(','.join(overlapped_contigs[alignment]))
+                        alignment_str.append(']')
                     if qconfig.gene_finding:
-                        data_str.append(',genes:[' + ','.join(genes) + ']')
+                        alignment_str.append(',genes:[' + ','.join(genes) + ']')
                     if ambiguity_alignments_by_labels and qconfig.ambiguity_usage == 'all':
-                        data_str.append(',ambiguous_alignments:[ ')
-                        data_str = add_contig_structure_data(data_str, ambiguity_alignments_by_labels[alignment.label][alignment.name],
-                                                             ref_contigs, chr_full_names, contig_names_by_refs,
-                                                             used_chromosomes, links_to_chromosomes, chr_names_by_id)
-                        data_str[-1] = data_str[-1][:-1] + '],'
-                    data_str[-1] = data_str[-1] + '},'
-
-        data_str[-1] = data_str[-1][:-1] + '];'
+                        alignment_str.append(',ambiguous_alignments:[ ')
+                        alignment_str = add_contig_structure_data(alignment_str, ambiguity_alignments_by_labels[alignment.label][alignment.name],
+                                                                  ref_contigs, chr_full_names, contig_names_by_refs,
+                                                                  used_chromosomes, links_to_chromosomes, chr_names_by_id)
+                        alignment_str[-1] = alignment_str[-1][:-1] + '],'
+                    alignment_str[-1] = alignment_str[-1] + '}'
+                    alignment_str = ''.join(alignment_str)
+                    # misassembled alignments are kept in the overview for misassemblies arrows
+                    for level, (min_len, window) in enumerate(tiles_levels):
+                        if alignment.end - alignment.start >= min_len or \
+                                (alignment.misassembled and level == len(tiles_levels) - 1):
+                            tile = tiles[level][alignment.start // window]
+                            tile['alignments'].setdefault(assembly, []).append(alignment_str)
+                            tile['contigs'].setdefault(assembly, OrderedDict())[alignment.name] = True
+                            tile['max_end'] = max(tile['max_end'], alignment.end)
+                    search_str.append('["' + alignment.name + '",' + str(assembly_idx) + ',' + str(alignment.unshifted_start) + ',' +
+                                      str(alignment.unshifted_end) + ',' + str(alignment.start) + ',' + str(alignment.end) + ',' + str(uid) + ']')
+                    uid += 1
         assembly_len = assemblies_len[assembly]
         assembly_contigs = len(assemblies_contigs[assembly])
         local_misassemblies = ms_types[assembly]['local'] // 2
@@ -216,6 +340,7 @@ def prepare_alignment_data_for_one_ref(chr, chr_full_names, chr_names_by_id, ref
         additional_assemblies_data += 'assemblies_contigs["' + assembly + '"] = ' + str(assembly_contigs) + ';\n'
         additional_assemblies_data += 'assemblies_misassemblies["' + assembly + '"] = "' + str(ext_misassemblies) + '+' + \
                                       str(local_misassemblies) + '";\n'
+        additional_assemblies_data += 'assemblies_lines["' + assembly + '"] = ' + str(len(lines_ends)) + ';\n'
 
     if cov_data_str:
         # adding coverage data
@@ -243,13 +368,23 @@ def prepare_alignment_data_for_one_ref(chr, chr_full_names, chr_names_by_id, ref
             ms_name += 's'
         ms_selectors.append((ms_type, ms_name, str(ms_count)))
 
-    contigs_structure_str = get_contigs_structure(assemblies_contigs, chr_to_aligned_blocks, contigs_by_assemblies, ref_contigs, chr_full_names,
-                                                   contig_names_by_refs, structures_by_labels, used_chromosomes, links_to_chromosomes, chr_names_by_id)
+    contigs_structures = get_contigs_structure(assemblies_contigs, chr_to_aligned_blocks, contigs_by_assemblies, ref_contigs, chr_full_names,
+                                               contig_names_by_refs, structures_by_labels, used_chromosomes, links_to_chromosomes, chr_names_by_id)
+    tiles_index, tiles_fnames = save_tiles(data_dirpath, tiles, contigs_structures)
+    search_fname = save_data_file(data_dirpath, 'search.js', 'icarus_tiles["search"] = [\n' + ',\n'.join(search_str) + '];')
+    data_str.append('var tiles_dirpath = "' + get_data_link(alignment_viewer_fpath) + '";')
+    data_str.append('var tiles_levels = [' + ',\n'.join('{min_len: ' + str(min_len) + ', window: ' + str(window) + ', tiles: {' +
+                    ','.join(str(tile_idx) + ':' + str(max_end) for tile_idx, max_end in sorted(level_index.items())) + '}}'
+                    for (min_len, window), level_index in zip(tiles_levels, tiles_index)) + '];')
 
     if contig_names_by_refs:
         data_str.append(''.join(links_to_chromosomes))
     data_str = '\n'.join(data_str)
-    return alignment_viewer_fpath, data_str, contigs_structure_str, additional_assemblies_data, ms_selectors, num_misassemblies, aligned_assemblies
+    # the overview is loaded at start, the other tiles are loaded by the viewer, all files are needed for JSON output
+    overview_fnames = [get_tile_name(len(tiles_levels) - 1, tile_idx) + '.js' for tile_idx in sorted(tiles_index[-1])]
+    tiles_fnames = [fname for fname in tiles_fnames if fname not in overview_fnames] + [search_fname]
+    return alignment_viewer_fpath, data_str, overview_fnames, tiles_fnames, additional_assemblies_data, ms_selectors, \
+           num_misassemblies, aligned_assemblies
 
 
 def add_contig(cum_length, contig, not_used_nx, assemblies_n50, assembly, contigs, contig_size_lines, num, structures_by_labels,
@@ -350,8 +485,8 @@ def get_contigs_data(contigs_by_assemblies, nx_marks, assemblies_n50, structures
     return contig_viewer_data, too_many_contigs
 
 
-def save_alignment_data_for_one_ref(chr_name, ref_contigs, ref_name, json_output_dir, alignment_viewer_fpath, data_str, ms_selectors,
-                                    ref_data='', features_data='', assemblies_data='', contigs_structure_str='', additional_assemblies_data=''):
+def save_alignment_data_for_one_ref(chr_name, ref_contigs, ref_name, json_output_dir, alignment_viewer_fpath, data_str, data_fnames, tiles_fnames,
+                                    ms_selectors, ref_data='', features_data='', assemblies_data='', additional_assemblies_data=''):
     alignment_viewer_template_fpath = html_saver.get_real_path(qconfig.icarus_viewers_template_fname)
     data_dict = dict()
     chr_data = 'chromosome = "' + chr_name + '";\n'
@@ -361,17 +496,21 @@ def save_alignment_data_for_one_ref(chr_name, ref_contigs, ref_name, json_output
         chr_name = ref_name
         chr_name += ' (' + str(len(ref_contigs)) + (' entries)' if len(ref_contigs) > 1 else ' entry)')
     chr_name = chr_name.replace('_', ' ')
-    all_data = ref_data + assemblies_data + additional_assemblies_data + chr_data + features_data + data_str + contigs_structure_str
+    data_dirpath = html_saver.get_icarus_data_dirpath(alignment_viewer_fpath)
+    all_data = ref_data + assemblies_data + additional_assemblies_data + chr_data + features_data + data_str
+    data_fnames = [save_data_file(data_dirpath, 'reference.js', all_data)] + data_fnames
     data_dict['title'] = 'Contig alignment viewer'
     data_dict['reference'] = chr_name
-    data_dict['data'] = '<script type="text/javascript">' + all_data + '</script>'
+    data_dict['data'] = get_data_scripts(alignment_viewer_fpath, data_fnames)
     data_dict['misassemblies_checkboxes'] = []
     for (ms_type, ms_name, ms_count) in ms_selectors:
         checkbox = {'ms_type': ms_type, 'ms_name': ms_name, 'ms_count': ms_count}
         data_dict['misassemblies_checkboxes'].append(checkbox)
-    html_saver.save_icarus_html(alignment_viewer_template_fpath, alignment_viewer_fpath, data_dict)
+    html_saver.save_icarus_html(alignment_viewer_template_fpath, alignment_viewer_fpath, data_dict, dirname(alignment_viewer_fpath))
     html_saver.save_icarus_data(json_output_dir, chr_name, 'ref_name')
-    html_saver.save_icarus_data(json_output_dir, data_dict['data'], 'data_alignments')
+    if json_output_dir:
+        all_data = read_data_files(data_dirpath, data_fnames + tiles_fnames)
+        html_saver.save_icarus_data(json_output_dir, '<script type="text/javascript">' + all_data + '</script>', 'data_alignments')
     html_saver.save_icarus_data(json_output_dir, data_dict['reference'], 'reference')
     html_saver.save_icarus_data(json_output_dir, data_dict['misassemblies_checkboxes'], 'ms_selector', as_text=False)
 
@@ -386,6 +525,7 @@ def save_contig_size_html(output_all_files_dir_path, json_output_dir, too_many_c
         data_dict['num_contigs_warning'] = str(qconfig.max_contigs_num_for_size_viewer)
         html_saver.save_icarus_data(json_output_dir, data_dict['num_contigs_warning'], 'num_contigs_warning')
 
-    data_dict['data'] = '<script type="text/javascript">' + all_data + '</script>'
-    html_saver.save_icarus_data(json_output_dir, data_dict['data'], 'data_sizes')
-    html_saver.save_icarus_html(contig_size_template_fpath, contig_size_viewer_fpath, data_dict)
+    data_fname = save_data_file(init_data_dir(contig_size_viewer_fpath), 'contigs.js', all_data)
+    data_dict['data'] = get_data_scripts(contig_size_viewer_fpath, [data_fname])
+    html_saver.save_icarus_data(json_output_dir, '<script type="text/javascript">' + all_data + '</script>', 'data_sizes')
+    html_saver.save_icarus_html(contig_size_template_fpath, contig_size_viewer_fpath, data_dict, output_all_files_dir_path)
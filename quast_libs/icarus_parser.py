@@ -13,6 +13,7 @@ from collections import defaultdict
 
 from quast_libs import fastaparser, qconfig, qutils
 from quast_libs.icarus_utils import Alignment, Contig
+from quast_libs.ra_utils.coverage_pyramid import load_coverage
 
 
 def parse_aligner_contig_report(report_fpath, ref_names, cumulative_ref_lengths):
@@ -91,34 +92,21 @@ def parse_cov_fpath(cov_fpath, chr_names, chr_full_names, contig_names_by_refs):
         return None, None
     cov_data = defaultdict(list)
     max_depth = defaultdict(int)
-    chr_contigs = []
-    with open(cov_fpath, 'r') as coverage:
-        contig_to_chr = dict()
-        for chr in chr_full_names:
-            if contig_names_by_refs:
-                contigs = [contig for contig in chr_names if contig_names_by_refs[contig] == chr]
-            elif len(chr_full_names) == 1:
-                contigs = chr_names
-            else:
-                contigs = [chr]
-            for contig in contigs:
-                contig_to_chr[contig] = chr
-            chr_contigs.extend(contigs)
-        data_by_contig = [[] for x in range(len(chr_contigs))]
-        chrom_index = None
-        for index, line in enumerate(coverage):
-            fs = line.split()
-            if line.startswith('#'):
-                chr_name = fs[0][1:]
-                chrom_index = chr_contigs.index(chr_name) if chr_name in chr_contigs else None
-            elif chrom_index is not None:
-                depth = int(float(fs[1]))
-                data_by_contig[chrom_index].append(depth)
-        for i, contig in enumerate(chr_contigs):
-            chrom = contig_to_chr[contig]
-            cov_data[chrom].extend(data_by_contig[i])
-        for chrom, depths in cov_data.items():
-            max_depth[chrom] = max(depths)
+    coverage = load_coverage(cov_fpath)
+    for chr in chr_full_names:
+        if contig_names_by_refs:
+            contigs = [contig for contig in chr_names if contig_names_by_refs[contig] == chr]
+        elif len(chr_full_names) == 1:
+            contigs = chr_names
+        else:
+            contigs = [chr]
+        contigs = [contig for contig in contigs if contig in coverage.chromosomes]
+        for contig in contigs:
+            cov_data[chr].extend(coverage.get_depths(contig))
+        contigs_max_depths = [coverage.get_max_depth(contig) for contig in contigs]  # read from the coarsest level
+        contigs_max_depths = [depth for depth in contigs_max_depths if depth is not None]
+        if contigs_max_depths:
+            max_depth[chr] = max(contigs_max_depths)
     return cov_data, max_depth
 
 
@@ -10,6 +10,8 @@
 from __future__ import with_statement
 
 import os
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
 
 from quast_libs import qconfig, qutils
 from quast_libs.html_saver.html_saver import trim_ref_name
@@ -91,18 +93,30 @@ class Assembly:
             self.alignments.append(block)
             self.contigs_by_ids[c_id].alignments.append(len(self.alignments) - 1)
 
+        # for each reference: starts of alignments in the sorted order and indices of these alignments
+        self.starts_by_ref = defaultdict(list)
+        self.alignment_ids_by_ref = defaultdict(list)
+        for i in sorted(range(len(self.alignments)), key=lambda i: self.alignments[i].start):
+            self.starts_by_ref[self.alignments[i].ref_name].append(self.alignments[i].start)
+            self.alignment_ids_by_ref[self.alignments[i].ref_name].append(i)
+
     def find(self, alignment):
+        """
+            Returns the index of the first alignment similar to the given one (see Alignment.compare_inexact) or -1
+        """
         if alignment.length() < qconfig.min_similar_contig_size:
             return -1
 
-        i = 0
-        while i < len(self.alignments) and not alignment.compare_inexact(self.alignments[i]):
-            i += 1
-
-        if i == len(self.alignments):
+        # only alignments with close starts are compared, the window is extended to avoid rounding issues
+        if alignment.ref_name not in self.starts_by_ref:
             return -1
-        else:
-            return i
+        starts = self.starts_by_ref[alignment.ref_name]
+        max_delta = qconfig.contig_len_delta * abs(alignment.end - alignment.start) + 1
+        first_idx = bisect_left(starts, alignment.start - max_delta)
+        last_idx = bisect_right(starts, alignment.start + max_delta)
+        similar_ids = [i for i in self.alignment_ids_by_ref[alignment.ref_name][first_idx:last_idx]
+                       if alignment.compare_inexact(self.alignments[i])]
+        return min(similar_ids) if similar_ids else -1
 
     def apply_color(self, settings):
         for block in self.alignments:
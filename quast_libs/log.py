@@ -301,3 +301,9 @@ class QLogger(object):
     def get_numbers_of_notifications(self):
         return (self._num_notices, self._num_warnings, self._num_nf_errors)
 
+    def add_numbers_of_notifications(self, numbers):
+        num_notices, num_warnings, num_nf_errors = numbers
+        self._num_notices += num_notices
+        self._num_warnings += num_warnings
+        self._num_nf_errors += num_nf_errors
+
@@ -478,7 +478,7 @@ def do(ref_fpath, original_ref_fpath, output_dirpath):
         logger.error('  Failed to create Upper Bound Assembly, see log for details: ' + log_fpath)
         return None
 
-    reference = list(fastaparser.read_fasta(ref_fpath))
+    reference = list(fastaparser.read_fasta(ref_fpath, packed=True))  # corrected reference, ACGTN only
     result_fasta = []
 
     if long_reads or qconfig.mate_pairs:
@@ -74,6 +74,10 @@ def check_output_dir(option, opt_str, value, parser, logger):
                      'Please, use a different directory.')
 
 
+def set_abspath(option, opt_str, value, parser):
+    setattr(qconfig, option.dest, abspath(value))
+
+
 def set_extensive_mis_size(option, opt_str, value, parser, logger):
     if value <= qconfig.MAX_INDEL_LENGTH:
         logger.error("--extensive-mis-size should be greater than maximum indel length (%d)!"
@@ -666,6 +670,26 @@ def parse_options(logger, quast_args):
              callback_kwargs={'store_true_values': ['space_efficient'],
                               'store_false_values': ['show_snps', 'create_icarus_html']},)
          ),
+        (['--ref-index-cache'], dict(
+             dest='ref_index_cache_dirpath',
+             type='string',
+             action='callback',
+             callback=set_abspath)
+         ),
+        (['--ref-index-cache-size'], dict(
+             dest='ref_index_cache_size',
+             type='int',
+             action='callback',
+             callback=check_arg_value,
+             callback_args=(logger,),
+             callback_kwargs={'min_value': 1})
+         ),
+        (['--results-cache'], dict(
+             dest='results_cache_dirpath',
+             type='string',
+             action='callback',
+             callback=set_abspath)
+         ),
         (['--silent'], dict(
              dest='silent',
              action='store_true')
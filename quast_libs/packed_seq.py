@@ -0,0 +1,163 @@
+############################################################################
+# Copyright (c) 2015-2019 Saint Petersburg State University
+# Copyright (c) 2011-2015 Saint Petersburg Academic University
+# All Rights Reserved
+# See file LICENSE for details.
+############################################################################
+#
+# Nucleotide sequence packed into 2 bits per base (4 bases per byte).
+# N's are stored as A's in the packed data and listed separately as runs,
+# so only sequences consisting of A, C, G, T and N (as corrected by QUAST) are supported.
+# Packing and unpacking are done by binascii and translate() without
+# per-base loops in Python: each step groups two symbols into one.
+#
+############################################################################
+
+import binascii
+import re
+from bisect import bisect_right
+
+BASES = 'ACGT'
+ns_pattern = re.compile('N+')
+acgt_pattern = re.compile('[^ACGTN]')
+
+
+def _make_table(mapping):
+    table = bytearray(range(256))
+    for key, value in mapping.items():
+        table[key] = value
+    return bytes(table)
+
+
+_to_hex_codes = _make_table({ord('A'): ord('0'), ord('C'): ord('1'), ord('G'): ord('2'), ord('T'): ord('3'),
+                             ord('N'): ord('0')})
+_from_hex_codes = _make_table({ord('0'): ord('A'), ord('1'): ord('C'), ord('2'): ord('G'), ord('3'): ord('T')})
+# byte with two codes (hi * 16 + lo) <-> hex digit of hi * 4 + lo
+_pair_to_hex = _make_table(dict((hi * 16 + lo, ord('%x' % (hi * 4 + lo))) for hi in range(4) for lo in range(4)))
+_hex_to_pair = _make_table(dict((ord('%x' % (hi * 4 + lo)), hi * 16 + lo) for hi in range(4) for lo in range(4)))
+_complement = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A', 'N': 'N'}
+_complement_table = _make_table(dict((ord(base), ord(comp_base)) for base, comp_base in _complement.items()))
+
+
+def _to_bytes(seq):
+    return seq if isinstance(seq, bytes) else seq.encode('ascii')
+
+
+def _to_str(seq):
+    return seq if isinstance(seq, str) else seq.decode('ascii')
+
+
+def pack(seq):
+    """
+        Returns bytes with 4 bases per byte, the first base is stored in the highest bits
+    """
+    codes = _to_bytes(seq).translate(_to_hex_codes)
+    codes += b'0' * (-len(codes) % 4)
+    return binascii.unhexlify(binascii.unhexlify(codes).translate(_pair_to_hex))
+
+
+def unpack(packed, start, end):
+    """
+        Returns bases from start to end (0-based, end is exclusive) with A's in place of N's
+    """
+    if start >= end:
+        return b''
+    first_byte = start // 4
+    codes = binascii.hexlify(binascii.hexlify(packed[first_byte:(end + 3) // 4]).translate(_hex_to_pair))
+    return codes[start - first_byte * 4:end - first_byte * 4].translate(_from_hex_codes)
+
+
+class PackedSeq(object):
+    """
+        Read-only sequence with a part of str interface: len(), slicing (returns str), count() and str()
+    """
+    __slots__ = ('length', 'packed', 'ns_starts', 'ns_ends')
+
+    def __init__(self, seq):
+        seq = _to_str(seq)
+        if acgt_pattern.search(seq):
+            raise ValueError('Only A, C, G, T and N letters can be packed')
+        self.length = len(seq)
+        self.packed = pack(seq)
+        ns_runs = [match.span() for match in ns_pattern.finditer(seq)]
+        self.ns_starts = [start for start, _ in ns_runs]
+        self.ns_ends = [end for _, end in ns_runs]
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    __nonzero__ = __bool__
+
+    def __str__(self):
+        return self[:]
+
+    def __repr__(self):
+        return 'PackedSeq(%r)' % self[:]
+
+    def __eq__(self, other):
+        if isinstance(other, PackedSeq):
+            return self.length == other.length and self.packed == other.packed and \
+                   self.ns_starts == other.ns_starts and self.ns_ends == other.ns_ends
+        return str(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def _range(self, start, end):
+        start, end, _ = slice(start, end).indices(self.length)
+        return start, max(start, end)
+
+    def ns_runs(self, start=0, end=None):
+        """
+            Runs of N's intersecting [start, end) and clipped by it
+        """
+        start, end = self._range(start, end)
+        i = bisect_right(self.ns_ends, start)
+        runs = []
+        while i < len(self.ns_starts) and self.ns_starts[i] < end:
+            runs.append((max(self.ns_starts[i], start), min(self.ns_ends[i], end)))
+            i += 1
+        return runs
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                return str(self)[index]
+            start, end = self._range(index.start, index.stop)
+        else:
+            if index < 0:
+                index += self.length
+            if not 0 <= index < self.length:
+                raise IndexError('PackedSeq index out of range')
+            start, end = index, index + 1
+        seq = unpack(self.packed, start, end)
+        ns_runs = self.ns_runs(start, end)
+        if ns_runs:
+            seq = bytearray(seq)
+            for ns_start, ns_end in ns_runs:
+                seq[ns_start - start:ns_end - start] = b'N' * (ns_end - ns_start)
+            seq = bytes(seq)
+        return _to_str(seq)
+
+    def count(self, letter, start=0, end=None):
+        start, end = self._range(start, end)
+        ns_count = sum(ns_end - ns_start for ns_start, ns_end in self.ns_runs(start, end))
+        if letter == 'N':
+            return ns_count
+        if letter not in BASES:
+            return 0
+        letter_count = unpack(self.packed, start, end).count(_to_bytes(letter))
+        return letter_count - ns_count if letter == 'A' else letter_count
+
+    def gc_count(self, start=0, end=None):
+        start, end = self._range(start, end)
+        seq = unpack(self.packed, start, end)
+        return seq.count(b'G') + seq.count(b'C')
+
+    def reverse_complement(self):
+        return PackedSeq(_to_bytes(self[:]).translate(_complement_table)[::-1])
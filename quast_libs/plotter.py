@@ -851,6 +851,7 @@ def draw_report_table(report_name, extra_info, table_to_draw, column_widths):
     plt.table(cellText=restValues, rowLabels=rowLabels, colLabels=colLabels,
         colWidths=[float(column_width) / sum(column_widths) for column_width in column_widths[1:]],
         rowLoc='left', colLoc='center', cellLoc='right', loc='center')
+    figure.table_args = (report_name, extra_info, table_to_draw, column_widths)  # to draw it again in another process
     pdf_tables_figures.append(figure)
     plt.close()
 
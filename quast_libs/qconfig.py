@@ -150,6 +150,8 @@ create_icarus_html = True
 icarus_css_name = 'icarus.css'
 icarus_script_name = 'build_icarus.js'
 icarus_dirname = 'icarus_viewers'
+icarus_data_dirname = 'data'  # inside icarus_dirname, JS files with data of the viewers
+icarus_static_dirname = 'static'  # inside icarus_dirname, shared JS and CSS files
 icarus_html_fname = 'icarus.html'
 icarus_menu_template_fname = 'icarus_menu_templ.html'
 icarus_viewers_template_fname = 'viewers_template.html'
@@ -163,6 +165,9 @@ alignment_viewer_fpath = 'alignment_viewer.html'
 MAX_SIZE_FOR_COMB_PLOT = 50000000
 ICARUS_MAX_CHROMOSOMES = 50
 max_contigs_num_for_size_viewer = 1000
+icarus_tile_window = 100000  # alignment viewers load alignments by windows (tiles) of this size at the most detailed level
+icarus_zoom_factor = 10  # each next level has windows this times larger
+icarus_max_chart_width = 4000  # pixels, a level keeps only alignments which are at least one pixel wide on such a chart
 min_contig_for_size_viewer = 10000
 contig_len_delta = 0.05
 min_similar_contig_size = 10000
@@ -202,6 +207,13 @@ assemblies_num = 1
 memory_efficient = False
 space_efficient = False
 
+# persistent cache of minimap2 reference indexes
+ref_index_cache_dirpath = None
+ref_index_cache_size = 20  # in GB
+
+# cache of Contig analyzer results shared between runs
+results_cache_dirpath = None
+
 # genome analyzer
 analyze_gaps = True
 min_gap_size = 50  # for calculating number or gaps in genome coverage
@@ -482,8 +494,13 @@ def usage(show_hidden=False, mode=None, short=True, stream=sys.stdout):
         stream.write("                                      Supported formats: %s\n" % ', '.join(supported_plot_extensions))
         stream.write("    --memory-efficient                Run everything using one thread, separately per each assembly.\n")
         stream.write("                                      This may significantly reduce memory consumption on large genomes\n")
-        stream.write("    --space-efficient                 Create only reports and plots files. Aux files including .stdout, .stderr, .coords will not be created.\n")
+        stream.write("    --space-efficient                 Create only reports and plots files. Aux files including .stdout, .stderr, .coords.bin will not be created.\n")
         stream.write("                                      This may significantly reduce space consumption on large genomes. Icarus viewers also will not be built\n")
+        stream.write("    --ref-index-cache  <dirname>      Keep minimap2 indexes of references in this directory and reuse them in next runs\n")
+        stream.write("    --ref-index-cache-size  <int>     Maximum size of the reference index cache in GB [default: %d].\n" % ref_index_cache_size)
+        stream.write("                                      The least recently used indexes are removed when the cache becomes larger\n")
+        stream.write("    --results-cache  <dirname>        Keep results of contigs analysis in this directory and reuse them in next runs\n")
+        stream.write("                                      for the same assemblies, reference and options\n")
         stream.write("-1  --pe1     <filename>              File with forward paired-end reads (in FASTQ format, may be gzipped)\n")
         stream.write("-2  --pe2     <filename>              File with reverse paired-end reads (in FASTQ format, may be gzipped)\n")
         stream.write("    --pe12    <filename>              File with interlaced forward and reverse paired-end reads. (in FASTQ format, may be gzipped)\n")
@@ -521,7 +538,8 @@ def usage(show_hidden=False, mode=None, short=True, stream=sys.stdout):
             stream.write("\n")
             stream.write("Hidden options:\n")
             stream.write("-d  --debug                 Run in a debug mode\n")
-            stream.write("--no-portable-html          Do not embed CSS and JS files in HTML report\n")
+            stream.write("--no-portable-html          Do not embed CSS and JS files in HTML report. Icarus viewers link them\n"
+                         "                            from the QUAST installation, so they are not self-contained\n")
             stream.write("-j  --save-json             Save the output also in the JSON format\n")
             stream.write("-J  --save-json-to <path>   Save the JSON output to a particular path\n")
             if meta:
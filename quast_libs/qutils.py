@@ -132,6 +132,8 @@ def correct_fasta(original_fpath, min_contig, corrected_fpath=None, is_reference
         return False
     if corrected_fpath:
         fastaparser.write_fasta(corrected_fpath, modified_fasta_entries)
+        fastaparser.create_stats_file(corrected_fpath, modified_fasta_entries,
+                                      calculate_GC_windows=is_reference or not qconfig.no_gc)
     return True
 
 
@@ -287,6 +289,7 @@ def broke_scaffolds(file_counter, labels, contigs_fpath, corrected_dirpath, logs
         contigs_counter += total_contigs_for_the_scaf
     if contigs_counter > scaffold_counter + 1:
         fastaparser.write_fasta(broken_scaffolds_fpath, broken_scaffolds_fasta)
+        fastaparser.create_stats_file(broken_scaffolds_fpath, broken_scaffolds_fasta, calculate_GC_windows=not qconfig.no_gc)
         logs.append("  " + index_to_str(file_counter, force=(len(labels) > 1)) +
                     "    %d scaffolds (%s) were broken into %d contigs (%s)" %
                     (scaffold_counter + 1,
@@ -609,9 +612,7 @@ def label_from_fpath_for_fname(fpath):
     return slugify(qconfig.assembly_labels_by_fpath[fpath])
 
 
-def call_subprocess(args, stdin=None, stdout=None, stderr=None,
-                    indent='',
-                    only_if_debug=True, env=None, logger=logger):
+def _print_command_line(args, stdin=None, stdout=None, stderr=None, indent='', only_if_debug=True, logger=logger):
     printed_args = args[:]
     if stdin:
         printed_args += ['<', stdin.name]
@@ -626,6 +627,12 @@ def call_subprocess(args, stdin=None, stdout=None, stderr=None,
 
     logger.print_command_line(printed_args, indent, only_if_debug=only_if_debug)
 
+
+def call_subprocess(args, stdin=None, stdout=None, stderr=None,
+                    indent='',
+                    only_if_debug=True, env=None, logger=logger):
+    _print_command_line(args, stdin, stdout, stderr, indent, only_if_debug, logger)
+
     return_code = subprocess.call(args, stdin=stdin, stdout=stdout, stderr=stderr, env=env)
 
     if return_code != 0:
@@ -636,6 +643,15 @@ def call_subprocess(args, stdin=None, stdout=None, stderr=None,
     return return_code
 
 
+def popen_subprocess(args, stderr=None, indent='', only_if_debug=True, env=None, logger=logger):
+    """
+        Starts the tool with stdout redirected to a pipe, so its output can be processed while the tool is running.
+        The caller should read proc.stdout and then check the return code of proc.wait()
+    """
+    _print_command_line(args, stderr=stderr, indent=indent, only_if_debug=only_if_debug, logger=logger)
+    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr, env=env, universal_newlines=True)
+
+
 def get_free_memory():
     total_mem, free_mem = 2, 2
     if qconfig.platform_name == 'linux_64':
@@ -1040,30 +1056,147 @@ def download_external_tool(fname, dirpath, tool, platform_specific=False, is_exe
     return downloaded_fpath
 
 
-def run_parallel(_fn, fn_args, n_jobs=None, filter_results=False):
-    if qconfig.memory_efficient:
-        results_tuples = [_fn(*args) for args in fn_args]
-    else:
-        n_jobs = n_jobs or qconfig.max_threads
-        parallel_args = {'n_jobs': n_jobs}
-        try:
-            import joblib
-            from joblib import Parallel, delayed
+shared_threads = None  # SharedThreads of the current run_parallel, workers inherit it
+current_job_index = None  # index of the run_parallel job running in this process
+shared_args = None  # read-only arguments common for all jobs of the current run_parallel, workers inherit them
+
+
+class SharedThreads(object):
+    """
+        Threads shared between jobs of run_parallel. A job takes threads right before starting a multithreaded tool
+        (see take_threads), so threads released by the finished jobs are used by the remaining ones
+        instead of the fixed max_threads // n_jobs split.
+    """
+    NOT_STARTED, STARTED, RUNNING, FINISHED = 0, 1, 2, 3  # RUNNING jobs have already taken threads
+
+    def __init__(self, max_threads, n_jobs, job_sizes):
+        import multiprocessing
+        self.n_jobs = n_jobs
+        self.lock = multiprocessing.Lock()
+        self.threads_released = multiprocessing.Condition(self.lock)
+        self.free_threads = multiprocessing.RawValue('i', max_threads)
+        self.job_sizes = multiprocessing.RawArray('d', [float(size) for size in job_sizes])
+        self.job_states = multiprocessing.RawArray('i', len(job_sizes))
+        self.job_threads = multiprocessing.RawArray('i', len(job_sizes))
+
+    def start_job(self, job_index):
+        with self.lock:
+            self.job_states[job_index] = SharedThreads.STARTED
+
+    def finish_job(self, job_index):
+        self.release(job_index)
+        with self.lock:
+            self.job_states[job_index] = SharedThreads.FINISHED
+
+    def take(self, job_index):
+        with self.lock:
+            while self.free_threads.value <= 0:  # all threads are taken by other jobs, waiting until they release them
+                self.threads_released.wait()
+            self.job_states[job_index] = SharedThreads.RUNNING
+            running_num = sum(1 for state in self.job_states if state in [SharedThreads.STARTED, SharedThreads.RUNNING])
+            # jobs starting along with the current one should get their share of threads too
+            next_jobs = [i for i, state in enumerate(self.job_states) if state == SharedThreads.STARTED]
+            next_jobs += sorted((i for i, state in enumerate(self.job_states) if state == SharedThreads.NOT_STARTED),
+                                key=lambda i: -self.job_sizes[i])[:max(0, self.n_jobs - running_num)]
+            free_threads = self.free_threads.value
+            total_size = self.job_sizes[job_index] + sum(self.job_sizes[i] for i in next_jobs)
+            share = int(round(free_threads * self.job_sizes[job_index] / total_size)) if total_size else free_threads
+            threads = max(1, min(share, free_threads - len(next_jobs)))
+            self.job_threads[job_index] += threads
+            self.free_threads.value -= threads
+            return threads
+
+    def release(self, job_index):
+        with self.lock:
+            self.free_threads.value += self.job_threads[job_index]
+            self.job_threads[job_index] = 0
+            self.threads_released.notify_all()
+
+
+def take_threads(threads):
+    """
+        Returns the number of threads for a multithreaded tool started by a job of run_parallel,
+        they should be returned by release_threads after the tool is finished.
+        Returns threads as is if threads are not shared between jobs.
+    """
+    if shared_threads is None or current_job_index is None:
+        return threads
+    return shared_threads.take(current_job_index)
+
+
+def release_threads():
+    if shared_threads is not None and current_job_index is not None:
+        shared_threads.release(current_job_index)
+
+
+def run_shared_threads_job(_fn, job_index, args):
+    global current_job_index
+    prev_job_index = current_job_index
+    current_job_index = job_index
+    shared_threads.start_job(job_index)
+    try:
+        return _fn(*args)
+    finally:
+        shared_threads.finish_job(job_index)
+        current_job_index = prev_job_index
+
+
+def run_shared_args_job(_fn, args):
+    return _fn(*(tuple(args) + shared_args))
+
+
+def run_parallel(_fn, fn_args, n_jobs=None, filter_results=False, job_sizes=None, common_args=None):
+    """
+        If job_sizes are specified, the largest jobs start first and threads are shared between them (see take_threads).
+        common_args are passed to each job after its own arguments. Workers are forked after they are saved
+        in a global variable, so large read-only data (e.g. reference lengths or genomic features) is not pickled
+        and sent to workers for each job.
+    """
+    global shared_threads, shared_args
+    n_jobs = n_jobs or qconfig.max_threads
+    prev_shared_args = shared_args
+    if common_args:
+        shared_args = tuple(common_args)
+        fn_args = [(_fn, args) for args in fn_args]
+        _fn = run_shared_args_job
+    if job_sizes:
+        jobs_order = sorted(range(len(fn_args)), key=lambda i: -job_sizes[i])
+        prev_shared_threads = shared_threads
+        shared_threads = SharedThreads(qconfig.max_threads, 1 if qconfig.memory_efficient else n_jobs, job_sizes)
+        fn_args = [(_fn, i, fn_args[i]) for i in jobs_order]
+        _fn = run_shared_threads_job
+    try:
+        if qconfig.memory_efficient:
+            results_tuples = [_fn(*args) for args in fn_args]
+        else:
+            parallel_args = {'n_jobs': n_jobs}
             try:
-                # starting from joblib 0.10 the default backend has changed to 'loky' which causes QUAST crashes,
-                # since it uses default values in qconfig module. So, we explicitly require 'multiprocessing' here.
-                # Note that Parallel doesn't have 'require' argument in joblib 0.9 and earlier.
-                new_style_parallel_args = {'backend': 'multiprocessing'}
-                Parallel(**new_style_parallel_args)
-                parallel_args.update(new_style_parallel_args)
-            except TypeError:
-                pass
-        except ImportError:
-            if is_python2():
-                from joblib2 import Parallel, delayed
-            else:
-                from joblib3 import Parallel, delayed
-        results_tuples = Parallel(**parallel_args)(delayed(_fn)(*args) for args in fn_args)
+                import joblib
+                from joblib import Parallel, delayed
+                try:
+                    # starting from joblib 0.10 the default backend has changed to 'loky' which causes QUAST crashes,
+                    # since it uses default values in qconfig module. So, we explicitly require 'multiprocessing' here.
+                    # Note that Parallel doesn't have 'require' argument in joblib 0.9 and earlier.
+                    new_style_parallel_args = {'backend': 'multiprocessing'}
+                    Parallel(**new_style_parallel_args)
+                    parallel_args.update(new_style_parallel_args)
+                except TypeError:
+                    pass
+            except ImportError:
+                if is_python2():
+                    from joblib2 import Parallel, delayed
+                else:
+                    from joblib3 import Parallel, delayed
+            results_tuples = Parallel(**parallel_args)(delayed(_fn)(*args) for args in fn_args)
+    finally:
+        shared_args = prev_shared_args
+        if job_sizes:
+            shared_threads = prev_shared_threads
+    if job_sizes:
+        ordered_results_tuples = [None] * len(results_tuples)
+        for result_tuple, i in zip(results_tuples, jobs_order):
+            ordered_results_tuples[i] = result_tuple
+        results_tuples = ordered_results_tuples
     results = []
     if results_tuples:
         if isinstance(results_tuples[0], list) or isinstance(results_tuples[0], tuple):
@@ -0,0 +1,233 @@
+############################################################################
+# Copyright (c) 2015-2019 Saint Petersburg State University
+# Copyright (c) 2011-2015 Saint Petersburg Academic University
+# All Rights Reserved
+# See file LICENSE for details.
+############################################################################
+#
+# Depth of coverage along the reference at several resolutions (.cov.bin).
+# Level 0 keeps the bins of the .cov file (mean depth of COVERAGE_FACTOR bp),
+# every next level merges LEVEL_FACTOR bins of the previous one and keeps
+# their minimum, maximum and sum, so the mean depth of any range aligned to
+# the bins is exact. Levels are stored one after another for each chromosome
+# and only the requested one is read from the file.
+# Depth histograms (reads_analyzer.analyse_coverage) are not built from
+# the pyramid yet, see the TODO there.
+#
+############################################################################
+
+from __future__ import with_statement
+from __future__ import division
+import os
+import struct
+import sys
+from array import array
+try:
+    from collections import OrderedDict
+except ImportError:
+    from quast_libs.site_packages.ordered_dict import OrderedDict
+
+from quast_libs.qutils import is_non_empty_file
+
+COVERAGE_FACTOR = 10  # size of bins in the .cov files
+LEVEL_FACTOR = 10
+
+file_header = struct.Struct('<4sIII')  # magic, size of bins at level 0, level factor, number of chromosomes
+chr_header = struct.Struct('<IiqI')  # length of the name, index of the chromosome in the .cov file, number of bins, number of levels
+MAGIC = b'QCP1'
+
+
+def get_pyramid_fpath(cov_fpath):
+    return cov_fpath + '.bin'
+
+
+def _write_array(f, values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(f)
+
+
+def _read_array(f, typecode, size):
+    values = array(typecode)
+    values.fromfile(f, size)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _merge_bins(mins, maxs, sums, factor):
+    merged_mins, merged_maxs, merged_sums = array('i'), array('i'), array('d')
+    for start in range(0, len(mins), factor):
+        merged_mins.append(min(mins[start:start + factor]))
+        merged_maxs.append(max(maxs[start:start + factor]))
+        merged_sums.append(sum(sums[start:start + factor]))
+    return merged_mins, merged_maxs, merged_sums
+
+
+def build_levels(depths, factor=LEVEL_FACTOR):
+    """
+        Returns the list of (mins, maxs, sums) for all levels, depths (level 0) are used for all three arrays
+    """
+    levels = [(depths, depths, depths)]
+    while len(levels[-1][0]) > 1:
+        levels.append(_merge_bins(*levels[-1], factor=factor))
+    return levels
+
+
+class CoveragePyramid(object):
+    def __init__(self, bin_size=COVERAGE_FACTOR, level_factor=LEVEL_FACTOR, fpath=None):
+        self.base_bin_size = bin_size
+        self.level_factor = level_factor
+        self.fpath = fpath
+        self.chromosomes = OrderedDict()  # name -> (index in the .cov file, number of bins, levels or their offsets in the file)
+
+    @staticmethod
+    def from_file(fpath):
+        with open(fpath, 'rb') as f:
+            magic, bin_size, level_factor, num_chromosomes = file_header.unpack(f.read(file_header.size))
+            if magic != MAGIC:
+                raise ValueError('Incorrect coverage file: ' + fpath)
+            pyramid = CoveragePyramid(bin_size, level_factor, fpath)
+            for _ in range(num_chromosomes):
+                name_len, index, num_bins, num_levels = chr_header.unpack(f.read(chr_header.size))
+                name = f.read(name_len).decode('utf-8')
+                offsets = []
+                offset = f.tell()
+                for level in range(num_levels):
+                    offsets.append(offset)
+                    level_size = pyramid.get_num_bins(num_bins, level)
+                    offset += level_size * 4 if level == 0 else level_size * (4 + 4 + 8)
+                pyramid.chromosomes[name] = (index, num_bins, offsets)
+                f.seek(offset)
+        return pyramid
+
+    @staticmethod
+    def from_cov_file(cov_fpath, bin_size=COVERAGE_FACTOR):
+        """
+            Builds the pyramid in memory from a text file with '#name index' lines followed by 'index depth' lines
+        """
+        pyramid = CoveragePyramid(bin_size)
+        depths_by_chr = OrderedDict()
+        indices = dict()
+        depths = None
+        with open(cov_fpath) as f:
+            for line in f:
+                fs = line.split()
+                if line.startswith('#'):
+                    depths = depths_by_chr.setdefault(fs[0][1:], array('i'))
+                    indices[fs[0][1:]] = int(fs[1]) if len(fs) > 1 else -1
+                elif depths is not None:
+                    depths.append(int(float(fs[-1])))
+        for name, depths in depths_by_chr.items():
+            pyramid.add(name, indices[name], depths)
+        return pyramid
+
+    def add(self, name, index, depths):
+        self.chromosomes[name] = (index, len(depths), build_levels(depths, self.level_factor))
+
+    def save(self, fpath):
+        writer = PyramidWriter(fpath, self.base_bin_size, self.level_factor)
+        for name in self.chromosomes:
+            writer.add(name, self.get_index(name), self.get_depths(name))
+        writer.close()
+
+    def get_index(self, name):
+        return self.chromosomes[name][0]
+
+    def get_bin_size(self, level):
+        return self.base_bin_size * self.level_factor ** level
+
+    def get_num_bins(self, num_base_bins, level):
+        return -(-num_base_bins // self.level_factor ** level)
+
+    def get_num_levels(self, name):
+        return len(self.chromosomes[name][2])
+
+    def get_level(self, name, level):
+        """
+            Returns arrays of minimum depths, maximum depths and sums of depths of level 0 bins merged into each bin
+        """
+        _, num_bins, levels = self.chromosomes[name]
+        if self.fpath is None:
+            return levels[level]
+        level_size = self.get_num_bins(num_bins, level)
+        with open(self.fpath, 'rb') as f:
+            f.seek(levels[level])
+            if level == 0:
+                depths = _read_array(f, 'i', level_size)
+                return depths, depths, depths
+            return _read_array(f, 'i', level_size), _read_array(f, 'i', level_size), _read_array(f, 'd', level_size)
+
+    def get_depths(self, name):
+        return self.get_level(name, 0)[0]
+
+    def get_bin_counts(self, name, level):
+        """
+            Numbers of level 0 bins merged into each bin of the level (the last one can be incomplete)
+        """
+        _, num_bins, _ = self.chromosomes[name]
+        merged_bins = self.level_factor ** level
+        return [min(merged_bins, num_bins - start) for start in range(0, num_bins, merged_bins)]
+
+    def get_max_depth(self, name):
+        num_levels = self.get_num_levels(name)
+        if not self.chromosomes[name][1]:
+            return None
+        return max(self.get_level(name, num_levels - 1)[1])
+
+    def get_window_level(self, name, window_size):
+        """
+            The coarsest level whose bins fit into windows of the given size exactly
+        """
+        level = 0
+        while level + 1 < self.get_num_levels(name) and window_size % self.get_bin_size(level + 1) == 0:
+            level += 1
+        return level
+
+
+class PyramidWriter(object):
+    """
+        Saves chromosomes one by one, so only one of them is kept in memory
+    """
+    def __init__(self, fpath, bin_size=COVERAGE_FACTOR, level_factor=LEVEL_FACTOR):
+        self.fpath = fpath
+        self.bin_size = bin_size
+        self.level_factor = level_factor
+        self.num_chromosomes = 0
+        self._f = open(fpath, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        self._f.write(file_header.pack(MAGIC, self.bin_size, self.level_factor, self.num_chromosomes))
+
+    def add(self, name, index, depths):
+        levels = build_levels(depths, self.level_factor)
+        encoded_name = name.encode('utf-8')
+        self._f.write(chr_header.pack(len(encoded_name), index, len(depths), len(levels)))
+        self._f.write(encoded_name)
+        _write_array(self._f, depths)
+        for mins, maxs, sums in levels[1:]:
+            for values in (mins, maxs, sums):
+                _write_array(self._f, values)
+        self.num_chromosomes += 1
+
+    def close(self):
+        self._f.seek(0)
+        self._write_header()
+        self._f.close()
+
+    def discard(self):
+        self._f.close()
+        os.remove(self.fpath)
+
+
+def load_coverage(cov_fpath, bin_size=COVERAGE_FACTOR):
+    """
+        Reads the pyramid saved by reads_analyzer next to the .cov file or builds it from the text file
+        (e.g. the one specified by --cov or created by an older QUAST version)
+    """
+    pyramid_fpath = get_pyramid_fpath(cov_fpath)
+    if is_non_empty_file(pyramid_fpath) and os.path.getmtime(pyramid_fpath) >= os.path.getmtime(cov_fpath):
+        return CoveragePyramid.from_file(pyramid_fpath)
+    return CoveragePyramid.from_cov_file(cov_fpath, bin_size)
@@ -12,12 +12,14 @@ import re
 import shutil
 import shlex
 from collections import defaultdict
+from array import array
 from math import sqrt
 from os.path import isfile, join, basename, abspath, isdir, dirname, exists
 
 from quast_libs import qconfig, qutils
 from quast_libs.ca_utils.misc import minimap_fpath, ref_labels_by_chromosomes
 from quast_libs.fastaparser import create_fai_file
+from quast_libs.ra_utils.coverage_pyramid import COVERAGE_FACTOR, PyramidWriter, get_pyramid_fpath
 from quast_libs.ra_utils.misc import compile_reads_analyzer_tools, sambamba_fpath, bwa_fpath, bedtools_fpath, \
     bwa_dirpath, download_gridss, get_gridss_fpath, get_gridss_memory, \
     paired_reads_names_are_equal, sort_bam, bwa_index, reformat_bedpe, get_correct_names_for_chroms, \
@@ -31,7 +33,6 @@ from quast_libs.reporting import save_reads
 
 logger = get_logger(qconfig.LOGGER_DEFAULT_NAME)
 ref_sam_fpaths = {}
-COVERAGE_FACTOR = 10
 
 
 class Mapping(object):
@@ -373,7 +374,8 @@ def run_processing_reads(contigs_fpaths, main_ref_fpath, meta_ref_fpaths, ref_la
         parallel_align_args.append((main_ref_fpath, output_dir, temp_output_dir, log_path, err_fpath,
                                     max_threads_per_job, qconfig.reference_sam, qconfig.reference_bam, None, required_files, True))
     if parallel_align_args:
-        correct_chr_names, sam_fpaths, bam_fpaths = run_parallel(align_single_file, parallel_align_args, n_jobs)
+        job_sizes = [os.path.getsize(args[0]) for args in parallel_align_args]
+        correct_chr_names, sam_fpaths, bam_fpaths = run_parallel(align_single_file, parallel_align_args, n_jobs, job_sizes=job_sizes)
         if not qconfig.no_read_stats:
             qconfig.sam_fpaths = sam_fpaths[:len(contigs_fpaths)]
             qconfig.bam_fpaths = bam_fpaths[:len(contigs_fpaths)]
@@ -527,15 +529,17 @@ def align_single_file(fpath, main_output_dir, output_dirpath, log_path, err_fpat
         prev_dir = os.getcwd()
         os.chdir(output_dirpath)
         bwa_index(fpath, err_fpath, logger)
-        sam_fpaths = align_reads(fpath, sam_fpath, using_reads, main_output_dir, err_fpath, max_threads)
+        align_threads = qutils.take_threads(max_threads)
+        sam_fpaths = align_reads(fpath, sam_fpath, using_reads, main_output_dir, err_fpath, align_threads)
 
         if len(sam_fpaths) > 1:
-            merge_sam_files(sam_fpaths, sam_fpath, bam_fpath, max_threads, err_fpath)
+            merge_sam_files(sam_fpaths, sam_fpath, bam_fpath, align_threads, err_fpath)
         elif len(sam_fpaths) == 1:
             shutil.move(sam_fpaths[0], sam_fpath)
             tmp_bam_fpath = sam_fpaths[0].replace('.sam', '.bam')
             if is_non_empty_file(tmp_bam_fpath):
                 shutil.move(tmp_bam_fpath, bam_fpath)
+        qutils.release_threads()
 
         logger.info('  ' + index_str + 'Done.')
         os.chdir(prev_dir)
@@ -752,6 +756,10 @@ def analyse_coverage(output_dirpath, fpath, chr_names, bam_fpath, stats_fpath, e
     bed_fpath = bam_to_bed(output_dirpath, filename, bam_fpath, err_fpath, logger)
     chr_len_fpath = get_chr_len_fpath(fpath, chr_names)
     cov_fpath = join(output_dirpath, filename + '.genomecov')
+    # TODO: build the depth histogram of the reference from the coverage pyramid (.cov.bin) instead of running
+    # bedtools genomecov once more. The pyramid cannot replace it yet: its level 0 keeps mean depths of bins of
+    # COVERAGE_FACTOR bp, so fractions of bases with depth >= coverage_thresholds would be approximate,
+    # and the pyramid is saved only when Icarus is drawn. An exact per-chromosome histogram should be added to it first.
     calculate_genome_cov(bed_fpath, cov_fpath, chr_len_fpath, err_fpath, logger, print_all_positions=False)
 
     avg_depth = 0
@@ -813,9 +821,16 @@ def get_coverage(output_dirpath, ref_fpath, ref_name, bam_fpath, bam_sorted_fpat
 
 
 def proceed_cov_file(raw_cov_fpath, cov_fpath, correct_chr_names):
-    chr_depth = defaultdict(list)
+    """
+        Saves mean depths of bins of COVERAGE_FACTOR bases into the .cov file and the coverage pyramid (.cov.bin).
+        Runs of the same depth are binned arithmetically instead of being expanded into single bases
+    """
     used_chromosomes = dict()
+    correct_names = dict()
     chr_index = 0
+    bin_sums, bin_lens = defaultdict(int), defaultdict(int)  # incomplete bins at the ends of the chromosomes
+    pyramid_writer = PyramidWriter(get_pyramid_fpath(cov_fpath))
+    pyramid_chr, pyramid_depths = None, None  # bedtools reports chromosomes one by one, so only one of them is kept
     with open(raw_cov_fpath, 'r') as in_coverage:
         with open(cov_fpath, 'w') as out_coverage:
             for line in in_coverage:
@@ -825,21 +840,41 @@ def proceed_cov_file(raw_cov_fpath, cov_fpath, correct_chr_names):
                 if name not in used_chromosomes:
                     chr_index += 1
                     used_chromosomes[name] = str(chr_index)
-                    correct_name = correct_chr_names[name] if correct_chr_names else name
-                    out_coverage.write('#' + correct_name + ' ' + used_chromosomes[name] + '\n')
-                if len(fs) > 3:
-                    start, end = int(fs[1]), int(fs[2])
-                    chr_depth[name].extend([depth] * (end - start))
-                else:
-                    chr_depth[name].append(depth)
-                if len(chr_depth[name]) >= COVERAGE_FACTOR:
-                    max_index = len(chr_depth[name]) - (len(chr_depth[name]) % COVERAGE_FACTOR)
-                    for index in range(0, max_index, COVERAGE_FACTOR):
-                        cur_depth = sum(chr_depth[name][index: index + COVERAGE_FACTOR]) // COVERAGE_FACTOR
-                        out_coverage.write(' '.join([used_chromosomes[name], str(cur_depth) + '\n']))
-                    chr_depth[name] = chr_depth[name][index + COVERAGE_FACTOR:]
-            if not qconfig.debug:
-                os.remove(raw_cov_fpath)
+                    correct_names[name] = correct_chr_names[name] if correct_chr_names else name
+                    out_coverage.write('#' + correct_names[name] + ' ' + used_chromosomes[name] + '\n')
+                    if pyramid_writer:
+                        if pyramid_chr is not None:
+                            pyramid_writer.add(correct_names[pyramid_chr], int(used_chromosomes[pyramid_chr]), pyramid_depths)
+                        pyramid_chr, pyramid_depths = name, array('i')
+                elif pyramid_writer and name != pyramid_chr:  # the pyramid is optional, the .cov file is used instead
+                    pyramid_writer.discard()
+                    pyramid_writer = None
+
+                run_len = int(fs[2]) - int(fs[1]) if len(fs) > 3 else 1
+                cur_depths = []
+                if bin_lens[name]:
+                    added_len = min(COVERAGE_FACTOR - bin_lens[name], run_len)
+                    bin_sums[name] += depth * added_len
+                    bin_lens[name] += added_len
+                    run_len -= added_len
+                    if bin_lens[name] == COVERAGE_FACTOR:
+                        cur_depths.append(bin_sums[name] // COVERAGE_FACTOR)
+                        bin_sums[name], bin_lens[name] = 0, 0
+                num_bins = run_len // COVERAGE_FACTOR
+                cur_depths.extend([depth] * num_bins)
+                run_len -= num_bins * COVERAGE_FACTOR
+                if run_len:
+                    bin_sums[name] += depth * run_len
+                    bin_lens[name] += run_len
+                out_coverage.write(''.join(used_chromosomes[name] + ' ' + str(cur_depth) + '\n' for cur_depth in cur_depths))
+                if pyramid_writer:
+                    pyramid_depths.extend(cur_depths)
+    if pyramid_writer:
+        if pyramid_chr is not None:
+            pyramid_writer.add(correct_names[pyramid_chr], int(used_chromosomes[pyramid_chr]), pyramid_depths)
+        pyramid_writer.close()
+    if not qconfig.debug:
+        os.remove(raw_cov_fpath)
 
 
 def get_max_min_is(insert_sizes):
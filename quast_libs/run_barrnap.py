@@ -17,8 +17,10 @@ def run(contigs_fpath, gff_fpath, log_fpath, threads, kingdom):
     barrnap_fpath = join(qconfig.LIBS_LOCATION, 'barrnap', 'bin', 'barrnap')
     if is_non_empty_file(gff_fpath):
         return
+    threads = qutils.take_threads(threads)
     call_subprocess([barrnap_fpath, '--quiet', '-k', kingdom, '--threads', str(threads), contigs_fpath],
                      stdout=open(gff_fpath, 'w'), stderr=open(log_fpath, 'a'))
+    qutils.release_threads()
 
 
 def do(contigs_fpaths, output_dir, logger):
@@ -36,7 +38,7 @@ def do(contigs_fpaths, output_dir, logger):
     gff_fpaths = [join(output_dir, qutils.label_from_fpath_for_fname(contigs_fpath) + '.rna.gff') for contigs_fpath in contigs_fpaths]
 
     barrnap_args = [(contigs_fpath, gff_fpath, log_fpath, threads, kingdom) for contigs_fpath, gff_fpath in zip(contigs_fpaths, gff_fpaths)]
-    run_parallel(run, barrnap_args, qconfig.max_threads)
+    run_parallel(run, barrnap_args, n_jobs, job_sizes=[os.path.getsize(fpath) for fpath in contigs_fpaths])
 
     if not any(fpath for fpath in gff_fpaths):
         logger.info('Failed predicting the location of ribosomal RNA genes.')
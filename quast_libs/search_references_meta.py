@@ -302,9 +302,11 @@ def parallel_blast(contigs_fpath, label, corrected_dirpath, err_fpath, blast_res
         blast_query_fpath = unpacked_fpath
     res_fpath = get_blast_output_fpath(blast_res_fpath, label)
     check_fpath = get_blast_output_fpath(blast_check_fpath, label)
+    blast_threads = qutils.take_threads(blast_threads)
     cmd = get_blast_fpath('blastn') + (' -query %s -db %s -outfmt 7 -num_threads %s' % (
         blast_query_fpath, db_fpath, blast_threads))
     qutils.call_subprocess(shlex.split(cmd), stdout=open(res_fpath, 'w'), stderr=open(err_fpath, 'a'), logger=logger)
+    qutils.release_threads()
     logger.info('  ' + 'BLAST results for %s are saved to %s...' % (label, res_fpath))
     with open(check_fpath, 'w') as check_file:
         check_file.writelines('Assembly: %s md5 checksum: %s\n' % (contigs_fpath, md5(contigs_fpath)))
@@ -449,7 +451,8 @@ def process_blast(blast_assemblies, downloaded_dirpath, corrected_dirpath, label
         parallel_run_args = [(assembly.fpath, assembly.label, corrected_dirpath,
                               err_fpath, blast_res_fpath, blast_check_fpath, blast_threads)
                              for assembly in blast_assemblies]
-        run_parallel(parallel_blast, parallel_run_args, n_jobs, filter_results=True)
+        run_parallel(parallel_blast, parallel_run_args, n_jobs, filter_results=True,
+                     job_sizes=[os.path.getsize(assembly.fpath) for assembly in blast_assemblies])
 
     logger.main_info()
     species_scores = []
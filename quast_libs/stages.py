@@ -0,0 +1,309 @@
+############################################################################
+# Copyright (c) 2015-2019 Saint Petersburg State University
+# Copyright (c) 2011-2015 Saint Petersburg Academic University
+# All Rights Reserved
+# See file LICENSE for details.
+############################################################################
+#
+# Scheduler of QUAST stages. Each stage declares names of its inputs and
+# outputs and starts as soon as all its inputs are computed. Stages that draw
+# plots or use results of other stages run one by one in the main process.
+# Independent stages (e.g. gene prediction) run in forked processes along with
+# them, and --threads are shared between all running stages. Logs of the
+# forked stages are kept in memory and written by the main process in the order
+# the stages were started, so they are not mixed up in quast.log.
+#
+############################################################################
+
+from __future__ import with_statement
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+
+from quast_libs import qconfig, reporting, log
+from quast_libs.log import get_logger
+logger = get_logger(qconfig.LOGGER_DEFAULT_NAME)
+
+POLL_INTERVAL = 0.5  # seconds
+
+
+class Stage(object):
+    def __init__(self, name, run, inputs=None, outputs=None, is_independent=False, report_fields=None):
+        self.name = name
+        self.run = run  # called with values of inputs, returns values of outputs
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.is_independent = is_independent  # does not use the main process state except reports
+        self.report_fields = report_fields or []  # fields of reports filled by the independent stage
+
+    def is_ready(self, data):
+        return all(name in data for name in self.inputs)
+
+    def save_outputs(self, data, result):
+        if len(self.outputs) == 1:
+            data[self.outputs[0]] = result
+        elif self.outputs:
+            data.update(zip(self.outputs, result))
+
+    def __call__(self, data):
+        return self.run(*[data[name] for name in self.inputs])
+
+
+class RunningStage(object):
+    def __init__(self, stage, pid, threads, result_fpath):
+        self.stage = stage
+        self.pid = pid
+        self.threads = threads
+        self.result_fpath = result_fpath
+        self.is_finished = False
+        self.log_messages = []
+
+
+class StageLogHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self, logging.DEBUG)
+        self.setFormatter(logging.Formatter('%(message)s'))
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.name, record.levelno, self.format(record)))
+
+
+def buffer_logs():
+    handler = StageLogHandler()
+    for qlogger in log._loggers.values():
+        for old_handler in list(qlogger._logger.handlers):
+            qlogger._logger.removeHandler(old_handler)
+        qlogger._logger.addHandler(handler)
+    return handler
+
+
+def write_stage_logs(started_stages, in_order=True):
+    """
+        Writes logs of finished forked stages. If in_order, a log is held until the logs of all stages started before
+        are written, otherwise logs of all finished stages are written (e.g. if one of them failed).
+    """
+    for running_stage in list(started_stages):
+        if not running_stage.is_finished:
+            if in_order:
+                break
+            continue
+        for name, level, message in running_stage.log_messages:
+            logging.getLogger(name).log(level, message)
+        started_stages.remove(running_stage)
+
+
+def get_reports_state():
+    return dict((key, dict(report.d)) for key, report in reporting.reports.items())
+
+
+def get_changed_fields(reports_state):
+    changed_fields = dict()
+    for key, report in reporting.reports.items():
+        old_fields = reports_state.get(key, {})
+        fields = dict((field, value) for field, value in report.d.items()
+                      if field not in old_fields or old_fields[field] != value)
+        if fields:
+            changed_fields[key] = fields
+    return changed_fields
+
+
+def update_reports(stage, changed_fields):
+    for key, fields in changed_fields.items():
+        stage_fields = dict((field, value) for field, value in fields.items() if field in stage.report_fields)
+        ignored_fields = [field for field in fields if field not in stage_fields and field != reporting.Fields.NAME]
+        if ignored_fields:
+            logger.debug('Fields changed by ' + stage.name + ' stage are ignored: ' + ', '.join(ignored_fields))
+        if not stage_fields:
+            continue
+        if key not in reporting.reports:
+            reporting.reports[key] = reporting.Report(fields.get(reporting.Fields.NAME))
+        reporting.reports[key].d.update(stage_fields)
+
+
+def get_pdf_figures():
+    from quast_libs import plotter
+    return plotter.pdf_tables_figures
+
+
+def get_new_pdf_tables(pdf_figures_num):
+    """
+        Returns tables drawn for the PDF report by the stage: matplotlib figures if they are picklable,
+        otherwise arguments of plotter.draw_report_table to draw the tables again in the main process.
+    """
+    figures = get_pdf_figures()[pdf_figures_num:]
+    try:
+        pickle.dumps(figures, protocol=2)
+        return figures, []
+    except Exception:
+        return [], [getattr(figure, 'table_args', None) for figure in figures]
+
+
+def add_pdf_tables(stage, figures, tables_args):
+    from quast_libs import plotter
+    get_pdf_figures().extend(figures)
+    lost_tables_num = 0
+    for table_args in tables_args:
+        if table_args:
+            plotter.draw_report_table(*table_args)
+        else:
+            lost_tables_num += 1
+    if lost_tables_num:
+        logger.warning('%d table(s) drawn by %s stage cannot be passed to the main process, '
+                       'they are not added to the PDF report' % (lost_tables_num, stage.name))
+
+
+def run_in_child_process(stage, data, threads, result_fpath):
+    qconfig.max_threads = threads
+    start_time = datetime.now()
+    log_handler = buffer_logs()
+    reports_state = get_reports_state()
+    notifications = logger.get_numbers_of_notifications()
+    pdf_figures_num = len(get_pdf_figures())
+    exit_code = 0
+    try:
+        result = stage(data)
+        outputs = dict()
+        stage.save_outputs(outputs, result)
+        notifications = [after - before for before, after in zip(notifications, logger.get_numbers_of_notifications())]
+        stage_result = [outputs, get_changed_fields(reports_state), notifications, datetime.now() - start_time]
+        stage_result.extend(get_new_pdf_tables(pdf_figures_num))
+        stage_result = ('ok', stage_result)
+    except SystemExit:
+        exit_code = sys.exc_info()[1].code
+        stage_result = ('exit', exit_code)
+    except BaseException:
+        stage_result = ('error', traceback.format_exc())
+    try:
+        with open(result_fpath, 'wb') as f:
+            pickle.dump(stage_result + (log_handler.messages,), f, protocol=2)
+    except Exception:
+        exit_code = exit_code or 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(exit_code if isinstance(exit_code, int) else 1)
+
+
+def start_stage(stage, data, threads):
+    result_fd, result_fpath = tempfile.mkstemp(prefix='stage_', suffix='.pickle', dir=qconfig.output_dirpath)
+    os.close(result_fd)
+    sys.stdout.flush()  # otherwise buffered messages would be printed by the child process too
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        run_in_child_process(stage, data, threads, result_fpath)
+    return RunningStage(stage, pid, threads, result_fpath)
+
+
+def finish_stage(running_stage, data, wall_times):
+    stage_result = None
+    try:
+        with open(running_stage.result_fpath, 'rb') as f:
+            stage_result = pickle.load(f)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        pass
+    if os.path.isfile(running_stage.result_fpath):
+        os.remove(running_stage.result_fpath)
+
+    if stage_result is None:
+        raise Exception('%s stage was terminated' % running_stage.stage.name)
+    status, value, running_stage.log_messages = stage_result
+    running_stage.is_finished = True
+    if status == 'exit':
+        sys.exit(value)
+    if status == 'error':
+        raise Exception('%s stage failed:\n%s' % (running_stage.stage.name, value))
+    outputs, changed_fields, notifications, wall_time, pdf_figures, pdf_tables_args = value
+    data.update(outputs)
+    update_reports(running_stage.stage, changed_fields)
+    logger.add_numbers_of_notifications(notifications)
+    add_pdf_tables(running_stage.stage, pdf_figures, pdf_tables_args)
+    wall_times.append((running_stage.stage.name, wall_time))
+
+
+def wait_for_stages(running_stages, started_stages, data, wall_times, block=False):
+    while running_stages:
+        for running_stage in list(running_stages):
+            pid, _ = os.waitpid(running_stage.pid, os.WNOHANG)
+            if pid:
+                running_stages.remove(running_stage)
+                finish_stage(running_stage, data, wall_times)
+                write_stage_logs(started_stages)
+                block = False
+        if not block:
+            return
+        time.sleep(POLL_INTERVAL)
+
+
+def terminate_stages(running_stages):
+    import signal
+    for running_stage in running_stages:
+        try:
+            os.kill(running_stage.pid, signal.SIGTERM)
+            os.waitpid(running_stage.pid, 0)
+        except OSError:
+            pass
+        if os.path.isfile(running_stage.result_fpath):
+            os.remove(running_stage.result_fpath)
+
+
+def run_stages(stages, data=None):
+    """
+        Runs stages in the given order as soon as their inputs are computed, returns dict: name -> value of all outputs.
+        Independent stages run in parallel with the other ones if there are at least two threads.
+    """
+    data = dict(data or {})
+    max_threads = qconfig.max_threads
+    can_run_in_parallel = max_threads > 1 and hasattr(os, 'fork')
+    pending_stages = list(stages)
+    running_stages = []
+    started_stages = []  # forked stages with not yet written logs
+    wall_times = []
+    try:
+        while pending_stages or running_stages:
+            wait_for_stages(running_stages, started_stages, data, wall_times)
+            ready_stages = [stage for stage in pending_stages if stage.is_ready(data)]
+            main_stages = [stage for stage in pending_stages if not stage.is_independent or not can_run_in_parallel]
+            if can_run_in_parallel:
+                independent_stages = [stage for stage in ready_stages if stage.is_independent]
+                # threads are shared equally between running stages, one more share is kept for the main process
+                lanes_num = len(running_stages) + len(independent_stages) + (1 if main_stages else 0)
+                for stage in independent_stages:
+                    free_threads = max_threads - sum(s.threads for s in running_stages) - (1 if main_stages else 0)
+                    if free_threads < 1:
+                        break
+                    running_stages.append(start_stage(stage, data, min(max(1, max_threads // lanes_num), free_threads)))
+                    started_stages.append(running_stages[-1])
+                    pending_stages.remove(stage)
+
+            ready_main_stages = [stage for stage in ready_stages if stage in main_stages]
+            if ready_main_stages:
+                stage = ready_main_stages[0]
+                qconfig.max_threads = max(1, max_threads - sum(s.threads for s in running_stages))
+                start_time = datetime.now()
+                stage.save_outputs(data, stage(data))
+                wall_times.append((stage.name, datetime.now() - start_time))
+                qconfig.max_threads = max_threads
+                pending_stages.remove(stage)
+            elif running_stages:
+                wait_for_stages(running_stages, started_stages, data, wall_times, block=True)
+            elif pending_stages:  # inputs of the remaining stages are never computed
+                break
+    except:
+        terminate_stages(running_stages)
+        write_stage_logs(started_stages, in_order=False)  # the log of a failed stage is needed to find the reason
+        raise
+    finally:
+        qconfig.max_threads = max_threads
+
+    if wall_times:
+        logger.info('')
+        logger.info('Wall time of the stages:')
+        for name, wall_time in wall_times:
+            logger.info('  ' + name + ': ' + str(wall_time))
+    return data
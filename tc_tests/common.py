@@ -120,6 +120,46 @@ def check_report_files(name, report_fnames=None, fast=False):
         print('All necessary files exist')
 
 
+def create_cache_dirpath(name):
+    """
+        Returns an empty directory for a cache shared between QUAST runs (e.g. --results-cache)
+    """
+    cache_dirpath = os.path.join(common_results_dirpath, name + '_cache')
+    if os.path.exists(cache_dirpath):
+        shutil.rmtree(cache_dirpath)
+    return cache_dirpath
+
+
+def read_result_file(name, fname, binary=False):
+    fpath = os.path.join(get_results_dirpath(name), fname)
+    if not os.path.isfile(fpath):
+        sys.stderr.write('File %s does not exist\n' % fpath)
+        exit(5)
+    with open(fpath, 'rb' if binary else 'r') as f:
+        return f.read()
+
+
+def assert_log_message(name, message, absent=False):
+    log = read_result_file(name, 'quast.log')
+    if absent and message in log:
+        sys.stderr.write('Assertion of "%s" in quast.log failed: message is present but should be missing!\n' % message)
+        exit(10)
+    if not absent and message not in log:
+        sys.stderr.write('Assertion of "%s" in quast.log failed: no such message\n' % message)
+        exit(10)
+    print('Message "%s" is %s in quast.log as expected' % (message, 'absent' if absent else 'present'))
+    return True
+
+
+def assert_same_result_files(name, fnames, expected_contents):
+    for fname, expected_content in zip(fnames, expected_contents):
+        if read_result_file(name, fname, binary=True) != expected_content:
+            sys.stderr.write('File %s differs from the one of the previous run\n' % fname)
+            exit(10)
+    print('Files are the same as in the previous run: ' + ', '.join(fnames))
+    return True
+
+
 def assert_report_header(name, contigs, fname='report.tsv'):
     results_dirpath = get_results_dirpath(name)
 
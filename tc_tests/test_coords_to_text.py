@@ -0,0 +1,53 @@
+#!/usr/bin/python
+
+from __future__ import with_statement
+import os
+import sys
+from common import *
+
+name = os.path.basename(__file__)[5:-3]
+contigs = [contigs_10k_1]
+ref_name = 'gi_49175990_ref_NC_000913.2_'
+
+run_quast(name, contigs=contigs, params='-R ' + reference_10k)
+coords_fname = 'contigs_reports/minimap_output/contigs_10k_1.coords.filtered.bin'
+check_report_files(name, ['report.tsv', coords_fname, coords_fname + '.idx'])
+coords_fpath = os.path.join(get_results_dirpath(name), coords_fname)
+
+
+def convert_to_text(text_fname, params=''):
+    text_fpath = os.path.join(get_results_dirpath(name), text_fname)
+    cmd = sys.executable + ' ../other_scripts/coords_to_text.py ' + coords_fpath + ' ' + text_fpath + ' ' + params
+    print(cmd)
+    if os.system(cmd) != 0:
+        sys.stderr.write('coords_to_text.py finished abnormally\n')
+        exit(10)
+    with open(text_fpath) as f:
+        return f.read().splitlines()
+
+
+def check_lines(lines, expected_lines, description):
+    if lines != expected_lines:
+        sys.stderr.write('Incorrect text alignments (%s):\n%s\n' % (description, '\n'.join(lines)))
+        exit(10)
+    print('Alignments are converted to text correctly (%s)' % description)
+
+
+# S1 E1 | S2 E2 | LEN1 LEN2 | IDY | REF CONTIG | CS
+expected_lines = ['1 1120 | 1 1120 | 1120 1120 | 100.0 | %s contig1 | cs:Z::1120' % ref_name,
+                  '1681 3290 | 1 1610 | 1610 1610 | 100.0 | %s contig2 | cs:Z::1610' % ref_name,
+                  '4621 6650 | 1 2030 | 2030 2030 | 100.0 | %s contig3 | cs:Z::2030' % ref_name,
+                  '8051 10000 | 2031 3980 | 1950 1950 | 100.0 | %s contig3 | cs:Z::1950' % ref_name]
+check_lines(convert_to_text('all.txt'), expected_lines, 'all alignments')
+
+# alignments of a single sequence are found through the index
+check_lines(convert_to_text('contig3.txt', '--contig contig3'), expected_lines[2:], 'contig3')
+check_lines(convert_to_text('contig1.txt', '--contig contig1'), expected_lines[:1], 'contig1')
+check_lines(convert_to_text('ref.txt', '--ref ' + ref_name), expected_lines, 'reference')
+check_lines(convert_to_text('ref_contig2.txt', '--ref ' + ref_name + ' --contig contig2'), expected_lines[1:2],
+            'reference and contig2')
+check_lines(convert_to_text('missing.txt', '--contig missing_contig'), [], 'missing contig')
+
+# the index is built in memory if it is not saved
+os.remove(coords_fpath + '.idx')
+check_lines(convert_to_text('contig3_no_index.txt', '--contig contig3'), expected_lines[2:], 'contig3 without .idx')
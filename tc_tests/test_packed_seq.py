@@ -0,0 +1,67 @@
+#!/usr/bin/python
+
+from __future__ import with_statement
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+from quast_libs.packed_seq import PackedSeq
+
+complement = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A', 'N': 'N'}
+
+
+def check(description, packed_value, expected_value):
+    if packed_value != expected_value:
+        sys.stderr.write('PackedSeq failed on %s: %r expected, got %r instead\n' % (description, expected_value, packed_value))
+        exit(11)
+
+
+def check_sequence(seq):
+    packed_seq = PackedSeq(seq)
+    check('len', len(packed_seq), len(seq))
+    check('str', str(packed_seq), seq)
+    check('reverse complement', str(packed_seq.reverse_complement()), ''.join(complement[base] for base in reversed(seq)))
+    # all slices starting and ending within a few bases around byte boundaries and N runs
+    positions = set([0, len(seq)])
+    for i in range(len(seq) + 1):
+        if i % 4 == 0 or (0 < i < len(seq) and (seq[i] == 'N') != (seq[i - 1] == 'N')):
+            positions.update(range(max(0, i - 2), min(len(seq), i + 2) + 1))
+    positions = sorted(positions)
+    for start in positions:
+        for end in positions:
+            check('slice [%d:%d]' % (start, end), packed_seq[start:end], seq[start:end])
+            for letter in 'ACGTN':
+                check('count of %s in [%d:%d]' % (letter, start, end),
+                      packed_seq.count(letter, start, end), seq.count(letter, start, end))
+            check('GC count in [%d:%d]' % (start, end), packed_seq.gc_count(start, end),
+                  seq.count('G', start, end) + seq.count('C', start, end))
+    for index in range(-len(seq), len(seq)):
+        check('index %d' % index, packed_seq[index], seq[index])
+    check('negative slice', packed_seq[-7:-2], seq[-7:-2])
+    check('open slice', packed_seq[5:], seq[5:])
+    check('slice with step', packed_seq[1::3], seq[1::3])
+    check('slice out of range', packed_seq[len(seq) - 3:len(seq) + 10], seq[len(seq) - 3:len(seq) + 10])
+
+
+rand = random.Random(17)
+sequences = ['', 'A', 'N', 'ACGT', 'NNNN', 'ACGTN', 'NACGTACGTN', 'TTTTNNNNNGGGGNCCCCAN',
+             ''.join(rand.choice('ACGT') for _ in range(61))]
+for _ in range(10):  # random sequences with runs of N's of various lengths
+    parts = [''.join(rand.choice('ACGT') for _ in range(rand.randint(0, 9))) + 'N' * rand.randint(0, 6)
+             for _ in range(rand.randint(1, 8))]
+    sequences.append(''.join(parts))
+
+for seq in sequences:
+    check_sequence(seq)
+print('PackedSeq is the same as str for %d sequences' % len(sequences))
+
+# lowercase and ambiguous bases cannot be packed, QUAST packs only corrected sequences (ACGTN)
+for seq in ['acgt', 'ACGTn', 'ACGTR', 'ACGTY', 'ACG-T']:
+    try:
+        PackedSeq(seq)
+    except ValueError:
+        continue
+    sys.stderr.write('PackedSeq accepted %r, but it cannot be packed without losing letters\n' % seq)
+    exit(11)
+print('Lowercase and ambiguous bases are rejected')
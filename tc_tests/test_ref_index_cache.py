@@ -0,0 +1,40 @@
+#!/usr/bin/python
+
+from __future__ import with_statement
+import os
+from common import *
+
+name = os.path.basename(__file__)[5:-3]
+contigs = [contigs_1k_1, contigs_1k_2]
+cache_dirpath = create_cache_dirpath(name)
+params = '-R ' + reference_1k + ' --ref-index-cache ../' + cache_dirpath
+cached_message = 'Using cached reference index'
+
+
+def get_cached_indexes():
+    return sorted(fname for fname in os.listdir(cache_dirpath) if fname.endswith('.mmi'))
+
+
+run_quast(name, contigs=contigs, params=params)
+assert_log_message(name, cached_message, absent=True)
+assert_metric(name, 'NGA50', ['1000', '760'])
+indexes = get_cached_indexes()
+if len(indexes) != 1:
+    sys.stderr.write('Expected one reference index in %s, got %s\n' % (cache_dirpath, ', '.join(indexes)))
+    exit(10)
+
+# the index is loaded from the cache, alignments are the same
+run_quast(name, contigs=contigs, params=params)
+assert_log_message(name, cached_message)
+assert_metric(name, 'NGA50', ['1000', '760'])
+if get_cached_indexes() != indexes:
+    sys.stderr.write('Reference index cache in %s has changed\n' % cache_dirpath)
+    exit(10)
+
+# a lower identity threshold switches the minimap2 preset, so the reference is indexed with other options
+run_quast(name, contigs=contigs, params=params + ' --min-identity 85')
+assert_log_message(name, cached_message, absent=True)
+assert_metric(name, 'NGA50', ['1000', '760'])
+if len(get_cached_indexes()) != 2 or indexes[0] not in get_cached_indexes():
+    sys.stderr.write('Index built with other options is not added to %s\n' % cache_dirpath)
+    exit(10)
@@ -0,0 +1,36 @@
+#!/usr/bin/python
+
+from __future__ import with_statement
+import os
+from common import *
+
+name = os.path.basename(__file__)[5:-3]
+contigs = [contigs_1k_1, contigs_1k_2]
+cache_dirpath = create_cache_dirpath(name)
+params = '-R ' + reference_1k + ' --results-cache ../' + cache_dirpath
+cached_message = 'Using cached results'
+# files restored from the cache instead of running the analysis
+cached_fnames = ['contigs_reports/contigs_report_contigs_1k_1.stdout',
+                 'contigs_reports/contigs_report_contigs_1k_2.mis_contigs.info',
+                 'contigs_reports/minimap_output/contigs_1k_2.coords.filtered.bin']
+
+run_quast(name, contigs=contigs, params=params)
+assert_log_message(name, cached_message, absent=True)
+report = read_result_file(name, 'report.tsv', binary=True)
+cached_files = [read_result_file(name, fname, binary=True) for fname in cached_fnames]
+if len(os.listdir(cache_dirpath)) != len(contigs):
+    sys.stderr.write('Expected one cache entry per assembly in %s\n' % cache_dirpath)
+    exit(10)
+
+# the same comparison: all results are taken from the cache
+run_quast(name, contigs=contigs, params=params)
+assert_log_message(name, cached_message)
+assert_same_result_files(name, ['report.tsv'] + cached_fnames, [report] + cached_files)
+
+# options affecting the analysis invalidate the cached results
+run_quast(name, contigs=contigs, params=params + ' --min-identity 96')
+assert_log_message(name, cached_message, absent=True)
+assert_metric(name, 'NGA50', ['1000', '760'])
+if len(os.listdir(cache_dirpath)) != 2 * len(contigs):
+    sys.stderr.write('Results of the analysis with another --min-identity are not cached in %s\n' % cache_dirpath)
+    exit(10)